@@ -1,34 +1,49 @@
 from django.contrib import admin
 from .models import (
+    NotificationOutbox,
+    ProbeWorker,
     Server,
     System,
     SystemStatus,
     SystemStatusHistory,
+    SystemStatusInterval,
     SystemDowntime,
 )
 
 
 class SystemAdmin(admin.ModelAdmin):
-    list_display = ("name", "url", "server")
-    list_filter = ("server",)
+    list_display = ("name", "url", "server", "check_interval", "probe_method", "probe_timeout", "expected_status_codes")
+    list_filter = ("server", "probe_method")
     search_fields = ("name", "url")
+    fieldsets = (
+        (None, {"fields": ("name", "url", "server", "check_interval")}),
+        ("Verificação", {"fields": ("probe_method", "probe_timeout", "expected_status_codes", "max_body_bytes")}),
+    )
 
 
 class SystemStatusAdmin(admin.ModelAdmin):
-    list_display = ("system", "status", "status_code", "checked_at")
+    list_display = ("system", "status", "status_code", "response_ms", "checked_at")
     list_filter = ("status", "checked_at", "system__server")
     search_fields = ("system__name", "system__url")
     autocomplete_fields = ("system",)
 
 
 class SystemStatusHistoryAdmin(admin.ModelAdmin):
-    list_display = ("system", "status", "status_code", "checked_at")
+    list_display = ("system", "status", "status_code", "response_ms", "checked_at")
     list_filter = ("status", "checked_at", "system__server")
     date_hierarchy = "checked_at"
     search_fields = ("system__name", "system__url")
     autocomplete_fields = ("system",)
 
 
+class SystemStatusIntervalAdmin(admin.ModelAdmin):
+    list_display = ("system", "status", "status_code", "first_seen", "last_seen", "check_count")
+    list_filter = ("status", "system__server")
+    date_hierarchy = "first_seen"
+    search_fields = ("system__name", "system__url")
+    autocomplete_fields = ("system",)
+
+
 class SystemDowntimeAdmin(admin.ModelAdmin):
     list_display = ("system", "status", "started_at", "ended_at", "duration")
     list_filter = ("status", "started_at", "ended_at", "system__server")
@@ -37,9 +52,24 @@ class SystemDowntimeAdmin(admin.ModelAdmin):
     autocomplete_fields = ("system",)
 
 
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("system", "status", "state", "attempts", "created_at", "sent_at", "next_attempt_at")
+    list_filter = ("state", "status")
+    date_hierarchy = "created_at"
+    search_fields = ("system__name", "last_error")
+    autocomplete_fields = ("system",)
+
+
+class ProbeWorkerAdmin(admin.ModelAdmin):
+    list_display = ("name", "heartbeat_at", "shards", "probes_per_minute", "backlog", "in_flight", "probes_total")
+    readonly_fields = [field.name for field in ProbeWorker._meta.fields]
+
+
 admin.site.register(Server)
 admin.site.register(System, SystemAdmin)
 admin.site.register(SystemStatus, SystemStatusAdmin)
 admin.site.register(SystemStatusHistory, SystemStatusHistoryAdmin)
+admin.site.register(SystemStatusInterval, SystemStatusIntervalAdmin)
 admin.site.register(SystemDowntime, SystemDowntimeAdmin)
-
+admin.site.register(NotificationOutbox, NotificationOutboxAdmin)
+admin.site.register(ProbeWorker, ProbeWorkerAdmin)
@@ -0,0 +1,149 @@
+import platform
+import random
+import time
+
+import django
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import Server, System, SystemDowntime, SystemStatusHistory, SystemStatusInterval
+from .probe import options_for
+from .services import CheckResult, get_status_string, probe_url
+from .writer import get_writer, submit_checks
+
+
+def percentile(values, fraction):
+    """Percentil por posição (nearest-rank) de uma lista já ordenada."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50": round(percentile(samples, 0.5), 2),
+        "p99": round(percentile(samples, 0.99), 2),
+        "mean": round(sum(samples) / len(samples), 2),
+        "max": round(samples[-1], 2),
+    }
+
+
+def fleet_info():
+    return {
+        "servers": Server.objects.count(),
+        "systems": System.objects.count(),
+        "history_rows": SystemStatusHistory.objects.count(),
+        "intervals": SystemStatusInterval.objects.count(),
+        "downtimes": SystemDowntime.objects.count(),
+    }
+
+
+def benchmark_probes(systems, workers):
+    """Verifica ``systems`` pelo mesmo caminho do agendador (motor de
+    verificação + fila de escrita), sem cache, e mede a vazão."""
+    statuses = {}
+
+    def probe(system):
+        result = probe_url(system.url, owner=system.pk, ttl=0, options=options_for(system))
+        check = CheckResult(system, result.status_code, result.elapsed_ms, result.checked_at, result.details)
+        submit_checks([check], block=True)
+        return get_status_string(result.status_code, system.expected_codes), result.elapsed_ms
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bench-probe") as pool:
+        results = list(pool.map(probe, systems))
+    probe_seconds = time.perf_counter() - start
+    get_writer().flush()
+    total_seconds = time.perf_counter() - start
+
+    for status_str, _ in results:
+        statuses[status_str] = statuses.get(status_str, 0) + 1
+    return {
+        "systems": len(systems),
+        "workers": workers,
+        "seconds": round(probe_seconds, 3),
+        "seconds_with_writes": round(total_seconds, 3),
+        "per_second": round(len(systems) / probe_seconds, 1) if probe_seconds else None,
+        "response_ms": summarize([elapsed_ms for _, elapsed_ms in results]),
+        "statuses": statuses,
+    }
+
+
+def benchmark_endpoint(client, path, params, requests, warmup=3):
+    """Latência (ms) e consultas ao banco, na thread da requisição, de
+    ``requests`` chamadas a ``path``. ``params`` é chamado a cada requisição."""
+    for _ in range(warmup):
+        client.get(path, params())
+
+    latencies, queries, statuses = [], [], {}
+    for _ in range(requests):
+        data = params()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(path, data)
+            if getattr(response, "streaming", False):
+                b"".join(response.streaming_content)
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return {
+        "latency_ms": summarize(latencies),
+        "queries": {"mean": round(sum(queries) / len(queries), 2), "max": max(queries)} if queries else {},
+        "http_statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def run_benchmark(requests=100, probe_limit=500, workers=None, seed=42, skip_probes=False):
+    """Executa o conjunto completo e devolve o relatório (dicionário
+    serializável em JSON)."""
+    rng = random.Random(seed)
+    workers = workers or getattr(settings, "PROBE_WORKERS", 20)
+    systems = list(System.objects.all())
+    report = {
+        "started_at": timezone.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "debug": settings.DEBUG,
+            "status_history_mode": getattr(settings, "STATUS_HISTORY_MODE", "checks"),
+            "probe_cache_ttl": getattr(settings, "PROBE_CACHE_TTL", 5),
+        },
+        "fleet": fleet_info(),
+    }
+
+    if not skip_probes and systems:
+        report["probes"] = benchmark_probes(rng.sample(systems, min(probe_limit, len(systems))), workers)
+
+    if not systems:
+        return report
+
+    def random_system():
+        system = rng.choice(systems)
+        return {"name": system.name, "url": system.url}
+
+    client = Client()
+    endpoints = {
+        "system_status": (reverse("system_status"), random_system),
+        "systems_list": (reverse("systems_list"), dict),
+        "systems_grid": (reverse("systems_grid"), lambda: {"sort": "-latency", "status": "DOWN"}),
+        "dashboard_summary": (reverse("dashboard_summary"), lambda: {"days": 7}),
+        "uptime": (reverse("uptime"), lambda: {"step": "1h"}),
+        "dashboard": (reverse("dashboard"), dict),
+    }
+    report["endpoints"] = {
+        name: benchmark_endpoint(client, path, params, requests) for name, (path, params) in endpoints.items()
+    }
+    get_writer().flush()
+    report["finished_at"] = timezone.now().isoformat()
+    return report
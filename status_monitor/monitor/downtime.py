@@ -0,0 +1,143 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import DowntimeDaily, SystemDowntime
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def split_by_day(start, end):
+    """Divide ``[start, end)`` nos dias locais que ele cobre.
+
+    Retorna ``(dia, segundos, tail_start)``; ``tail_start`` é o início do
+    trecho do dia quando o downtime continua após a meia-noite seguinte.
+    """
+    segments = []
+    day = timezone.localtime(start).date()
+    cursor = start
+    while cursor < end:
+        next_midnight = _local_midnight(day + timedelta(days=1))
+        segment_end = min(end, next_midnight)
+        segments.append((day, (segment_end - cursor).total_seconds(), cursor if end > next_midnight else None))
+        cursor = segment_end
+        day += timedelta(days=1)
+    return segments
+
+
+def ledger_entries(downtimes):
+    """Soma ``(system_id, started_at, ended_at)`` por sistema e dia:
+    ``{(system_id, dia): [segundos, tail_start]}``."""
+    entries = {}
+    for system_id, started_at, ended_at in downtimes:
+        for day, seconds, tail_start in split_by_day(started_at, ended_at):
+            entry = entries.setdefault((system_id, day), [0.0, None])
+            entry[0] += seconds
+            if tail_start is not None:
+                entry[1] = tail_start
+    return entries
+
+
+def record_closed_downtimes(downtimes):
+    """Lança no livro diário os downtimes que acabaram de ser encerrados.
+    Deve rodar na mesma transação que grava o ``ended_at``."""
+    entries = ledger_entries(
+        (downtime.system_id, downtime.started_at, downtime.ended_at) for downtime in downtimes
+    )
+    if not entries:
+        return
+
+    system_ids = {system_id for system_id, _ in entries}
+    days = {day for _, day in entries}
+    existing = {
+        (row.system_id, row.day): row
+        for row in DowntimeDaily.objects.filter(system_id__in=system_ids, day__in=days)
+    }
+
+    to_create, to_update = [], []
+    for (system_id, day), (seconds, tail_start) in entries.items():
+        row = existing.get((system_id, day))
+        if row is None:
+            to_create.append(DowntimeDaily(system_id=system_id, day=day, seconds=seconds, tail_start=tail_start))
+            continue
+        row.seconds += seconds
+        if tail_start is not None:
+            row.tail_start = tail_start
+        to_update.append(row)
+
+    DowntimeDaily.objects.bulk_create(to_create)
+    DowntimeDaily.objects.bulk_update(to_update, ["seconds", "tail_start"])
+
+
+def backfill_downtime_ledger():
+    """Reconstrói o livro diário a partir de todos os downtimes encerrados."""
+    with transaction.atomic():
+        DowntimeDaily.objects.all().delete()
+        entries = ledger_entries(
+            SystemDowntime.objects.filter(ended_at__isnull=False)
+            .values_list("system_id", "started_at", "ended_at")
+            .iterator(chunk_size=2000)
+        )
+        DowntimeDaily.objects.bulk_create(
+            (
+                DowntimeDaily(system_id=system_id, day=day, seconds=seconds, tail_start=tail_start)
+                for (system_id, day), (seconds, tail_start) in entries.items()
+            ),
+            batch_size=1000,
+        )
+    return len(entries)
+
+
+def downtime_by_system(since, now=None):
+    """Segundos de downtime de cada sistema em ``[since, now)``, com os
+    downtimes cortados exatamente nas bordas da janela.
+
+    - dias inteiros depois do primeiro: soma do livro diário;
+    - primeiro dia (parcial): downtimes encerrados nele, cortados em
+      ``since``, mais o trecho final de quem atravessou a meia-noite;
+    - downtimes ainda abertos, que não estão no livro.
+
+    O custo não depende do tamanho da janela além do número de linhas
+    diárias somadas pelo índice.
+    """
+    now = now or timezone.now()
+    totals = {}
+
+    def add(system_id, seconds):
+        if seconds > 0:
+            totals[system_id] = totals.get(system_id, 0.0) + seconds
+
+    first_day = timezone.localtime(since).date()
+    first_day_end = min(_local_midnight(first_day + timedelta(days=1)), now)
+
+    # Agrupa por "system_id + 0" para o SQLite usar o índice do dia em vez
+    # de percorrer o índice único (system, day) inteiro
+    full_days = (
+        DowntimeDaily.objects.filter(day__gt=first_day, day__lte=timezone.localtime(now).date())
+        .values(system_key=F("system_id") + 0)
+        .annotate(total=Sum("seconds"))
+        .order_by()
+        .values_list("system_key", "total")
+    )
+    for system_id, seconds in full_days:
+        add(system_id, seconds)
+
+    closed_on_first_day = SystemDowntime.objects.filter(
+        ended_at__gt=since, ended_at__lte=first_day_end
+    ).values_list("system_id", "started_at", "ended_at")
+    for system_id, started_at, ended_at in closed_on_first_day:
+        add(system_id, (ended_at - max(started_at, since)).total_seconds())
+
+    tails = DowntimeDaily.objects.filter(day=first_day, tail_start__isnull=False).values_list(
+        "system_id", "tail_start"
+    )
+    for system_id, tail_start in tails:
+        add(system_id, (first_day_end - max(tail_start, since)).total_seconds())
+
+    still_open = SystemDowntime.objects.filter(ended_at__isnull=True).values_list("system_id", "started_at")
+    for system_id, started_at in still_open:
+        add(system_id, (now - max(started_at, since)).total_seconds())
+
+    return totals
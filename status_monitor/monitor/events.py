@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+from .models import StatusEvent
+
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+FETCH_LIMIT = 500
+CHECKED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _format_moment(moment):
+    return timezone.localtime(moment).strftime(CHECKED_AT_FORMAT) if moment else None
+
+
+def details_payload(details):
+    """Fases (ms, na ordem de ``probe.PHASES``), IP e validade do certificado
+    de uma verificação, no formato dos eventos e da API."""
+    if details is None:
+        return {"phases": None, "resolved_ip": None, "tls_expires_at": None}
+    return {
+        "phases": details.phases,
+        "resolved_ip": details.resolved_ip,
+        "tls_expires_at": _format_moment(details.tls_expires_at),
+    }
+
+
+def publish_events(checks, transitions, downtimes):
+    """Grava os eventos de um lote de verificações. Deve rodar na mesma
+    transação da gravação, para que o stream nunca publique um estado que
+    acabou revertido.
+
+    ``checks`` são os ``CheckResult`` gravados, ``transitions`` uma lista de
+    ``(system, status_anterior, status_novo, checked_at, status_code)`` e ``downtimes``
+    uma lista de ``(system, ação, SystemDowntime)``. Retorna o id do último
+    evento gravado.
+    """
+    from .services import check_status
+
+    latest = {}
+    for check in checks:
+        latest[check.system.pk] = check
+    events = [
+        StatusEvent(
+            kind="checks",
+            payload={
+                "results": [
+                    {
+                        "id": check.system.pk,
+                        "name": check.system.name,
+                        "status": check_status(check),
+                        "status_code": check.status_code,
+                        "response_ms": check.elapsed_ms,
+                        "checked_at": _format_moment(check.checked_at),
+                        **details_payload(check.details),
+                    }
+                    for check in latest.values()
+                ]
+            },
+        )
+    ]
+    for system, previous, status_str, checked_at, _ in transitions:
+        events.append(StatusEvent(
+            kind="status",
+            payload={
+                "id": system.pk,
+                "name": system.name,
+                "previous": previous,
+                "status": status_str,
+                "checked_at": _format_moment(checked_at),
+            },
+        ))
+    for system, action, downtime in downtimes:
+        events.append(StatusEvent(
+            kind="downtime",
+            payload={
+                "id": system.pk,
+                "name": system.name,
+                "action": action,
+                "status": downtime.status,
+                "started_at": _format_moment(downtime.started_at),
+                "ended_at": _format_moment(downtime.ended_at),
+            },
+        ))
+    StatusEvent.objects.bulk_create(events)
+    return events[-1].pk
+
+
+def publish_catalog_change():
+    """Avisa que servidores/sistemas foram cadastrados, alterados ou removidos."""
+    return StatusEvent.objects.create(kind="catalog", payload={}).pk
+
+
+def prune_events(hours=None):
+    """Remove eventos mais antigos que ``EVENT_RETENTION_HOURS``. Clientes que
+    voltarem depois disso recebem ``resync`` em vez da reprodução."""
+    if hours is None:
+        hours = getattr(settings, "EVENT_RETENTION_HOURS", 24)
+    cutoff = timezone.now() - timedelta(hours=hours)
+    return StatusEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def latest_event_id():
+    return StatusEvent.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def _events_after(last_id, limit=FETCH_LIMIT):
+    return list(
+        StatusEvent.objects.filter(id__gt=last_id)
+        .order_by("id")
+        .values_list("id", "kind", "payload")[:limit]
+    )
+
+
+def _can_replay(last_id):
+    """A reprodução só é exata se nenhum evento após ``last_id`` foi podado
+    e se o atraso cabe em ``EVENT_REPLAY_LIMIT``."""
+    bounds = StatusEvent.objects.filter(id__gt=last_id).aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return True
+    limit = getattr(settings, "EVENT_REPLAY_LIMIT", 1000)
+    return bounds["first"] == last_id + 1 and bounds["last"] - last_id <= limit
+
+
+def format_event(event_id, kind, payload):
+    data = json.dumps(payload, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+class EventBroadcaster:
+    """Consulta ``StatusEvent`` uma vez por intervalo e repassa os eventos a
+    todos os clientes conectados ao processo.
+
+    O custo no banco é uma consulta por segundo por processo, não por aba
+    aberta. Cada cliente tem uma fila limitada; quem não acompanhar é
+    desconectado e volta pelo ``Last-Event-ID``.
+    """
+
+    def __init__(self, interval=None, queue_size=1000):
+        self.interval = interval or getattr(settings, "EVENT_POLL_INTERVAL", 1.0)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.last_id = None
+        self._task = None
+
+    async def subscribe(self):
+        if self.last_id is None:
+            self.last_id = await sync_to_async(latest_event_id)()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue, self.last_id
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                events = await sync_to_async(_events_after)(self.last_id)
+            except Exception:
+                logger.exception("Falha ao consultar eventos de status")
+                events = []
+            for event in events:
+                self.last_id = event[0]
+                for queue in list(self.subscribers):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self.subscribers.discard(queue)
+                        queue.get_nowait()
+                        queue.put_nowait(None)
+            if events:
+                # Mantém em dia o snapshot que o /metrics lê sem consultar
+                try:
+                    await sync_to_async(_refresh_snapshot)()
+                except Exception:
+                    logger.exception("Falha ao atualizar o snapshot")
+            if len(events) < FETCH_LIMIT:
+                await asyncio.sleep(self.interval)
+        # Sem clientes: a próxima inscrição relê o último id
+        self.last_id = None
+
+
+def _refresh_snapshot():
+    # Import tardio: snapshot importa este módulo
+    from .snapshot import get_snapshot
+
+    get_snapshot()
+
+
+# Um broadcaster por event loop: sob ASGI há um loop por processo
+_broadcasters = {}
+
+
+def get_broadcaster():
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = _broadcasters[loop] = EventBroadcaster()
+    return broadcaster
+
+
+async def event_stream(last_event_id=None):
+    """Gera o stream SSE. Com ``last_event_id``, reproduz antes o que o cliente
+    perdeu; sem ele, começa pelos eventos novos."""
+    broadcaster = get_broadcaster()
+    queue, live_from = await broadcaster.subscribe()
+    try:
+        yield f"retry: {getattr(settings, 'EVENT_RETRY_MS', 3000)}\n\n"
+        sent = live_from
+        if last_event_id is not None and last_event_id < live_from:
+            if await sync_to_async(_can_replay)(last_event_id):
+                sent = last_event_id
+                while sent < live_from:
+                    events = await sync_to_async(_events_after)(sent)
+                    events = [event for event in events if event[0] <= live_from]
+                    if not events:
+                        break
+                    for event_id, kind, payload in events:
+                        yield format_event(event_id, kind, payload)
+                        sent = event_id
+            else:
+                yield format_event(live_from, "resync", {})
+                sent = live_from
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                break
+            if event[0] <= sent:
+                continue
+            yield format_event(*event)
+            sent = event[0]
+    finally:
+        broadcaster.unsubscribe(queue)
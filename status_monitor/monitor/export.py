@@ -0,0 +1,144 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import SystemDowntime, SystemStatusHistory
+
+
+# Conjuntos exportáveis: modelo, colunas (na ordem do CSV) e campos lidos.
+# A primeira coluna é sempre o id, que serve de cursor para retomar.
+DATASETS = {
+    "history": {
+        "model": SystemStatusHistory,
+        "columns": ("id", "server", "system", "status", "status_code", "response_ms", "checked_at"),
+        "fields": ("id", "system__server__name", "system__name", "status", "status_code", "response_ms", "checked_at"),
+    },
+    "downtimes": {
+        "model": SystemDowntime,
+        "columns": ("id", "server", "system", "status", "started_at", "ended_at", "duration_s"),
+        "fields": ("id", "system__server__name", "system__name", "status", "started_at", "ended_at"),
+    },
+}
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _moment(value):
+    return timezone.localtime(value).isoformat() if value else None
+
+
+def _history_row(row):
+    row_id, server, system, status, status_code, response_ms, checked_at = row
+    return (row_id, server, system, status, status_code, response_ms, _moment(checked_at))
+
+
+def _downtime_row(row):
+    row_id, server, system, status, started_at, ended_at = row
+    # Downtime em aberto: duração até agora, sem fim
+    duration = ((ended_at or timezone.now()) - started_at).total_seconds()
+    return (row_id, server, system, status, _moment(started_at), _moment(ended_at), round(duration))
+
+
+_ROW_BUILDERS = {"history": _history_row, "downtimes": _downtime_row}
+
+
+def export_queryset(dataset, system=None, server=None, start=None, end=None):
+    """Linhas de ``dataset`` filtradas por nome de sistema/servidor e período.
+
+    No histórico o período vale para ``checked_at``; nos downtimes entram os
+    que se sobrepõem a ``[start, end)``, inclusive os ainda abertos.
+    """
+    queryset = DATASETS[dataset]["model"].objects.all()
+    if system:
+        queryset = queryset.filter(system__name=system)
+    if server:
+        queryset = queryset.filter(system__server__name=server)
+    if dataset == "history":
+        if start:
+            queryset = queryset.filter(checked_at__gte=start)
+        if end:
+            queryset = queryset.filter(checked_at__lt=end)
+    else:
+        if start:
+            queryset = queryset.filter(Q(ended_at__isnull=True) | Q(ended_at__gt=start))
+        if end:
+            queryset = queryset.filter(started_at__lt=end)
+    return queryset
+
+
+def export_rows(dataset, after=0, page_size=None, chunk_size=None, **filters):
+    """Tuplas na ordem de ``DATASETS[dataset]["columns"]``, em ordem de id e a
+    partir do primeiro id maior que ``after``.
+
+    A leitura é por páginas de chave (``id > último``) de ``page_size``
+    linhas, cada uma percorrida com ``iterator(chunk_size)``: a memória fica
+    em um bloco e nenhuma consulta segura o snapshot de leitura do SQLite
+    (e o checkpoint do WAL) durante a exportação inteira.
+    """
+    page_size = page_size or getattr(settings, "EXPORT_PAGE_SIZE", 10000)
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    queryset = export_queryset(dataset, **filters).order_by("id").values_list(*DATASETS[dataset]["fields"])
+    build = _ROW_BUILDERS[dataset]
+    while True:
+        count = 0
+        for row in queryset.filter(id__gt=after)[:page_size].iterator(chunk_size=chunk_size):
+            count += 1
+            after = row[0]
+            yield build(row)
+        if count < page_size:
+            return
+
+
+class _Echo:
+    """Buffer que devolve o que recebe, para o ``csv.writer`` gerar linhas."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(dataset, rows, header=True):
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(DATASETS[dataset]["columns"])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(dataset, rows):
+    columns = DATASETS[dataset]["columns"]
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+
+
+def export_lines(dataset, fmt, rows, header=True):
+    """Linhas de texto de ``rows`` no formato ``fmt`` (``csv`` ou
+    ``ndjson``). ``header=False`` omite o cabeçalho do CSV, para continuar
+    um arquivo já iniciado."""
+    if fmt == "csv":
+        return csv_lines(dataset, rows, header)
+    return ndjson_lines(dataset, rows)
+
+
+def _next_block(lines, size):
+    return "".join(islice(lines, size))
+
+
+async def export_lines_async(lines, block_size=None):
+    """``lines`` para respostas ASGI. O Django consumiria um iterador síncrono
+    inteiro (``sync_to_async(list)``) antes do primeiro byte; aqui cada bloco
+    de ``block_size`` linhas é lido na thread do ORM e enviado em seguida."""
+    block_size = block_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    lines = iter(lines)
+    next_block = sync_to_async(_next_block)
+    while True:
+        block = await next_block(lines, block_size)
+        if not block:
+            return
+        yield block
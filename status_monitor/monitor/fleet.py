@@ -0,0 +1,177 @@
+import logging
+import math
+import random
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .downtime import record_closed_downtimes
+from .events import publish_catalog_change
+from .intervals import update_intervals
+from .latency import update_sketches
+from .models import Server, System, SystemDowntime, SystemStatus, SystemStatusHistory
+from .rollups import update_rollups
+from .services import CheckResult, check_status
+from .versioning import bump_version
+
+
+logger = logging.getLogger(__name__)
+
+# Perfis de sistema e a fração da frota de cada um. Os nomes são as rotas
+# do servidor de alvos falsos (monitor/stubs.py).
+PROFILES = (
+    ("fast", 0.70),
+    ("slow", 0.10),
+    ("flap", 0.10),
+    ("forbidden", 0.05),
+    ("hang", 0.05),
+)
+
+# Por perfil: chance de começar uma falha a cada verificação, duração média
+# da falha (em verificações), código da falha e latência mediana (ms)
+BEHAVIOR = {
+    "fast": (0.002, 6, 500, 80),
+    "slow": (0.005, 4, 500, 1500),
+    "flap": (0.15, 2, 500, 120),
+    "forbidden": (1.0, math.inf, 403, 60),
+    "hang": (0.05, 30, 0, 5000),
+}
+
+
+def _pick_profile(rng):
+    roll = rng.random()
+    for profile, share in PROFILES:
+        roll -= share
+        if roll < 0:
+            return profile
+    return PROFILES[0][0]
+
+
+def _simulate(rng, profile, start, end, step):
+    """Sequência ``(status_code, elapsed_ms, checked_at)`` de um sistema."""
+    failure_chance, mean_length, failure_code, median_ms = BEHAVIOR[profile]
+    checks = []
+    remaining = 0
+    moment = start + timedelta(seconds=rng.uniform(0, step.total_seconds()))
+    while moment <= end:
+        if remaining <= 0 and rng.random() < failure_chance:
+            remaining = math.inf if math.isinf(mean_length) else max(1, int(rng.expovariate(1 / mean_length)))
+        if remaining > 0:
+            remaining -= 1
+            status_code = failure_code
+        else:
+            status_code = 200
+        elapsed_ms = int(rng.lognormvariate(math.log(median_ms), 0.4))
+        checks.append((status_code, elapsed_ms, moment))
+        moment += step
+    return checks
+
+
+def _downtimes(system, checks):
+    """Downtimes de uma sequência de verificações, pela mesma regra de
+    ``_apply_checks``: abre no primeiro não-UP, fecha no próximo UP."""
+    downtimes, current = [], None
+    for check in checks:
+        status_str = check_status(check)
+        if status_str == "UP":
+            if current is not None:
+                current.ended_at = check.checked_at
+                current = None
+        elif current is None:
+            current = SystemDowntime(system_id=system.pk, status=status_str, started_at=check.checked_at)
+            downtimes.append(current)
+        else:
+            current.status = status_str
+    return downtimes
+
+
+def clear_fleet(prefix):
+    """Remove os servidores gerados com ``prefix`` (e tudo o que depende deles)."""
+    return Server.objects.filter(name__startswith=f"{prefix}-server-").delete()[0]
+
+
+def generate_fleet(servers, systems_per_server, days=0, interval=60, target=None, prefix="fleet", seed=42):
+    """Cadastra ``servers`` × ``systems_per_server`` sistemas e, com ``days``,
+    um histórico simulado com uma verificação a cada ``interval`` minutos.
+
+    Com ``target`` (URL do ``stub_targets``), cada sistema aponta para a rota
+    do seu perfil; sem ele, para hosts de exemplo. O histórico passa pelas
+    mesmas funções de agregação da gravação normal (intervalos, latência,
+    agregações e livro de downtime), sem gerar eventos nem notificações.
+    Retorna ``(sistemas, verificações)``.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    step = timedelta(minutes=interval)
+    store_checks = getattr(settings, "STATUS_HISTORY_MODE", "checks") != "intervals"
+    total_systems = total_checks = 0
+
+    for server_index in range(servers):
+        with transaction.atomic():
+            server = Server.objects.create(name=f"{prefix}-server-{server_index}")
+            profiles = [_pick_profile(rng) for _ in range(systems_per_server)]
+            systems = System.objects.bulk_create(
+                System(
+                    name=f"{prefix}-{server_index}-{index}",
+                    url=f"{target.rstrip('/')}/{profile}/{server_index}-{index}"
+                    if target
+                    else f"https://{prefix}-{server_index}.example.com/{profile}/{index}",
+                    server=server,
+                    check_interval=rng.choice((30, 60, 120, 300)),
+                )
+                for index, profile in enumerate(profiles)
+            )
+
+            statuses, downtimes = [], []
+            for system, profile in zip(systems, profiles):
+                checks = [
+                    CheckResult(system, status_code, elapsed_ms, checked_at)
+                    for status_code, elapsed_ms, checked_at in _simulate(
+                        rng, profile, now - timedelta(days=days), now, step
+                    )
+                ] if days else []
+                if not checks:
+                    continue
+                total_checks += len(checks)
+
+                if store_checks:
+                    SystemStatusHistory.objects.bulk_create(
+                        (
+                            SystemStatusHistory(
+                                system_id=system.pk,
+                                status=check_status(check),
+                                status_code=check.status_code,
+                                response_ms=check.elapsed_ms,
+                                checked_at=check.checked_at,
+                            )
+                            for check in checks
+                        ),
+                        batch_size=2000,
+                    )
+                update_intervals(
+                    (system.pk, check_status(check), check.status_code, check.checked_at) for check in checks
+                )
+                update_sketches(checks)
+                update_rollups((system.pk, check_status(check), check.checked_at) for check in checks)
+                downtimes.extend(_downtimes(system, checks))
+
+                last = checks[-1]
+                statuses.append(SystemStatus(
+                    system=system,
+                    status=check_status(last),
+                    status_code=last.status_code,
+                    response_ms=last.elapsed_ms,
+                    checked_at=last.checked_at,
+                ))
+
+            SystemStatus.objects.bulk_create(statuses)
+            SystemDowntime.objects.bulk_create(downtimes, batch_size=2000)
+            record_closed_downtimes([downtime for downtime in downtimes if downtime.ended_at])
+        total_systems += len(systems)
+        logger.info("Servidor %d/%d gerado (%d sistemas)", server_index + 1, servers, len(systems))
+
+    # bulk_create não dispara os sinais de cadastro: avisa uma vez no final
+    publish_catalog_change()
+    bump_version(catalog=True)
+    return total_systems, total_checks
@@ -0,0 +1,101 @@
+import base64
+import json
+
+from bisect import bisect_right
+from django.utils import timezone
+from .events import CHECKED_AT_FORMAT
+from .snapshot import SORT_KEYS, status_bucket
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Filtro de status da grade; PENDING = ainda sem verificação
+STATUS_FILTERS = ("UP", "FORBIDDEN", "DOWN", "PENDING")
+
+
+def encode_cursor(sort, key):
+    raw = json.dumps([sort, list(key)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value, sort):
+    """Chave do último sistema da página anterior. ``ValueError`` se o cursor
+    for inválido ou de outra ordenação."""
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        cursor_sort, key = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(value) from exc
+    if cursor_sort != sort or not isinstance(key, list) or not key:
+        raise ValueError(value)
+    return tuple(key)
+
+
+def _item(entry, server_names):
+    status = entry["current_status"]
+    return {
+        "id": entry["id"],
+        "name": entry["name"],
+        "url": entry["url"],
+        "server": server_names[entry["server_id"]],
+        "status": status and status["status"],
+        "status_code": status and status["status_code"],
+        "response_ms": status and status["response_ms"],
+        "checked_at": timezone.localtime(status["checked_at"]).strftime(CHECKED_AT_FORMAT)
+        if status and status["checked_at"]
+        else None,
+        "phases": status and status["phases"],
+        "resolved_ip": status and status["resolved_ip"],
+        "tls_expires_at": timezone.localtime(status["tls_expires_at"]).strftime(CHECKED_AT_FORMAT)
+        if status and status["tls_expires_at"]
+        else None,
+    }
+
+
+def system_page(snapshot, sort="name", cursor=None, limit=DEFAULT_LIMIT, query=None, statuses=None, server_id=None):
+    """Uma página da grade de sistemas a partir do snapshot.
+
+    A paginação é por chave: o cursor guarda a chave de ordenação do último
+    sistema entregue, e a próxima página começa logo depois dela na ordem da
+    versão atual (busca binária). Sistemas que mudam de posição entre uma
+    página e outra não fazem a grade repetir nem pular os demais.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(sort)
+    keys = snapshot.ordered(sort)
+    position = 0
+    if cursor:
+        try:
+            position = bisect_right(keys, decode_cursor(cursor, sort))
+        except TypeError as exc:
+            # Cursor com tipos que não se comparam às chaves desta ordenação
+            raise ValueError(cursor) from exc
+    query = (query or "").strip().lower()
+    texts = snapshot.search_text() if query else None
+    statuses = set(statuses or ())
+    server_names = {server: name for server, name, _ in snapshot.servers}
+
+    page, has_more = [], False
+    for index in range(position, len(keys)):
+        key = keys[index]
+        system_id = key[-1]
+        entry = snapshot.systems[system_id]
+        if server_id is not None and entry["server_id"] != server_id:
+            continue
+        if statuses:
+            bucket = status_bucket(entry["current_status"] and entry["current_status"]["status"]) or "PENDING"
+            if bucket not in statuses:
+                continue
+        if query and query not in texts[system_id]:
+            continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(key)
+
+    return {
+        "sort": sort,
+        "results": [_item(snapshot.systems[key[-1]], server_names) for key in page],
+        "next_cursor": encode_cursor(sort, page[-1]) if has_more else None,
+    }
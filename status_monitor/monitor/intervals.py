@@ -0,0 +1,115 @@
+from datetime import timedelta
+from django.db.models import Max
+from django.utils import timezone
+from .models import SystemStatusInterval
+
+
+def update_intervals(entries):
+    """Estende ou abre intervalos de status para ``(system_id, status,
+    status_code, checked_at)``, em ordem cronológica. Deve rodar na mesma
+    transação da gravação das verificações."""
+    entries = list(entries)
+    if not entries:
+        return
+
+    system_ids = {entry[0] for entry in entries}
+    latest_ids = (
+        SystemStatusInterval.objects.filter(system_id__in=system_ids)
+        .values("system_id")
+        .annotate(latest=Max("id"))
+        .values("latest")
+    )
+    current = {
+        interval.system_id: interval
+        for interval in SystemStatusInterval.objects.filter(id__in=latest_ids)
+    }
+
+    to_create, to_update = [], {}
+    for system_id, status_str, status_code, checked_at in entries:
+        interval = current.get(system_id)
+        if interval is not None and interval.status == status_str and interval.status_code == status_code:
+            interval.last_seen = max(interval.last_seen, checked_at)
+            interval.check_count += 1
+            if interval.pk:
+                to_update[interval.pk] = interval
+            continue
+
+        interval = SystemStatusInterval(
+            system_id=system_id,
+            status=status_str,
+            status_code=status_code,
+            first_seen=checked_at,
+            last_seen=checked_at,
+        )
+        current[system_id] = interval
+        to_create.append(interval)
+
+    SystemStatusInterval.objects.bulk_create(to_create)
+    SystemStatusInterval.objects.bulk_update(to_update.values(), ["last_seen", "check_count"])
+
+
+def status_at(system, when):
+    """Intervalo vigente em ``when`` (o último aberto até esse instante)."""
+    return (
+        SystemStatusInterval.objects.filter(system=system, first_seen__lte=when)
+        .order_by("-first_seen", "-id")
+        .first()
+    )
+
+
+def intervals_between(system, start, end):
+    """Intervalos que cobrem ``[start, end)``, cada um com o trecho efetivo.
+
+    Um intervalo vale de ``first_seen`` até o ``first_seen`` do seguinte (a
+    transição foi observada ali), mas no máximo um ``check_interval`` depois
+    do seu ``last_seen``: se as verificações pararam por mais tempo que isso,
+    o trecho seguinte fica sem dados em vez de repetir o último status. Dentro
+    de um mesmo intervalo as verificações não são guardadas uma a uma, então
+    uma pausa entre duas verificações com o mesmo resultado não aparece.
+    """
+    grace = timedelta(seconds=system.check_interval)
+    now = timezone.now()
+    intervals = list(
+        SystemStatusInterval.objects.filter(system=system, first_seen__gt=start, first_seen__lt=end)
+        .order_by("first_seen", "id")
+    )
+    opening = status_at(system, start)
+    if opening is not None:
+        intervals.insert(0, opening)
+
+    spans = []
+    for index, interval in enumerate(intervals):
+        if index + 1 < len(intervals):
+            following = intervals[index + 1].first_seen
+        else:
+            following = (
+                SystemStatusInterval.objects.filter(system=system, first_seen__gte=end)
+                .order_by("first_seen", "id")
+                .values_list("first_seen", flat=True)
+                .first()
+            )
+        until = min(following or now, interval.last_seen + grace)
+        span_start, span_end = max(interval.first_seen, start), min(until, end)
+        if span_end > span_start:
+            spans.append((interval, span_start, span_end))
+    return spans
+
+
+def uptime_between(system, start, end):
+    """Uptime exato de ``system`` em ``[start, end)`` a partir dos intervalos.
+
+    Só o tempo coberto por verificações entra na conta; períodos sem dados
+    (antes da primeira verificação, depois da última ou pausas maiores que
+    ``check_interval`` numa mudança de status) são ignorados.
+    """
+    covered = up = 0.0
+    for interval, span_start, span_end in intervals_between(system, start, end):
+        seconds = (span_end - span_start).total_seconds()
+        covered += seconds
+        if interval.status == "UP":
+            up += seconds
+    return {
+        "covered_seconds": covered,
+        "up_seconds": up,
+        "uptime": round(up / covered * 100, 4) if covered else None,
+    }
@@ -0,0 +1,91 @@
+from django.conf import settings
+from .models import LatencySketch
+from .rollups import hour_bucket
+from .sketch import DDSketch
+
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def update_sketches(checks):
+    """Acrescenta o tempo de resposta das verificações aos sketches horários.
+
+    Verificações sem resposta (``status_code == 0``) ficam de fora: o tempo
+    delas é só o timeout e distorceria os percentis.
+    """
+    samples = {}
+    for check in checks:
+        if check.elapsed_ms is None or not check.status_code:
+            continue
+        key = (check.system.pk, hour_bucket(check.checked_at))
+        samples.setdefault(key, []).append(check.elapsed_ms)
+    if not samples:
+        return
+
+    system_ids = {system_id for system_id, _ in samples}
+    buckets = {bucket for _, bucket in samples}
+    existing = {
+        (row.system_id, row.bucket_start): row
+        for row in LatencySketch.objects.filter(system_id__in=system_ids, bucket_start__in=buckets)
+    }
+
+    accuracy = getattr(settings, "LATENCY_SKETCH_ACCURACY", 0.01)
+    to_create, to_update = [], []
+    for (system_id, bucket), values in samples.items():
+        row = existing.get((system_id, bucket))
+        if row is None:
+            row = LatencySketch(system_id=system_id, bucket_start=bucket)
+            sketch = DDSketch(accuracy)
+            to_create.append(row)
+        else:
+            sketch = DDSketch.from_dict(row.sketch)
+            to_update.append(row)
+        for value in values:
+            sketch.add(value)
+        row.sketch = sketch.to_dict()
+        row.count = sketch.count
+
+    LatencySketch.objects.bulk_create(to_create)
+    LatencySketch.objects.bulk_update(to_update, ["sketch", "count"])
+
+
+def _summary(sketch):
+    summary = {
+        "count": sketch.count,
+        "mean_ms": round(sketch.mean, 1) if sketch.count else None,
+        "max_ms": sketch.max,
+    }
+    for q in PERCENTILES:
+        value = sketch.quantile(q)
+        summary[f"p{int(q * 100)}_ms"] = round(value, 1) if value is not None else None
+    return summary
+
+
+def latency_percentiles(since, until=None, system=None, server=None):
+    """Percentis de latência por sistema e por servidor, combinando sketches."""
+    rows = LatencySketch.objects.filter(bucket_start__gte=hour_bucket(since))
+    if until is not None:
+        rows = rows.filter(bucket_start__lte=until)
+    if system:
+        rows = rows.filter(system__name=system)
+    if server:
+        rows = rows.filter(system__server__name=server)
+
+    accuracy = getattr(settings, "LATENCY_SKETCH_ACCURACY", 0.01)
+    per_system, per_server, system_server = {}, {}, {}
+    for name, server_name, data in rows.values_list("system__name", "system__server__name", "sketch").iterator():
+        sketch = DDSketch.from_dict(data)
+        per_system.setdefault(name, DDSketch(accuracy)).merge(sketch)
+        per_server.setdefault(server_name, DDSketch(accuracy)).merge(sketch)
+        system_server[name] = server_name
+
+    return {
+        "systems": [
+            {"name": name, "server": system_server[name], **_summary(sketch)}
+            for name, sketch in sorted(per_system.items())
+        ],
+        "servers": [
+            {"name": name, **_summary(sketch)}
+            for name, sketch in sorted(per_server.items())
+        ],
+    }
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from monitor.downtime import backfill_downtime_ledger
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o livro diário de downtime (DowntimeDaily) a partir dos downtimes encerrados."
+
+    def handle(self, *args, **options):
+        rows = backfill_downtime_ledger()
+        self.stdout.write(self.style.SUCCESS(f"{rows} linhas diárias de downtime recalculadas."))
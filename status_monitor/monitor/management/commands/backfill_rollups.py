@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from monitor.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula as agregações por hora e por dia a partir do histórico de status existente."
+
+    def handle(self, *args, **options):
+        hourly, daily = backfill_rollups()
+        self.stdout.write(self.style.SUCCESS(f"{hourly} agregações horárias e {daily} diárias recalculadas."))
@@ -0,0 +1,78 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from monitor.benchmark import run_benchmark
+from monitor.stubs import start_stub_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a vazão das verificações e a latência/consultas de system_status, systems_list, "
+        "dashboard_summary e dashboard. Salva o resultado em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=100, help="Requisições medidas por endpoint.")
+        parser.add_argument(
+            "--probe-limit",
+            type=int,
+            default=500,
+            help="Quantos sistemas (sorteados) entram na medida de vazão das verificações.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "PROBE_WORKERS", 20),
+            help="Verificações simultâneas na medida de vazão.",
+        )
+        parser.add_argument("--skip-probes", action="store_true", help="Não mede a vazão das verificações.")
+        parser.add_argument(
+            "--stub-port",
+            type=int,
+            default=None,
+            help="Sobe o stub_targets nesta porta durante o benchmark (para frotas geradas com --target).",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Arquivo JSON de saída (padrão: benchmark-AAAAMMDD-HHMMSS.json).",
+        )
+
+    def handle(self, *args, **options):
+        stub = start_stub_server(port=options["stub_port"]) if options["stub_port"] is not None else None
+        try:
+            # Nenhuma transição provocada pelo benchmark vira aviso no Discord
+            with override_settings(DISCORD_WEBHOOK_URL=""):
+                report = run_benchmark(
+                    requests=options["requests"],
+                    probe_limit=options["probe_limit"],
+                    workers=options["workers"],
+                    seed=options["seed"],
+                    skip_probes=options["skip_probes"],
+                )
+        finally:
+            if stub is not None:
+                stub.shutdown()
+                stub.server_close()
+
+        output = options["output"] or timezone.localtime().strftime("benchmark-%Y%m%d-%H%M%S.json")
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+
+        probes = report.get("probes")
+        if probes:
+            self.stdout.write(
+                f"verificações: {probes['systems']} em {probes['seconds']}s "
+                f"({probes['per_second']}/s), p50 {probes['response_ms'].get('p50')} ms"
+            )
+        for name, result in report.get("endpoints", {}).items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{name:<18} p50 {latency['p50']:>8} ms  p99 {latency['p99']:>8} ms  "
+                f"consultas {result['queries']['mean']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Resultado salvo em {output}"))
@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from monitor.notifications import get_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Envia as notificações pendentes do Discord (fila NotificationOutbox)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Envia o que estiver pendente e encerra (útil em um cron).",
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = get_dispatcher()
+
+        if options["once"]:
+            sent = dispatcher.drain()
+            self.stdout.write(self.style.SUCCESS(f"{sent} notificações processadas."))
+            return
+
+        def _shutdown(signum, frame):
+            dispatcher.stop()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        self.stdout.write("Despachante de notificações iniciado. Ctrl+C para encerrar.")
+        dispatcher.run()
+        self.stdout.write("Despachante encerrado.")
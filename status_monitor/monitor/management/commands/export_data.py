@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from monitor.export import DATASETS, FORMATS, export_lines, export_rows
+
+
+def iso_datetime(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class Command(BaseCommand):
+    help = "Exporta o histórico de verificações ou os downtimes em CSV ou NDJSON, em ordem de id."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--system", help="Nome do sistema.")
+        parser.add_argument("--server", help="Nome do servidor.")
+        parser.add_argument("--from", dest="start", type=iso_datetime, help="Início (ISO 8601).")
+        parser.add_argument("--to", dest="end", type=iso_datetime, help="Fim (ISO 8601, exclusivo).")
+        parser.add_argument(
+            "--after",
+            type=int,
+            default=0,
+            help="Retoma depois deste id (o último da exportação interrompida).",
+        )
+        parser.add_argument("--output", "-o", help="Arquivo de saída (padrão: saída padrão).")
+
+    def handle(self, *args, **options):
+        rows = export_rows(
+            options["dataset"],
+            after=options["after"],
+            system=options["system"],
+            server=options["server"],
+            start=options["start"],
+            end=options["end"],
+        )
+        # Retomando (--after), continua o arquivo: sem cabeçalho e sem truncar
+        resume = bool(options["after"])
+        lines = export_lines(options["dataset"], options["fmt"], rows, header=not resume)
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        try:
+            with open(options["output"], "a" if resume else "w", encoding="utf-8", newline="") as output:
+                count = 0
+                for line in lines:
+                    output.write(line)
+                    count += 1
+        except OSError as exc:
+            raise CommandError(str(exc)) from exc
+        if options["fmt"] == "csv" and not resume:
+            count -= 1
+        self.stdout.write(self.style.SUCCESS(f"{count} linhas gravadas em {options['output']}."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from monitor.fleet import clear_fleet, generate_fleet
+
+
+class Command(BaseCommand):
+    help = "Gera uma frota sintética de servidores e sistemas, com histórico simulado, para testes de carga."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", type=int, default=100, help="Quantidade de servidores.")
+        parser.add_argument("--systems-per-server", type=int, default=20, help="Sistemas por servidor.")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=0,
+            help="Dias de histórico simulado (0 = só o cadastro).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="Minutos entre as verificações do histórico simulado.",
+        )
+        parser.add_argument(
+            "--target",
+            default=None,
+            help="URL base do stub_targets (ex.: http://127.0.0.1:8001). Sem ela, usa hosts de exemplo.",
+        )
+        parser.add_argument("--prefix", default="fleet", help="Prefixo dos nomes gerados.")
+        parser.add_argument("--seed", type=int, default=42, help="Semente para gerar sempre a mesma frota.")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Remove antes a frota gerada com o mesmo prefixo.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            removed = clear_fleet(options["prefix"])
+            self.stdout.write(f"{removed} registros da frota anterior removidos.")
+
+        systems, checks = generate_fleet(
+            servers=options["servers"],
+            systems_per_server=options["systems_per_server"],
+            days=options["days"],
+            interval=options["interval"],
+            target=options["target"],
+            prefix=options["prefix"],
+            seed=options["seed"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{systems} sistemas e {checks} verificações gerados."))
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from monitor.events import prune_events
+from monitor.notifications import prune_notifications
+from monitor.rollups import prune_history
+
+
+class Command(BaseCommand):
+    help = "Remove o histórico bruto de verificações mais antigo que a política de retenção."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "HISTORY_RETENTION_DAYS", 30),
+            help="Mantém apenas os últimos N dias de histórico bruto (padrão: HISTORY_RETENTION_DAYS).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Quantidade de linhas apagadas por transação.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Pausa (segundos) entre os blocos, liberando o banco para outras gravações.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_history(options["days"], chunk_size=options["chunk_size"], pause=options["pause"])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} linhas de histórico removidas."))
+        events = prune_events()
+        self.stdout.write(self.style.SUCCESS(f"{events} eventos de status removidos."))
+        notifications = prune_notifications(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"{notifications} notificações resolvidas removidas."))
@@ -0,0 +1,91 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from monitor.scheduler import ProbeScheduler
+from monitor.sharding import ShardedProbeScheduler
+
+
+class Command(BaseCommand):
+    help = "Verifica continuamente todos os sistemas, respeitando o check_interval de cada um."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "PROBE_WORKERS", 20),
+            help="Número máximo de verificações simultâneas.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=getattr(settings, "PROBE_JITTER", 0.1),
+            help="Variação aleatória aplicada ao intervalo (fração, ex.: 0.1 = ±10%%).",
+        )
+        parser.add_argument(
+            "--reload-interval",
+            type=int,
+            default=60,
+            help="A cada quantos segundos a lista de sistemas é recarregada do banco.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Verifica todos os sistemas uma única vez e encerra.",
+        )
+        parser.add_argument(
+            "--sharded",
+            action="store_true",
+            help="Divide os sistemas com os outros workers --sharded (em qualquer máquina com acesso ao banco).",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=getattr(settings, "PROBE_SHARDS", 64),
+            help="Número de shards; deve ser o mesmo em todos os workers.",
+        )
+        parser.add_argument(
+            "--lease-seconds",
+            type=int,
+            default=getattr(settings, "PROBE_LEASE_SECONDS", 30),
+            help="Validade da posse de um shard sem heartbeat.",
+        )
+        parser.add_argument(
+            "--worker-name",
+            default=None,
+            help="Nome do worker (padrão: host-pid).",
+        )
+
+    def handle(self, *args, **options):
+        if options["sharded"]:
+            if options["once"]:
+                raise CommandError("--once não combina com --sharded.")
+            scheduler = ShardedProbeScheduler(
+                workers=options["workers"],
+                jitter=options["jitter"],
+                reload_interval=options["reload_interval"],
+                shards=options["shards"],
+                lease_seconds=options["lease_seconds"],
+                name=options["worker_name"],
+            )
+        else:
+            scheduler = ProbeScheduler(
+                workers=options["workers"],
+                jitter=options["jitter"],
+                reload_interval=options["reload_interval"],
+            )
+
+        if options["once"]:
+            total = scheduler.run_once()
+            self.stdout.write(self.style.SUCCESS(f"{total} sistemas verificados."))
+            return
+
+        def _shutdown(signum, frame):
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+
+        self.stdout.write(f"Agendador iniciado com {options['workers']} workers. Ctrl+C para encerrar.")
+        scheduler.run()
+        self.stdout.write("Agendador encerrado.")
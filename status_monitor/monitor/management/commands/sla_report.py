@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from monitor.sla import parse_month, sla_report
+
+
+def _duration(seconds):
+    if seconds is None:
+        return "-"
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}m"
+
+
+class Command(BaseCommand):
+    help = "Relatório de SLA (disponibilidade, incidentes, MTTR, MTBF e maior queda) por servidor ou sistema."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="first", type=parse_month, help="Mês inicial AAAA-MM (padrão: o atual).")
+        parser.add_argument("--to", dest="last", type=parse_month, help="Mês final AAAA-MM, inclusive (padrão: --from).")
+        parser.add_argument("--system", help="Nome do sistema.")
+        parser.add_argument("--server", help="Nome do servidor.")
+        parser.add_argument("--systems", action="store_true", help="Uma linha por sistema em vez de por servidor.")
+        parser.add_argument("--json", action="store_true", help="Relatório completo em JSON.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        first = options["first"] or (today.year, today.month)
+        last = options["last"] or first
+        try:
+            report = sla_report(first, last, system=options["system"], server=options["server"])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        rows = report["systems"] if options["systems"] else report["servers"]
+        label = "system" if options["systems"] else "server"
+        self.stdout.write(f"SLA de {report['from']} a {report['to']} (até {report['end']})")
+        self.stdout.write(f"{'':40} {'disp. %':>9} {'quedas':>7} {'MTTR':>9} {'MTBF':>10} {'maior':>9}")
+        for row in rows + [{label: "Total", **report["overall"]}]:
+            availability = "-" if row["availability"] is None else f"{row['availability']:.3f}"
+            self.stdout.write(
+                f"{row[label][:40]:40} {availability:>9} {row['incidents']:>7} {_duration(row['mttr_s']):>9} "
+                f"{_duration(row['mtbf_s']):>10} {_duration(row['longest_s']):>9}"
+            )
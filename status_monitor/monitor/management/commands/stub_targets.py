@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from monitor.stubs import StubTargetServer
+
+
+class Command(BaseCommand):
+    help = "Sobe alvos HTTP falsos (rápido, lento, travado, instável e 403) para testes de carga."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--slow-ms", type=int, default=800, help="Atraso médio (ms) das rotas /slow/.")
+        parser.add_argument(
+            "--hang-seconds",
+            type=float,
+            default=30,
+            help="Por quanto tempo as rotas /hang/ seguram a conexão.",
+        )
+        parser.add_argument(
+            "--flap-period",
+            type=float,
+            default=60,
+            help="Segundos entre as trocas de 200/500 das rotas /flap/.",
+        )
+        parser.add_argument("--verbose", action="store_true", help="Registra cada requisição.")
+
+    def handle(self, *args, **options):
+        server = StubTargetServer(
+            (options["host"], options["port"]),
+            slow_ms=options["slow_ms"],
+            hang_seconds=options["hang_seconds"],
+            flap_period=options["flap_period"],
+            verbose=options["verbose"],
+        )
+        self.stdout.write(
+            f"Alvos falsos em {server.base_url}: /fast/ /slow/ /hang/ /flap/ /forbidden/ /error/. "
+            "Ctrl+C para encerrar."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write("Alvos falsos encerrados.")
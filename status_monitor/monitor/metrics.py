@@ -0,0 +1,253 @@
+import threading
+
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+
+# Formato de texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Acima disso, shards de threads encerradas são somados em um só ao criar
+# um novo (pools de threads por requisição criam threads o tempo todo)
+MAX_SHARDS = 64
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _ShardedMetric(ABC):
+    """Métrica com um dicionário por thread: quem registra só escreve no
+    próprio shard, sem lock; a coleta soma os shards.
+
+    Cópias de ``dict`` e ``list`` são atômicas no CPython, então a coleta
+    pode ler um shard enquanto a thread dona continua escrevendo nele.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= MAX_SHARDS:
+                    self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._retired[key] = self._merge(self._retired.get(key), value)
+        self._shards = alive
+
+    def _totals(self):
+        with self._lock:
+            self._retire_dead()
+            totals = {key: self._merge(None, value) for key, value in self._retired.items()}
+            for _, shard in self._shards:
+                for key, value in shard.copy().items():
+                    totals[key] = self._merge(totals.get(key), value)
+        return totals
+
+    @abstractmethod
+    def _merge(self, total, value):
+        """Soma ``value`` (de um shard) a ``total`` (``None`` no início)."""
+
+    @abstractmethod
+    def _samples(self):
+        """Linhas de amostra no formato de texto do Prometheus."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total, value):
+        return (total or 0) + value
+
+    def _samples(self):
+        for labels, value in sorted(self._totals().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # Contagem por faixa (a última é +Inf) e, no fim, a soma
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def _merge(self, total, value):
+        value = list(value)
+        if total is None:
+            return value
+        return [a + b for a, b in zip(total, value)]
+
+    def _samples(self):
+        names = self.labelnames + ("le",)
+        for labels, entry in sorted(self._totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(float(bound)),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Gauge:
+    """Valor lido no momento da coleta: ``collect()`` devolve
+    ``[(labels, valor), ...]``."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+def render_metrics():
+    """Todas as métricas do processo no formato de texto do Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+PROBE_DURATION = Histogram(
+    "isdown_probe_duration_seconds",
+    "Duração das verificações (check_url) por resultado.",
+    ("outcome",),
+)
+STATUS_TRANSITIONS = Counter(
+    "isdown_status_transitions_total",
+    "Mudanças de status gravadas.",
+    ("from", "to"),
+)
+SQLITE_RETRIES = Counter(
+    "isdown_sqlite_retries_total",
+    "Novas tentativas após OperationalError do SQLite.",
+    ("source",),
+)
+DATABASE_LOCKED_ERRORS = Counter(
+    "isdown_database_locked_errors_total",
+    "Requisições que terminaram em 500 por 'database is locked'.",
+)
+WRITE_REJECTED = Counter(
+    "isdown_write_rejected_total",
+    "Requisições recusadas com 503 porque a fila de gravação estava cheia.",
+)
+CHECKS_DROPPED = Counter(
+    "isdown_checks_dropped_total",
+    "Verificações descartadas após esgotar as tentativas de gravação.",
+)
+NOTIFY_DURATION = Histogram(
+    "isdown_notify_duration_seconds",
+    "Latência das chamadas ao webhook do Discord por resultado.",
+    ("outcome",),
+)
+NOTIFY_FAILURES = Counter(
+    "isdown_notify_failures_total",
+    "Envios ao Discord que falharam (retry = vai tentar de novo, failed = descartado).",
+    ("result",),
+)
+
+
+def probe_outcome(status_code=None, exc=None):
+    if exc is not None:
+        return type(exc).__name__
+    return f"{status_code // 100}xx"
+
+
+def count_transitions(transitions):
+    for previous, current in transitions:
+        STATUS_TRANSITIONS.inc(previous or "NONE", current)
+
+
+def _system_counts():
+    # Snapshot em memória como está, sem consultar a versão no banco: as
+    # gravações do processo, as views e o SSE o mantêm em dia
+    from .snapshot import cached_snapshot
+
+    snapshot = cached_snapshot()
+    for server_id, name, _ in snapshot.servers:
+        for status, value in snapshot.server_counts[server_id].items():
+            yield (name, status), value
+
+
+def _write_queue_depth():
+    from .writer import get_writer
+
+    yield (), get_writer().pending()
+
+
+SYSTEMS = Gauge(
+    "isdown_systems",
+    "Sistemas por servidor e status atual.",
+    ("server", "status"),
+    collect=_system_counts,
+)
+WRITE_QUEUE_DEPTH = Gauge(
+    "isdown_write_queue_depth",
+    "Verificações aguardando a thread de escrita.",
+    collect=_write_queue_depth,
+)
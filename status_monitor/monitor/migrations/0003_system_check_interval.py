@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0002_add_status_models"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="system",
+            name="check_interval",
+            field=models.PositiveIntegerField(default=60),
+        ),
+    ]
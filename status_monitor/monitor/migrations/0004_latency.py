@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0003_system_check_interval"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="systemstatus",
+            name="response_ms",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="systemstatushistory",
+            name="response_ms",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="LatencySketch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bucket_start", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("sketch", models.JSONField(default=dict)),
+                (
+                    "system",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="latency_sketches",
+                        to="monitor.system",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-bucket_start"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("system", "bucket_start"), name="latency_sketch_system_bucket")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0004_latency"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusRollupHourly",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bucket_start", models.DateTimeField()),
+                ("checks", models.PositiveIntegerField(default=0)),
+                ("up", models.PositiveIntegerField(default=0)),
+                ("forbidden", models.PositiveIntegerField(default=0)),
+                ("down", models.PositiveIntegerField(default=0)),
+                (
+                    "system",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_rollups",
+                        to="monitor.system",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-bucket_start"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("system", "bucket_start"), name="rollup_hourly_system_bucket")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="StatusRollupDaily",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("checks", models.PositiveIntegerField(default=0)),
+                ("up", models.PositiveIntegerField(default=0)),
+                ("forbidden", models.PositiveIntegerField(default=0)),
+                ("down", models.PositiveIntegerField(default=0)),
+                (
+                    "system",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to="monitor.system",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-day"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("system", "day"), name="rollup_daily_system_day")
+                ],
+            },
+        ),
+    ]
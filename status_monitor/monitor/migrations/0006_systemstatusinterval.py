@@ -0,0 +1,75 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_intervals(apps, schema_editor):
+    SystemStatusHistory = apps.get_model("monitor", "SystemStatusHistory")
+    SystemStatusInterval = apps.get_model("monitor", "SystemStatusInterval")
+
+    pending = []
+    current = None
+    rows = (
+        SystemStatusHistory.objects.order_by("system_id", "checked_at", "id")
+        .values_list("system_id", "status", "status_code", "checked_at")
+        .iterator(chunk_size=2000)
+    )
+    for system_id, status, status_code, checked_at in rows:
+        if (
+            current is not None
+            and current.system_id == system_id
+            and current.status == status
+            and current.status_code == status_code
+        ):
+            current.last_seen = checked_at
+            current.check_count += 1
+            continue
+
+        current = SystemStatusInterval(
+            system_id=system_id,
+            status=status,
+            status_code=status_code,
+            first_seen=checked_at,
+            last_seen=checked_at,
+            check_count=1,
+        )
+        pending.append(current)
+        # Mantém o último intervalo em memória: ele ainda pode ser estendido
+        if len(pending) > 1000:
+            SystemStatusInterval.objects.bulk_create(pending[:-1])
+            pending = pending[-1:]
+
+    SystemStatusInterval.objects.bulk_create(pending)
+
+
+def clear_intervals(apps, schema_editor):
+    apps.get_model("monitor", "SystemStatusInterval").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0005_status_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SystemStatusInterval",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("status", models.CharField(max_length=20)),
+                ("status_code", models.IntegerField(blank=True, null=True)),
+                ("first_seen", models.DateTimeField()),
+                ("last_seen", models.DateTimeField()),
+                ("check_count", models.PositiveIntegerField(default=1)),
+                (
+                    "system",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_intervals",
+                        to="monitor.system",
+                    ),
+                ),
+            ],
+            options={"ordering": ["-first_seen"]},
+        ),
+        migrations.RunPython(build_intervals, clear_intervals),
+    ]
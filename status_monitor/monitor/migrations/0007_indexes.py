@@ -0,0 +1,54 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0006_systemstatusinterval"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="systemstatus",
+            index=models.Index(fields=["status"], name="status_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="systemstatushistory",
+            index=models.Index(fields=["system", "checked_at"], name="history_system_checked_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="systemstatushistory",
+            index=models.Index(fields=["checked_at"], name="history_checked_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="systemstatusinterval",
+            index=models.Index(fields=["system", "first_seen"], name="interval_system_first_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="systemdowntime",
+            index=models.Index(
+                condition=models.Q(("ended_at__isnull", True)),
+                fields=["system"],
+                name="downtime_open_system_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="systemdowntime",
+            index=models.Index(fields=["started_at"], name="downtime_started_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="systemdowntime",
+            index=models.Index(fields=["ended_at"], name="downtime_ended_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="latencysketch",
+            index=models.Index(fields=["bucket_start"], name="latency_sketch_bucket_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="statusrolluphourly",
+            index=models.Index(fields=["bucket_start"], name="rollup_hourly_bucket_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="statusrollupdaily",
+            index=models.Index(fields=["day"], name="rollup_daily_day_idx"),
+        ),
+    ]
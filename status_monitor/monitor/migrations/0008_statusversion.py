@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+def create_singleton(apps, schema_editor):
+    StatusVersion = apps.get_model("monitor", "StatusVersion")
+    StatusVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0007_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusVersion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("version", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_singleton, migrations.RunPython.noop),
+    ]
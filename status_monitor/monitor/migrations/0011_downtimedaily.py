@@ -0,0 +1,91 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+# Cópia congelada de monitor.downtime (split_by_day/ledger_entries) como era
+# nesta migração: mudanças futuras no módulo não alteram o que ela grava.
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def split_by_day(start, end):
+    segments = []
+    day = timezone.localtime(start).date()
+    cursor = start
+    while cursor < end:
+        next_midnight = _local_midnight(day + timedelta(days=1))
+        segment_end = min(end, next_midnight)
+        segments.append((day, (segment_end - cursor).total_seconds(), cursor if end > next_midnight else None))
+        cursor = segment_end
+        day += timedelta(days=1)
+    return segments
+
+
+def ledger_entries(downtimes):
+    entries = {}
+    for system_id, started_at, ended_at in downtimes:
+        for day, seconds, tail_start in split_by_day(started_at, ended_at):
+            entry = entries.setdefault((system_id, day), [0.0, None])
+            entry[0] += seconds
+            if tail_start is not None:
+                entry[1] = tail_start
+    return entries
+
+
+def build_ledger(apps, schema_editor):
+    SystemDowntime = apps.get_model("monitor", "SystemDowntime")
+    DowntimeDaily = apps.get_model("monitor", "DowntimeDaily")
+
+    entries = ledger_entries(
+        SystemDowntime.objects.filter(ended_at__isnull=False)
+        .values_list("system_id", "started_at", "ended_at")
+        .iterator(chunk_size=2000)
+    )
+    DowntimeDaily.objects.bulk_create(
+        (
+            DowntimeDaily(system_id=system_id, day=day, seconds=seconds, tail_start=tail_start)
+            for (system_id, day), (seconds, tail_start) in entries.items()
+        ),
+        batch_size=1000,
+    )
+
+
+def clear_ledger(apps, schema_editor):
+    apps.get_model("monitor", "DowntimeDaily").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0010_notificationoutbox"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DowntimeDaily",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("seconds", models.FloatField(default=0)),
+                ("tail_start", models.DateTimeField(blank=True, null=True)),
+                (
+                    "system",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="downtime_days",
+                        to="monitor.system",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-day"],
+                "indexes": [models.Index(fields=["day"], name="downtime_daily_day_idx")],
+                "constraints": [
+                    models.UniqueConstraint(fields=("system", "day"), name="downtime_daily_system_day")
+                ],
+            },
+        ),
+        migrations.RunPython(build_ledger, clear_ledger),
+    ]
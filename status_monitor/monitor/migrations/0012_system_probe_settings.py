@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import monitor.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0011_downtimedaily"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="system",
+            name="probe_method",
+            field=models.CharField(
+                choices=[("GET", "GET"), ("HEAD", "HEAD"), ("AUTO", "HEAD, com GET se não suportado")],
+                default="GET",
+                max_length=4,
+            ),
+        ),
+        migrations.AddField(
+            model_name="system",
+            name="probe_timeout",
+            field=models.FloatField(default=5.0),
+        ),
+        migrations.AddField(
+            model_name="system",
+            name="expected_status_codes",
+            field=models.CharField(
+                default="200", max_length=100, validators=[monitor.models.validate_status_codes]
+            ),
+        ),
+        migrations.AddField(
+            model_name="system",
+            name="max_body_bytes",
+            field=models.PositiveIntegerField(default=65536),
+        ),
+    ]
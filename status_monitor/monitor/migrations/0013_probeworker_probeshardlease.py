@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0012_system_probe_settings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProbeWorker",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("hostname", models.CharField(max_length=255)),
+                ("pid", models.PositiveIntegerField()),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("heartbeat_at", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ("shards", models.PositiveIntegerField(default=0)),
+                ("probes_total", models.PositiveBigIntegerField(default=0)),
+                ("probes_per_minute", models.FloatField(default=0)),
+                ("backlog", models.PositiveIntegerField(default=0)),
+                ("in_flight", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProbeShardLease",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("shard", models.PositiveIntegerField(unique=True)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "worker",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="leases",
+                        to="monitor.probeworker",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["shard"],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0013_probeworker_probeshardlease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="systemstatus",
+            name="change_seq",
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="statusversion",
+            name="catalog_version",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("monitor", "0015_systemdowntime_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="systemstatus",
+            name="phases",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="systemstatus",
+            name="resolved_ip",
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="systemstatus",
+            name="tls_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="systemstatushistory",
+            name="phases",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,23 @@
+from functools import cached_property
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
 
+def parse_status_codes(value):
+    """Converte ``"200, 204"`` em ``frozenset({200, 204})``."""
+    return frozenset(int(code) for code in value.replace(" ", "").split(",") if code)
+
+
+def validate_status_codes(value):
+    try:
+        codes = parse_status_codes(value)
+    except ValueError:
+        codes = None
+    if not codes or any(not 100 <= code <= 599 for code in codes):
+        raise ValidationError("Informe códigos HTTP separados por vírgula, por exemplo: 200, 204")
+
+
 class Server(models.Model):
     name = models.CharField(max_length=255, unique=True)
 
@@ -13,19 +29,55 @@ class System(models.Model):
     name = models.CharField(max_length=255, unique=True)
     url = models.URLField(max_length=200)
     server = models.ForeignKey(Server, on_delete=models.CASCADE, related_name="systems")
+    # Intervalo (em segundos) entre verificações feitas pelo agendador run_probes
+    check_interval = models.PositiveIntegerField(default=60)
+
+    # Como a verificação é feita (monitor.probe)
+    PROBE_METHODS = [
+        ("GET", "GET"),
+        ("HEAD", "HEAD"),
+        ("AUTO", "HEAD, com GET se não suportado"),
+    ]
+    probe_method = models.CharField(max_length=4, choices=PROBE_METHODS, default="GET")
+    # Tempo limite (segundos) para conectar e para cada leitura
+    probe_timeout = models.FloatField(default=5.0)
+    # Códigos que contam como UP; o padrão mantém a regra "só 200 é UP"
+    expected_status_codes = models.CharField(
+        max_length=100, default="200", validators=[validate_status_codes]
+    )
+    # Quanto do corpo é lido para que a conexão possa ser reaproveitada;
+    # corpos maiores são descartados fechando a conexão
+    max_body_bytes = models.PositiveIntegerField(default=64 * 1024)
 
     def __str__(self) -> str:
         return self.name
 
+    @cached_property
+    def expected_codes(self):
+        return parse_status_codes(self.expected_status_codes)
+
 
 class SystemStatus(models.Model):
     system = models.OneToOneField(System, on_delete=models.CASCADE, related_name="current_status")
     status = models.CharField(max_length=20)
     status_code = models.IntegerField(null=True, blank=True)
+    response_ms = models.IntegerField(null=True, blank=True)
     checked_at = models.DateTimeField(default=timezone.now)
+    # Versão global (StatusVersion) da última mudança de status; base do
+    # modo ?since= do systems_list
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+    # Milissegundos de DNS, conexão, TLS, primeiro byte e corpo (probe.PHASES),
+    # com null onde a fase não se aplica ou não foi medida
+    phases = models.JSONField(null=True, blank=True)
+    resolved_ip = models.GenericIPAddressField(null=True, blank=True)
+    tls_expires_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ["system__name"]
+        indexes = [
+            # Contagens por status no dashboard e no resumo
+            models.Index(fields=["status"], name="status_status_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.system.name}: {self.status}"
@@ -35,23 +87,71 @@ class SystemStatusHistory(models.Model):
     system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="status_history")
     status = models.CharField(max_length=20)
     status_code = models.IntegerField(null=True, blank=True)
+    response_ms = models.IntegerField(null=True, blank=True)
     checked_at = models.DateTimeField(default=timezone.now)
+    phases = models.JSONField(null=True, blank=True)
 
     class Meta:
         ordering = ["-checked_at"]
+        indexes = [
+            models.Index(fields=["system", "checked_at"], name="history_system_checked_idx"),
+            # Varreduras por período (retenção, agregações)
+            models.Index(fields=["checked_at"], name="history_checked_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.system.name} @ {self.checked_at:%Y-%m-%d %H:%M:%S}: {self.status}"
 
 
+class SystemStatusInterval(models.Model):
+    """Período contínuo em que um sistema manteve o mesmo status/código.
+
+    Verificações repetidas apenas estendem ``last_seen`` e ``check_count``;
+    um novo intervalo só é aberto quando o resultado muda.
+    """
+
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="status_intervals")
+    status = models.CharField(max_length=20)
+    status_code = models.IntegerField(null=True, blank=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    check_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ["-first_seen"]
+        indexes = [
+            models.Index(fields=["system", "first_seen"], name="interval_system_first_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.system.name} ({self.status}) de {self.first_seen:%Y-%m-%d %H:%M:%S} "
+            f"até {self.last_seen:%Y-%m-%d %H:%M:%S}"
+        )
+
+
 class SystemDowntime(models.Model):
     system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="downtimes")
     status = models.CharField(max_length=20)
     started_at = models.DateTimeField(default=timezone.now)
     ended_at = models.DateTimeField(null=True, blank=True)
+    # Última gravação; muda a assinatura do período no cache do relatório de
+    # SLA (monitor/sla.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-started_at"]
+        indexes = [
+            # Downtime aberto de cada sistema, consultado a cada verificação
+            models.Index(
+                fields=["system"],
+                condition=models.Q(ended_at__isnull=True),
+                name="downtime_open_system_idx",
+            ),
+            # Filtro por período (started_at OU ended_at) do resumo do dashboard
+            models.Index(fields=["started_at"], name="downtime_started_idx"),
+            models.Index(fields=["ended_at"], name="downtime_ended_idx"),
+        ]
 
     def __str__(self) -> str:
         end = self.ended_at.strftime("%Y-%m-%d %H:%M:%S") if self.ended_at else "em aberto"
@@ -61,3 +161,208 @@ class SystemDowntime(models.Model):
     def duration(self):
         end_time = self.ended_at or timezone.now()
         return end_time - self.started_at
+
+
+class LatencySketch(models.Model):
+    """Distribuição do tempo de resposta de um sistema em uma hora (DDSketch)."""
+
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="latency_sketches")
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ["-bucket_start"]
+        constraints = [
+            models.UniqueConstraint(fields=["system", "bucket_start"], name="latency_sketch_system_bucket"),
+        ]
+        indexes = [
+            models.Index(fields=["bucket_start"], name="latency_sketch_bucket_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.system.name} @ {self.bucket_start:%Y-%m-%d %H:%M}: {self.count} amostras"
+
+
+class StatusRollupHourly(models.Model):
+    """Contagem de verificações por sistema e por hora, mantida a cada gravação."""
+
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="hourly_rollups")
+    bucket_start = models.DateTimeField()
+    checks = models.PositiveIntegerField(default=0)
+    up = models.PositiveIntegerField(default=0)
+    forbidden = models.PositiveIntegerField(default=0)
+    down = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-bucket_start"]
+        constraints = [
+            models.UniqueConstraint(fields=["system", "bucket_start"], name="rollup_hourly_system_bucket"),
+        ]
+        indexes = [
+            models.Index(fields=["bucket_start"], name="rollup_hourly_bucket_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.system.name} @ {self.bucket_start:%Y-%m-%d %H:%M}: {self.up}/{self.checks} UP"
+
+
+class StatusRollupDaily(models.Model):
+    """Contagem de verificações por sistema e por dia (fuso local)."""
+
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="daily_rollups")
+    day = models.DateField()
+    checks = models.PositiveIntegerField(default=0)
+    up = models.PositiveIntegerField(default=0)
+    forbidden = models.PositiveIntegerField(default=0)
+    down = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["system", "day"], name="rollup_daily_system_day"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="rollup_daily_day_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.system.name} @ {self.day:%Y-%m-%d}: {self.up}/{self.checks} UP"
+
+
+class DowntimeDaily(models.Model):
+    """Segundos de downtime encerrado por sistema e por dia (fuso local).
+
+    ``tail_start`` marca o início do trecho do dia quando um downtime passa
+    da meia-noite; com ele o primeiro dia de uma janela é cortado sem reler
+    os downtimes longos.
+    """
+
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name="downtime_days")
+    day = models.DateField()
+    seconds = models.FloatField(default=0)
+    tail_start = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(fields=["system", "day"], name="downtime_daily_system_day"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="downtime_daily_day_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.system.name} @ {self.day:%Y-%m-%d}: {self.seconds:.0f}s"
+
+
+class StatusVersion(models.Model):
+    """Contador global incrementado a cada gravação de status (linha única).
+
+    Serve de ETag para as listagens e permite saber, sem consultar as tabelas
+    de status, se algo mudou desde a última leitura.
+    """
+
+    version = models.BigIntegerField(default=0)
+    # Versão da última mudança no cadastro de servidores/sistemas. Cursores
+    # anteriores a ela não enxergam remoções e precisam recarregar tudo.
+    catalog_version = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"versão {self.version}"
+
+
+class StatusEvent(models.Model):
+    """Evento publicado para os dashboards conectados (Server-Sent Events).
+
+    O ``id`` crescente é o ``Last-Event-ID`` usado para retomar o stream.
+    """
+
+    kind = models.CharField(max_length=20)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"#{self.pk} {self.kind} @ {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+
+class NotificationOutbox(models.Model):
+    """Mensagem do Discord aguardando envio.
+
+    Gravada na mesma transação da verificação que causou a transição e
+    entregue em segundo plano; sobrevive a reinícios até ser enviada.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATE_CHOICES = [(PENDING, "Pendente"), (SENT, "Enviada"), (FAILED, "Falhou")]
+
+    system = models.ForeignKey(System, on_delete=models.SET_NULL, null=True, blank=True, related_name="notifications")
+    status = models.CharField(max_length=20)
+    message = models.JSONField()
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbox_pending_due_idx",
+                condition=models.Q(state="pending"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.pk} {self.status} ({self.state})"
+
+
+class ProbeWorker(models.Model):
+    """Processo ``run_probes --sharded`` em execução.
+
+    O ``heartbeat_at`` é renovado a cada poucos segundos; quem para de
+    renovar por ``PROBE_LEASE_SECONDS`` deixa de contar na divisão dos shards.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    started_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now, db_index=True)
+    shards = models.PositiveIntegerField(default=0)
+    probes_total = models.PositiveBigIntegerField(default=0)
+    probes_per_minute = models.FloatField(default=0)
+    # Verificações já vencidas aguardando um worker livre
+    backlog = models.PositiveIntegerField(default=0)
+    in_flight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ProbeShardLease(models.Model):
+    """Posse de um shard (``system_id % PROBE_SHARDS``) por um worker até
+    ``expires_at``. Livre quando não tem worker ou a posse expirou."""
+
+    shard = models.PositiveIntegerField(unique=True)
+    worker = models.ForeignKey(
+        ProbeWorker, on_delete=models.SET_NULL, null=True, blank=True, related_name="leases"
+    )
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["shard"]
+
+    def __str__(self) -> str:
+        return f"shard {self.shard} ({self.worker or 'livre'})"
@@ -0,0 +1,360 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from .metrics import NOTIFY_DURATION, NOTIFY_FAILURES
+from .models import NotificationOutbox
+from .profiling import track_http
+
+
+logger = logging.getLogger(__name__)
+
+FAILURE_STATUSES = {"DOWN"}
+
+# Tempo que uma mensagem fica reservada para quem a está enviando. Se o
+# processo morrer no meio do envio, ela volta a ficar disponível depois disso.
+CLAIM_SECONDS = 60
+
+
+def build_message(system, status_str, status_code, checked_at, previous):
+    """Mensagem do Discord para a transição ``previous -> status_str``, ou
+    ``None`` se a transição não gera aviso."""
+    checked_at_str = timezone.localtime(checked_at).strftime("%Y-%m-%d %H:%M:%S")
+    if status_str in FAILURE_STATUSES and previous not in FAILURE_STATUSES:
+        readable_code = status_code or "sem resposta"
+        return {
+            "content": (
+                ":rotating_light: Sistema **{name}** está com status **{status}**.\n"
+                "URL: {url}\n"
+                "Código HTTP: {code}\n"
+                "Verificado em: {checked_at}"
+            ).format(
+                name=system.name,
+                status=status_str,
+                url=system.url,
+                code=readable_code,
+                checked_at=checked_at_str,
+            )
+        }
+    if previous in FAILURE_STATUSES and status_str == "UP":
+        return {
+            "content": (
+                ":white_check_mark: Sistema **{name}** voltou a ficar disponível.\n"
+                "URL: {url}\n"
+                "Verificado em: {checked_at}"
+            ).format(
+                name=system.name,
+                url=system.url,
+                checked_at=checked_at_str,
+            )
+        }
+    return None
+
+
+def enqueue_notifications(transitions):
+    """Coloca na fila as mensagens das transições ``(system, anterior, novo,
+    checked_at, status_code)``. Deve rodar na transação da gravação: só as
+    mudanças reais de status chegam aqui, então verificações repetidas não
+    geram avisos duplicados. Retorna quantas mensagens foram enfileiradas."""
+    if not getattr(settings, "DISCORD_WEBHOOK_URL", None):
+        return 0
+
+    rows = []
+    for system, previous, status_str, checked_at, status_code in transitions:
+        message = build_message(system, status_str, status_code, checked_at, previous)
+        if message:
+            rows.append(NotificationOutbox(system=system, status=status_str, message=message, created_at=checked_at))
+    NotificationOutbox.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _retry_after(response):
+    """Segundos pedidos pelo Discord em uma resposta 429."""
+    try:
+        return float(response.json()["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+class NotificationDispatcher:
+    """Envia as mensagens pendentes de ``NotificationOutbox`` em uma thread.
+
+    Cada mensagem é reservada com um UPDATE condicional antes do envio, então
+    vários processos podem despachar a mesma fila sem duplicar avisos. Um 429
+    pausa o envio pelo ``retry_after`` informado; outras falhas temporárias
+    usam backoff exponencial com jitter até ``NOTIFY_MAX_ATTEMPTS``.
+    """
+
+    def __init__(self, webhook_url=None, poll_interval=None, batch_size=20):
+        self.webhook_url = webhook_url or getattr(settings, "DISCORD_WEBHOOK_URL", None)
+        self.poll_interval = poll_interval or getattr(settings, "NOTIFY_POLL_INTERVAL", 5.0)
+        self.batch_size = batch_size
+        self.max_attempts = getattr(settings, "NOTIFY_MAX_ATTEMPTS", 10)
+        self.backoff_base = getattr(settings, "NOTIFY_BACKOFF_BASE", 2.0)
+        self.backoff_max = getattr(settings, "NOTIFY_BACKOFF_MAX", 300.0)
+        self.session = requests.Session()
+
+        self._paused_until = 0.0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "rate_limited": 0,
+            "latency_count": 0,
+            "latency_total_ms": 0,
+            "latency_max_ms": 0,
+            "latency_last_ms": None,
+        }
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name="discord-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.dispatch_once()
+            except Exception:
+                logger.exception("Erro inesperado no envio de notificações")
+                processed = 0
+            finally:
+                close_old_connections()
+            if processed:
+                # Pode haver mais vencidas, ou mensagens liberadas pela ordem
+                continue
+            self._wakeup.wait(self._idle_timeout())
+            self._wakeup.clear()
+
+    def _idle_timeout(self):
+        """Espera até a próxima mensagem vencer (retry ou fim da pausa do
+        429), limitada a ``poll_interval``."""
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            # Margem para a mensagem adiada pelo 429 já estar vencida no banco
+            return pause + 0.05
+        try:
+            next_due = (
+                NotificationOutbox.objects.filter(state=NotificationOutbox.PENDING)
+                .aggregate(next_due=Min("next_attempt_at"))["next_due"]
+            )
+        except Exception:
+            logger.exception("Falha ao consultar a fila de notificações")
+            return self.poll_interval
+        finally:
+            close_old_connections()
+        if next_due is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.05, (next_due - timezone.now()).total_seconds()))
+
+    def drain(self, timeout=30):
+        """Envia no thread atual tudo o que já venceu (até ``timeout`` segundos)."""
+        deadline = time.monotonic() + timeout
+        total = 0
+        while time.monotonic() < deadline:
+            processed = self.dispatch_once()
+            if not processed:
+                break
+            total += processed
+        return total
+
+    def dispatch_once(self):
+        """Envia as mensagens vencidas; retorna quantas foram processadas."""
+        if not self.webhook_url or time.monotonic() < self._paused_until:
+            return 0
+
+        due = list(
+            NotificationOutbox.objects.filter(state=NotificationOutbox.PENDING, next_attempt_at__lte=timezone.now())
+            .select_related("system")
+            .order_by("next_attempt_at", "id")[: self.batch_size]
+        )
+        if not due:
+            return 0
+
+        # Mantém a ordem por sistema: uma mensagem só sai depois das anteriores
+        # do mesmo sistema (um "voltou" nunca chega antes do alerta em retry)
+        first_pending = dict(
+            NotificationOutbox.objects.filter(
+                state=NotificationOutbox.PENDING,
+                system_id__in={row.system_id for row in due if row.system_id},
+            )
+            .values("system_id")
+            .annotate(first=Min("id"))
+            .values_list("system_id", "first")
+        )
+
+        processed = 0
+        for row in due:
+            if row.system_id and first_pending.get(row.system_id) != row.pk:
+                continue
+            if not self._claim(row):
+                continue
+            self._deliver(row)
+            processed += 1
+            if time.monotonic() < self._paused_until:
+                break
+        return processed
+
+    def _claim(self, row):
+        lease = timezone.now() + timedelta(seconds=CLAIM_SECONDS)
+        claimed = NotificationOutbox.objects.filter(
+            pk=row.pk, state=NotificationOutbox.PENDING, next_attempt_at=row.next_attempt_at
+        ).update(next_attempt_at=lease, attempts=F("attempts") + 1)
+        row.attempts += 1
+        return claimed == 1
+
+    def _deliver(self, row):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.webhook_url, json=row.message, timeout=10)
+        except requests.RequestException as exc:
+            NOTIFY_DURATION.observe(time.perf_counter() - start, type(exc).__name__)
+            track_http(time.perf_counter() - start)
+            self._retry(row, str(exc))
+            return
+        NOTIFY_DURATION.observe(time.perf_counter() - start, f"{response.status_code // 100}xx")
+        track_http(time.perf_counter() - start)
+
+        if 200 <= response.status_code < 300:
+            now = timezone.now()
+            NotificationOutbox.objects.filter(pk=row.pk).update(
+                state=NotificationOutbox.SENT, sent_at=now, last_error=""
+            )
+            latency_ms = int((now - row.created_at).total_seconds() * 1000)
+            with self._stats_lock:
+                self.stats["sent"] += 1
+                self.stats["latency_count"] += 1
+                self.stats["latency_total_ms"] += latency_ms
+                self.stats["latency_max_ms"] = max(self.stats["latency_max_ms"], latency_ms)
+                self.stats["latency_last_ms"] = latency_ms
+            logger.info("Notificação Discord enviada para '%s' (%s)", row.system or "-", row.status)
+        elif response.status_code == 429:
+            retry_after = _retry_after(response)
+            retry_at = timezone.now() + timedelta(seconds=retry_after)
+            self._paused_until = time.monotonic() + retry_after
+            # Limite de taxa não conta como tentativa
+            NotificationOutbox.objects.filter(pk=row.pk).update(
+                next_attempt_at=retry_at,
+                attempts=F("attempts") - 1,
+                last_error=f"429: retry_after={retry_after}",
+            )
+            with self._stats_lock:
+                self.stats["rate_limited"] += 1
+            logger.warning("Discord limitou o envio; pausando por %.1fs", retry_after)
+        elif response.status_code >= 500:
+            self._retry(row, f"{response.status_code}: {response.text[:500]}")
+        else:
+            # Outros 4xx (webhook inválido, mensagem recusada) não melhoram com retry
+            self._fail(row, f"{response.status_code}: {response.text[:500]}")
+
+    def _retry(self, row, error):
+        if row.attempts >= self.max_attempts:
+            self._fail(row, error)
+            return
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (row.attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+        NotificationOutbox.objects.filter(pk=row.pk).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+        with self._stats_lock:
+            self.stats["retried"] += 1
+        NOTIFY_FAILURES.inc("retry")
+        logger.warning("Falha ao enviar notificação #%d (tentativa %d): %s", row.pk, row.attempts, error)
+
+    def _fail(self, row, error):
+        NotificationOutbox.objects.filter(pk=row.pk).update(state=NotificationOutbox.FAILED, last_error=error)
+        with self._stats_lock:
+            self.stats["failed"] += 1
+        NOTIFY_FAILURES.inc("failed")
+        logger.error("Notificação #%d descartada após %d tentativas: %s", row.pk, row.attempts, error)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        count = stats.pop("latency_count")
+        total = stats.pop("latency_total_ms")
+        stats["latency_avg_ms"] = round(total / count) if count else None
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        stats["paused_for_s"] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+        return stats
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = NotificationDispatcher()
+        return _dispatcher
+
+
+def wake_dispatcher():
+    """Acorda (iniciando, se preciso) o despachante deste processo. Chamado
+    no ``on_commit`` da transação que enfileirou mensagens."""
+    if not getattr(settings, "NOTIFY_IN_PROCESS", True):
+        return
+    dispatcher = get_dispatcher()
+    dispatcher.start()
+    dispatcher.wake()
+
+
+def prune_notifications(days):
+    """Apaga mensagens já resolvidas (enviadas ou descartadas) há mais de
+    ``days`` dias; as pendentes nunca são removidas."""
+    cutoff = timezone.now() - timedelta(days=days)
+    return (
+        NotificationOutbox.objects.exclude(state=NotificationOutbox.PENDING)
+        .filter(created_at__lt=cutoff)
+        .delete()[0]
+    )
+
+
+def notification_stats():
+    """Profundidade da fila (no banco) e contadores do despachante local."""
+    now = timezone.now()
+    states = dict(
+        NotificationOutbox.objects.values_list("state").annotate(total=Count("id")).order_by()
+    )
+    oldest = (
+        NotificationOutbox.objects.filter(state=NotificationOutbox.PENDING)
+        .aggregate(oldest=Min("created_at"))["oldest"]
+    )
+    return {
+        "pending": states.get(NotificationOutbox.PENDING, 0),
+        "sent": states.get(NotificationOutbox.SENT, 0),
+        "failed": states.get(NotificationOutbox.FAILED, 0),
+        "oldest_pending_age_s": round((now - oldest).total_seconds(), 1) if oldest else None,
+        "dispatcher": get_dispatcher().snapshot(),
+    }
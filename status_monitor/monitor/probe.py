@@ -0,0 +1,461 @@
+import asyncio
+import contextvars
+import http.cookiejar
+import ipaddress
+import logging
+import socket
+import ssl
+import threading
+import time
+
+import httpx
+import requests
+
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import HTTPError as URLLib3Error, NameResolutionError
+from .metrics import PROBE_DURATION, probe_outcome
+from .profiling import track_http
+
+
+logger = logging.getLogger(__name__)
+
+# Códigos com que o servidor diz não aceitar HEAD; no modo AUTO a
+# verificação é refeita com GET
+HEAD_UNSUPPORTED = {405, 501}
+
+BODY_CHUNK = 16 * 1024
+
+ProbeOptions = namedtuple("ProbeOptions", ["method", "timeout", "max_body_bytes"])
+
+DEFAULT_OPTIONS = ProbeOptions("GET", 5.0, 64 * 1024)
+
+# Fases de uma verificação, na ordem de ``ProbeDetails.phases``
+PHASES = ("dns", "connect", "tls", "ttfb", "body")
+
+# ``phases``: milissegundos em cada fase de ``PHASES`` (``None`` quando não se
+# aplica ou não foi medida); endereço conectado e validade do certificado
+ProbeDetails = namedtuple("ProbeDetails", ["phases", "resolved_ip", "tls_expires_at"])
+
+
+def options_for(system):
+    """Configuração de verificação de um ``System``."""
+    if system is None:
+        return DEFAULT_OPTIONS
+    return ProbeOptions(system.probe_method, system.probe_timeout, system.max_body_bytes)
+
+
+class DNSCache:
+    """Guarda por ``ttl`` segundos o endereço resolvido de cada host.
+
+    Com milhares de sistemas em poucos hosts, cada conexão nova deixaria de
+    consultar o resolvedor. Falhas não ficam em cache, e uma conexão recusada
+    no endereço guardado descarta a entrada.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        if self.ttl <= 0 or _is_ip(host):
+            return host
+        now = time.monotonic()
+        entry = self._entries.get((host, port))
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[(host, port)] = (now + self.ttl, address)
+        return address
+
+    def forget(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
+
+
+dns_cache = DNSCache(getattr(settings, "PROBE_DNS_TTL", 60))
+
+
+class PhaseTimer:
+    """Segundos gastos em cada fase de uma verificação.
+
+    DNS, conexão e TLS somam o que as conexões abertas durante a verificação
+    custaram; com uma conexão reaproveitada do pool ficam em zero. O
+    primeiro byte é o resto do tempo até os cabeçalhos da resposta.
+    """
+
+    def __init__(self, url, dns=0.0):
+        self.dns = dns
+        self.connect = 0.0
+        self.tls = 0.0 if url.lower().startswith("https:") else None
+        self.ttfb = None
+        self.body = None
+        self.resolved_ip = None
+        self.tls_expires_at = None
+
+    def setup(self):
+        return (self.dns or 0.0) + self.connect + (self.tls or 0.0)
+
+    def headers_received(self, elapsed):
+        self.ttfb = max(0.0, elapsed - self.setup())
+
+    def details(self):
+        phases = [
+            None if value is None else int(value * 1000)
+            for value in (self.dns, self.connect, self.tls, self.ttfb, self.body)
+        ]
+        return ProbeDetails(phases, self.resolved_ip, self.tls_expires_at)
+
+
+# Cronômetro da verificação em andamento na thread (veja ``fetch``)
+_timer = contextvars.ContextVar("probe_timer", default=None)
+
+
+def _peer_ip(sock):
+    try:
+        return sock.getpeername()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def _certificate_expiry(cert):
+    not_after = cert.get("notAfter") if cert else None
+    if not not_after:
+        return None
+    return datetime.fromtimestamp(ssl.cert_time_to_seconds(not_after), tz=dt_timezone.utc)
+
+
+class _CachedDNSMixin:
+    # O urllib3 usa ``_dns_host`` só para abrir o socket; ``host`` continua
+    # sendo o nome original (cabeçalho Host, SNI e validação do certificado).
+    probe_ip = None
+    probe_tls_expires_at = None
+
+    def _new_conn(self):
+        host = getattr(self, "_probe_host", None)
+        if host is None:
+            host = self._probe_host = self._dns_host
+        timer = _timer.get()
+        started = time.perf_counter()
+        try:
+            self._dns_host = dns_cache.resolve(host, self.port)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        finally:
+            resolved = time.perf_counter()
+            if timer is not None:
+                timer.dns += resolved - started
+        try:
+            sock = super()._new_conn()
+        except Exception:
+            dns_cache.forget(host, self.port)
+            raise
+        finally:
+            if timer is not None:
+                timer.connect += time.perf_counter() - resolved
+        self.probe_ip = _peer_ip(sock)
+        if timer is not None:
+            timer.resolved_ip = self.probe_ip
+        return sock
+
+
+class CachedDNSHTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class CachedDNSHTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    def connect(self):
+        # connect() = _new_conn() (DNS + TCP) + handshake TLS
+        timer = _timer.get()
+        before = timer.dns + timer.connect if timer is not None else 0.0
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if timer is not None:
+                spent = time.perf_counter() - started - (timer.dns + timer.connect - before)
+                timer.tls = (timer.tls or 0.0) + max(0.0, spent)
+        try:
+            self.probe_tls_expires_at = _certificate_expiry(self.sock.getpeercert())
+        except (AttributeError, ValueError, OSError):
+            self.probe_tls_expires_at = None
+        if timer is not None:
+            timer.tls_expires_at = self.probe_tls_expires_at
+
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+
+class ProbeAdapter(HTTPAdapter):
+    """Pools por host com keep-alive e DNS em cache."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CachedDNSHTTPConnectionPool,
+            "https": CachedDNSHTTPSConnectionPool,
+        }
+
+
+class _NoCookies(http.cookiejar.DefaultCookiePolicy):
+    # Verificações não devem carregar sessão de um sistema para outro
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sessão compartilhada por todas as verificações do processo.
+
+    Mantém até ``PROBE_POOL_HOSTS`` hosts com até ``PROBE_POOL_SIZE``
+    conexões abertas cada, reaproveitadas entre verificações.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.cookies.set_policy(_NoCookies())
+                adapter = ProbeAdapter(
+                    pool_connections=getattr(settings, "PROBE_POOL_HOSTS", 100),
+                    pool_maxsize=getattr(settings, "PROBE_POOL_SIZE", 20),
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _finish(response, max_body_bytes):
+    """Lê no máximo ``max_body_bytes`` do corpo. Se ele terminar antes
+    disso, a conexão volta ao pool; senão é fechada."""
+    read = 0
+    try:
+        while read <= max_body_bytes:
+            chunk = response.raw.read(min(BODY_CHUNK, max_body_bytes + 1 - read), decode_content=False)
+            if not chunk:
+                break
+            read += len(chunk)
+    except (requests.RequestException, URLLib3Error, OSError):
+        pass
+    finally:
+        response.close()
+
+
+def _connection_details(timer, response):
+    # Endereço e certificado da conexão que respondeu, mesmo reaproveitada
+    connection = getattr(response.raw, "connection", None)
+    if connection is not None:
+        timer.resolved_ip = connection.probe_ip or timer.resolved_ip
+        timer.tls_expires_at = connection.probe_tls_expires_at or timer.tls_expires_at
+
+
+def fetch(url, options=None):
+    """Faz a verificação e devolve ``(status_code, elapsed_ms, details)``.
+
+    ``elapsed_ms`` vai até a linha de status e os cabeçalhos; o corpo não
+    entra na medida. ``status_code`` é 0 quando não houve resposta.
+    ``details`` é um ``ProbeDetails`` com o tempo de cada fase; com
+    redirecionamentos, o primeiro byte inclui os passos intermediários.
+    """
+    options = options or DEFAULT_OPTIONS
+    session = get_session()
+    timeout = options.timeout
+    method = options.method
+    timer = PhaseTimer(url)
+    token = _timer.set(timer)
+    start = time.perf_counter()
+    try:
+        if method in ("HEAD", "AUTO"):
+            response = session.head(url, timeout=timeout, allow_redirects=True, stream=True)
+            timer.headers_received(time.perf_counter() - start)
+            _connection_details(timer, response)
+            # Lê o corpo vazio para a conexão voltar ao pool (close() a fecharia)
+            _finish(response, 0)
+            if method == "AUTO" and response.status_code in HEAD_UNSUPPORTED:
+                method = "GET"
+                timer = PhaseTimer(url)
+                _timer.set(timer)
+                start = time.perf_counter()
+        if method == "GET":
+            response = session.get(url, timeout=timeout, stream=True)
+            elapsed = time.perf_counter() - start
+            timer.headers_received(elapsed)
+            _connection_details(timer, response)
+            _finish(response, options.max_body_bytes)
+            timer.body = time.perf_counter() - start - elapsed
+        else:
+            elapsed = time.perf_counter() - start
+        status_code = response.status_code
+        outcome = probe_outcome(status_code)
+    except requests.RequestException as exc:
+        elapsed = time.perf_counter() - start
+        status_code = 0
+        outcome = probe_outcome(exc=exc)
+    finally:
+        _timer.reset(token)
+    PROBE_DURATION.observe(elapsed, outcome)
+    track_http(time.perf_counter() - start)
+    return status_code, int(elapsed * 1000), timer.details()
+
+
+class _AsyncProbeState:
+    """Cliente ``httpx`` e limites por host de um event loop."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            cookies=http.cookiejar.CookieJar(policy=_NoCookies()),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "PROBE_ASYNC_MAX_CONNECTIONS", 500),
+                max_keepalive_connections=getattr(settings, "PROBE_POOL_HOSTS", 100),
+            ),
+        )
+        self.host_limit = getattr(settings, "PROBE_HOST_CONCURRENCY", 4)
+        self.hosts = {}
+
+    def limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        semaphore = self.hosts.get(host)
+        if semaphore is None:
+            semaphore = self.hosts[host] = asyncio.Semaphore(self.host_limit)
+        return semaphore
+
+
+# Um estado por event loop: sob ASGI há um loop por processo
+_async_states = {}
+
+
+def _async_state():
+    loop = asyncio.get_running_loop()
+    state = _async_states.get(loop)
+    if state is None:
+        state = _async_states[loop] = _AsyncProbeState()
+    return state
+
+
+def _trace(timer):
+    """Callback de trace do httpcore: soma a conexão TCP (que no httpx inclui
+    a resolução de nome) e o handshake TLS das conexões novas."""
+    started = {}
+
+    async def trace(event, info):
+        now = time.perf_counter()
+        name, _, stage = event.rpartition(".")
+        if stage == "started":
+            started[name] = now
+        elif stage in ("complete", "failed") and name in started:
+            spent = now - started.pop(name)
+            if name == "connection.connect_tcp":
+                timer.connect += spent
+            elif name == "connection.start_tls":
+                timer.tls = (timer.tls or 0.0) + spent
+
+    return trace
+
+
+def _stream_details(timer, response):
+    stream = response.extensions.get("network_stream")
+    if stream is None:
+        return
+    address = stream.get_extra_info("server_addr")
+    if address:
+        timer.resolved_ip = address[0]
+    ssl_object = stream.get_extra_info("ssl_object")
+    if ssl_object is not None:
+        try:
+            timer.tls_expires_at = _certificate_expiry(ssl_object.getpeercert())
+        except ValueError:
+            pass
+
+
+async def _finish_async(response, max_body_bytes):
+    # Mesma regra de _finish: corpo maior que o limite fecha a conexão
+    read = 0
+    try:
+        async for chunk in response.aiter_raw():
+            read += len(chunk)
+            if read > max_body_bytes:
+                break
+    except httpx.HTTPError:
+        pass
+
+
+async def fetch_async(url, options=None):
+    """Versão assíncrona de ``fetch``, para views ASGI: a espera pela resposta
+    não prende uma thread, e um processo mantém centenas de verificações em
+    andamento.
+
+    Cada host aceita no máximo ``PROBE_HOST_CONCURRENCY`` verificações
+    simultâneas; as demais esperam a vez, e a espera não entra em
+    ``elapsed_ms``. O DNS não é medido à parte (fica dentro da conexão).
+    """
+    options = options or DEFAULT_OPTIONS
+    state = _async_state()
+    # Sem limite de espera por uma conexão livre no pool: só o alvo conta
+    timeout = httpx.Timeout(options.timeout, pool=None)
+    method = options.method
+    timer = PhaseTimer(url, dns=None)
+    async with state.limit(url):
+        start = time.perf_counter()
+        try:
+            if method in ("HEAD", "AUTO"):
+                response = await state.client.head(url, timeout=timeout, extensions={"trace": _trace(timer)})
+                timer.headers_received(time.perf_counter() - start)
+                _stream_details(timer, response)
+                if method == "AUTO" and response.status_code in HEAD_UNSUPPORTED:
+                    method = "GET"
+                    timer = PhaseTimer(url, dns=None)
+                    start = time.perf_counter()
+            if method == "GET":
+                async with state.client.stream(
+                    "GET", url, timeout=timeout, extensions={"trace": _trace(timer)}
+                ) as response:
+                    elapsed = time.perf_counter() - start
+                    timer.headers_received(elapsed)
+                    _stream_details(timer, response)
+                    await _finish_async(response, options.max_body_bytes)
+                    timer.body = time.perf_counter() - start - elapsed
+            else:
+                elapsed = time.perf_counter() - start
+            status_code = response.status_code
+            outcome = probe_outcome(status_code)
+        except (httpx.HTTPError, httpx.InvalidURL) as exc:
+            elapsed = time.perf_counter() - start
+            status_code = 0
+            outcome = probe_outcome(exc=exc)
+        PROBE_DURATION.observe(elapsed, outcome)
+        track_http(time.perf_counter() - start)
+    return status_code, int(elapsed * 1000), timer.details()
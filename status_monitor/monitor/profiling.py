@@ -0,0 +1,288 @@
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Perfil da requisição em andamento (None fora do ProfilingMiddleware)
+_current = contextvars.ContextVar("request_profile", default=None)
+
+# Com Python 3.12+ só um cProfile pode estar ativo por vez no processo
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Tempos acumulados de uma requisição, em segundos."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.http_calls = 0
+        self.http_time = 0.0
+        self.template_time = 0.0
+        # Verificações em lote rodam em várias threads com o mesmo perfil
+        self._lock = threading.Lock()
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def add_http(self, seconds):
+        with self._lock:
+            self.http_calls += 1
+            self.http_time += seconds
+
+    def server_timing(self, total):
+        return ", ".join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'http;dur={self.http_time * 1000:.1f};desc="{self.http_calls} calls"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ))
+
+
+def track_http(seconds):
+    """Soma uma chamada HTTP de saída ao perfil da requisição atual, se houver."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add_http(seconds)
+
+
+def run_in_request_context(pool, func, items):
+    """``pool.map`` que leva o perfil da requisição para as threads do pool."""
+    futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """Backend de templates do Django que mede o tempo de renderização
+    (ativado em settings junto com ``PROFILING_ENABLED``)."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class StackSampler:
+    """Uma thread que, a cada ``interval`` segundos, amostra a pilha das
+    requisições que já passaram de ``threshold`` segundos.
+
+    Requisições rápidas custam só a inscrição e a remoção em um dicionário;
+    a thread fica parada enquanto não há requisições em andamento.
+    """
+
+    def __init__(self, interval, threshold):
+        self.interval = interval
+        self.threshold = threshold
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self):
+        samples = {}
+        with self._lock:
+            self._watched[threading.get_ident()] = (time.perf_counter(), samples)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return samples
+
+    def unwatch(self):
+        with self._lock:
+            self._watched.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                watched = dict(self._watched)
+            if not watched:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            now = time.perf_counter()
+            due = {ident: samples for ident, (start, samples) in watched.items() if now - start >= self.threshold}
+            if not due:
+                # Dorme até a requisição mais antiga chegar ao limite
+                first_due = min(start for start, _ in watched.values()) + self.threshold
+                time.sleep(max(self.interval, first_due - now))
+                continue
+            frames = sys._current_frames()
+            for ident, samples in due.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    key = _fold(frame)
+                    samples[key] = samples.get(key, 0) + 1
+            time.sleep(self.interval)
+
+
+def _fold(frame):
+    """Pilha no formato "folded" (flamegraph.pl, speedscope): da raiz para a
+    função atual, separadas por ``;``."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfilingMiddleware:
+    """Mede cada requisição (consultas e tempo no banco, HTTP de saída,
+    renderização de templates) e devolve o resultado no cabeçalho
+    ``Server-Timing`` e em uma linha de log JSON.
+
+    Também grava em ``PROFILING_DIR`` um cProfile (``.prof``) de uma fração
+    ``PROFILING_SAMPLE_RATE`` das requisições e as pilhas amostradas
+    (``.folded``) das que passarem de ``PROFILING_SLOW_MS``.
+
+    Funciona sob WSGI e ASGI. Sob ASGI, banco, cProfile e amostragem de pilha
+    são ligados na thread em que o Django roda a parte síncrona da requisição
+    (views e ORM), não no event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+        self.slow_ms = getattr(settings, "PROFILING_SLOW_MS", 0)
+        self.directory = getattr(settings, "PROFILING_DIR", "profiles")
+        self.sampler = (
+            StackSampler(getattr(settings, "PROFILING_STACK_INTERVAL", 0.01), self.slow_ms / 1000)
+            if self.slow_ms
+            else None
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            stack, profiler, samples = self._attach(profile)
+            with stack:
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+        return self._finish(request, response, profile, profiler, samples, total)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            # sync_to_async leva o contexto (com o perfil) para a thread
+            stack, profiler, samples = await sync_to_async(self._attach)(profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+        return await sync_to_async(self._finish)(request, response, profile, profiler, samples, total)
+
+    def _attach(self, profile):
+        """Liga a medição do banco, o cProfile e a amostragem de pilha na
+        thread atual. Devolve ``(stack, profiler, samples)``; fechar o
+        ``stack`` desliga tudo."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.db_wrapper))
+            samples = None
+            if self.sampler:
+                samples = self.sampler.watch()
+                stack.callback(self.sampler.unwatch)
+            profiler = None
+            if self.sample_rate and random.random() < self.sample_rate and _cprofile_lock.acquire(blocking=False):
+                stack.callback(_cprofile_lock.release)
+                profiler = cProfile.Profile()
+                profiler.enable()
+                stack.callback(profiler.disable)
+            return stack.pop_all(), profiler, samples
+
+    def _finish(self, request, response, profile, profiler, samples, total):
+        response["Server-Timing"] = profile.server_timing(total)
+
+        files = []
+        try:
+            if profiler is not None:
+                files.append(self._save(request, total, "prof", profiler.dump_stats))
+            if samples:
+                files.append(self._save(request, total, "folded", lambda path: _write_folded(path, samples.copy())))
+        except OSError:
+            logger.exception("Falha ao gravar o perfil da requisição")
+
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "db_queries": profile.db_queries,
+            "db_ms": round(profile.db_time * 1000, 1),
+            "http_calls": profile.http_calls,
+            "http_ms": round(profile.http_time * 1000, 1),
+            "template_ms": round(profile.template_time * 1000, 1),
+            "profiles": files,
+        }))
+        return response
+
+    def _save(self, request, total, extension, write):
+        os.makedirs(self.directory, exist_ok=True)
+        name = request.resolver_match.url_name if request.resolver_match else "unresolved"
+        stamp = timezone.localtime().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{stamp}-{name}-{int(total * 1000)}ms.{extension}")
+        write(path)
+        return path
+
+
+def _write_folded(path, samples):
+    with open(path, "w", encoding="utf-8") as handle:
+        for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+            handle.write(f"{stack} {count}\n")
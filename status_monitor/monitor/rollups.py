@@ -0,0 +1,162 @@
+import logging
+import time
+
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from .models import StatusRollupDaily, StatusRollupHourly, SystemStatusHistory
+
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("checks", "up", "forbidden", "down")
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    return timezone.localtime(moment).date()
+
+
+def _increments(status_str):
+    return {
+        "checks": 1,
+        "up": 1 if status_str == "UP" else 0,
+        "forbidden": 1 if status_str == "FORBIDDEN" else 0,
+        "down": 1 if status_str not in {"UP", "FORBIDDEN"} else 0,
+    }
+
+
+def _apply(model, bucket_field, deltas):
+    if not deltas:
+        return
+    system_ids = {system_id for system_id, _ in deltas}
+    buckets = {bucket for _, bucket in deltas}
+    existing = {
+        (row.system_id, getattr(row, bucket_field)): row
+        for row in model.objects.filter(system_id__in=system_ids, **{f"{bucket_field}__in": buckets})
+    }
+
+    to_create, to_update = [], []
+    for key, counters in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            system_id, bucket = key
+            to_create.append(model(system_id=system_id, **{bucket_field: bucket}, **counters))
+            continue
+        for field in COUNTER_FIELDS:
+            setattr(row, field, getattr(row, field) + counters[field])
+        to_update.append(row)
+
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, COUNTER_FIELDS)
+
+
+def update_rollups(entries):
+    """Soma as verificações ``(system_id, status, checked_at)`` às tabelas de
+    agregação por hora e por dia. Deve rodar na mesma transação da gravação."""
+    hourly, daily = {}, {}
+    for system_id, status_str, checked_at in entries:
+        increments = _increments(status_str)
+        for deltas, key in (
+            (hourly, (system_id, hour_bucket(checked_at))),
+            (daily, (system_id, day_bucket(checked_at))),
+        ):
+            counters = deltas.setdefault(key, dict.fromkeys(COUNTER_FIELDS, 0))
+            for field, value in increments.items():
+                counters[field] += value
+
+    _apply(StatusRollupHourly, "bucket_start", hourly)
+    _apply(StatusRollupDaily, "day", daily)
+
+
+def _aggregate(trunc):
+    return (
+        SystemStatusHistory.objects.annotate(bucket=trunc)
+        .values("system_id", "bucket")
+        .annotate(
+            checks=Count("id"),
+            up=Count("id", filter=Q(status="UP")),
+            forbidden=Count("id", filter=Q(status="FORBIDDEN")),
+        )
+        .order_by()
+    )
+
+
+def backfill_rollups():
+    """Recalcula as agregações a partir do histórico bruto ainda existente.
+
+    Só as horas/dias cobertos pelo histórico são reescritos, para não apagar
+    agregações de períodos cujas linhas brutas já foram removidas.
+    """
+    first = SystemStatusHistory.objects.aggregate(first=Min("checked_at"))["first"]
+    if first is None:
+        return 0, 0
+
+    first_hour = hour_bucket(first)
+    first_day = day_bucket(first)
+    tzinfo = timezone.get_current_timezone()
+
+    with transaction.atomic():
+        StatusRollupHourly.objects.filter(bucket_start__gte=first_hour).delete()
+        StatusRollupDaily.objects.filter(day__gte=first_day).delete()
+
+        hourly = [
+            StatusRollupHourly(
+                system_id=row["system_id"],
+                bucket_start=row["bucket"],
+                checks=row["checks"],
+                up=row["up"],
+                forbidden=row["forbidden"],
+                down=row["checks"] - row["up"] - row["forbidden"],
+            )
+            for row in _aggregate(TruncHour("checked_at", tzinfo=tzinfo)).iterator()
+        ]
+        StatusRollupHourly.objects.bulk_create(hourly, batch_size=1000)
+
+        daily = [
+            StatusRollupDaily(
+                system_id=row["system_id"],
+                day=row["bucket"],
+                checks=row["checks"],
+                up=row["up"],
+                forbidden=row["forbidden"],
+                down=row["checks"] - row["up"] - row["forbidden"],
+            )
+            for row in _aggregate(TruncDate("checked_at", tzinfo=tzinfo)).iterator()
+        ]
+        StatusRollupDaily.objects.bulk_create(daily, batch_size=1000)
+
+    return len(hourly), len(daily)
+
+
+def prune_history(days, chunk_size=1000, pause=0.05):
+    """Apaga o histórico bruto mais antigo que ``days`` dias em blocos pequenos.
+
+    Cada bloco roda na própria transação e há uma pausa entre eles, para que
+    o lock de escrita do SQLite nunca fique preso por muito tempo. O corte é
+    alinhado à meia-noite local, para que o histórico restante sempre comece
+    em um dia completo e ``backfill_rollups`` não reescreva dias parciais.
+    """
+    cutoff = timezone.localtime(timezone.now() - timedelta(days=days)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    deleted = 0
+    while True:
+        ids = list(
+            SystemStatusHistory.objects.filter(checked_at__lt=cutoff)
+            .order_by()
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            deleted += SystemStatusHistory.objects.filter(id__in=ids).delete()[0]
+        logger.debug("Removidas %d linhas de histórico até agora", deleted)
+        if pause:
+            time.sleep(pause)
+    return deleted
@@ -0,0 +1,168 @@
+import heapq
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from django.db import OperationalError, close_old_connections
+from .metrics import SQLITE_RETRIES
+from .models import System
+from .notifications import get_dispatcher, wake_dispatcher
+from .probe import options_for
+from .services import CheckResult, get_status_string, needs_recording, probe_url
+from .writer import get_writer, submit_checks
+
+
+logger = logging.getLogger(__name__)
+
+# Campos de System usados pelo agendador e pelo motor de verificação
+SYSTEM_FIELDS = (
+    "id",
+    "name",
+    "url",
+    "check_interval",
+    "probe_method",
+    "probe_timeout",
+    "expected_status_codes",
+    "max_body_bytes",
+)
+
+
+class ProbeScheduler:
+    """Agenda e executa as verificações de todos os sistemas, sem navegador.
+
+    Cada ``System`` é verificado a cada ``check_interval`` segundos, com um
+    jitter proporcional ao intervalo para espalhar as sondagens no tempo. As
+    verificações rodam em um pool limitado de threads e a fila nunca tem mais
+    de uma entrada por sistema, então um alvo lento não acumula sondagens.
+    """
+
+    def __init__(self, workers=20, jitter=0.1, reload_interval=60):
+        self.workers = max(1, workers)
+        self.jitter = max(0.0, min(jitter, 1.0))
+        self.reload_interval = reload_interval
+
+        self._systems = {}
+        self._queue = []  # heap de (próxima execução, system_id)
+        self._scheduled = set()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._next_reload = 0.0
+        # Verificações concluídas desde o início
+        self.completed = 0
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def load_systems(self):
+        return {system.pk: system for system in System.objects.only(*SYSTEM_FIELDS)}
+
+    def reload(self):
+        systems = self.load_systems()
+        now = time.monotonic()
+        with self._lock:
+            self._systems = systems
+            for system_id, system in systems.items():
+                if system_id in self._scheduled or system_id in self._in_flight:
+                    continue
+                self._push(self._first_run(system, now), system_id)
+            # Sistemas removidos saem da fila quando chegarem ao topo
+        self._next_reload = now + self.reload_interval
+        logger.info("Agendador carregou %d sistemas", len(systems))
+
+    def _first_run(self, system, now):
+        # Primeira execução espalhada uniformemente dentro do intervalo,
+        # para que milhares de sistemas não sejam verificados de uma vez.
+        return now + random.uniform(0, system.check_interval)
+
+    def _can_dispatch(self):
+        return True
+
+    def _push(self, when, system_id):
+        heapq.heappush(self._queue, (when, system_id))
+        self._scheduled.add(system_id)
+
+    def _next_delay(self, system):
+        interval = max(1, system.check_interval)
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def probe(self, system):
+        try:
+            probe = probe_url(system.url, owner=system.pk, options=options_for(system))
+            if not needs_recording(probe, system):
+                # Alguém verificou esta URL há instantes e já gravou o resultado
+                return
+            status_str = get_status_string(probe.status_code, system.expected_codes)
+            # Espera por espaço na fila: o agendador pode desacelerar, uma view não
+            check = CheckResult(system, probe.status_code, probe.elapsed_ms, probe.checked_at, probe.details)
+            submit_checks([check], block=True)
+            logger.debug("%s: %s (%d ms)", system.name, status_str, probe.elapsed_ms)
+        except Exception:
+            logger.exception("Erro inesperado ao verificar %s", system.name)
+        finally:
+            close_old_connections()
+
+    def _run_probe(self, system):
+        try:
+            self.probe(system)
+        finally:
+            with self._lock:
+                self._in_flight.discard(system.pk)
+                self.completed += 1
+                if system.pk in self._systems and not self._stop.is_set():
+                    self._push(time.monotonic() + self._next_delay(self._systems[system.pk]), system.pk)
+            self._wakeup.set()
+
+    def _dispatch_due(self, pool):
+        if not self._can_dispatch():
+            return None
+        now = time.monotonic()
+        with self._lock:
+            while self._queue and len(self._in_flight) < self.workers:
+                when, system_id = self._queue[0]
+                if when > now:
+                    break
+                heapq.heappop(self._queue)
+                self._scheduled.discard(system_id)
+                system = self._systems.get(system_id)
+                if system is None:
+                    continue
+                self._in_flight.add(system_id)
+                pool.submit(self._run_probe, system)
+            if self._queue and len(self._in_flight) < self.workers:
+                return max(0.0, self._queue[0][0] - now)
+            return None
+
+    def run(self):
+        # Entrega também avisos que ficaram pendentes de uma execução anterior
+        wake_dispatcher()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="probe") as pool:
+            while not self._stop.is_set():
+                if time.monotonic() >= self._next_reload:
+                    try:
+                        self.reload()
+                    except OperationalError:
+                        SQLITE_RETRIES.inc("scheduler")
+                        logger.warning("Banco travado ao recarregar sistemas; tentando depois")
+                        self._next_reload = time.monotonic() + 5
+                    finally:
+                        close_old_connections()
+
+                delay = self._dispatch_due(pool)
+                until_reload = max(0.0, self._next_reload - time.monotonic())
+                timeout = until_reload if delay is None else min(delay, until_reload)
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+
+    def run_once(self):
+        systems = list(self.load_systems().values())
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="probe") as pool:
+            list(pool.map(self.probe, systems))
+        # O processo termina em seguida: grava tudo e envia os avisos agora
+        get_writer().flush()
+        get_dispatcher().drain()
+        return len(systems)
@@ -0,0 +1,377 @@
+import asyncio
+import threading
+import hashlib
+import logging
+import time
+
+from collections import namedtuple
+from functools import partial
+from datetime import datetime
+
+from django.db import transaction, OperationalError
+from django.core.cache import cache
+from django.utils import timezone
+from django.conf import settings
+from .models import (
+    SystemStatus,
+    SystemDowntime,
+    SystemStatusHistory,
+)
+from .downtime import record_closed_downtimes
+from .events import publish_events
+from .intervals import update_intervals
+from .latency import update_sketches
+from .metrics import SQLITE_RETRIES, count_transitions
+from .notifications import enqueue_notifications, wake_dispatcher
+from .probe import DEFAULT_OPTIONS, fetch, fetch_async
+from .rollups import update_rollups
+from .snapshot import apply_committed
+from .versioning import bump_version
+
+
+logger = logging.getLogger(__name__)
+
+
+def check_url(url, options=None):
+    """Verifica a URL pelo motor de ``monitor.probe`` (conexões reaproveitadas,
+    DNS em cache). ``options`` é um ``ProbeOptions``; veja ``options_for``.
+    Devolve ``(status_code, elapsed_ms, details)``; ``details`` é o
+    ``ProbeDetails`` com as fases da verificação."""
+    return fetch(url, options)
+
+
+ProbeResult = namedtuple(
+    "ProbeResult",
+    ["status_code", "elapsed_ms", "checked_at", "cached", "age_ms", "owner", "details"],
+    defaults=(None,),
+)
+
+
+class _InFlightProbe:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+_in_flight_probes = {}
+_in_flight_lock = threading.Lock()
+
+
+def _probe_cache_key(url: str, method: str = "GET") -> str:
+    digest = hashlib.sha1(f"{method} {url}".encode("utf-8")).hexdigest()
+    return f"probe-result:{digest}"
+
+
+def _cached_probe(url, method, ttl):
+    if ttl <= 0:
+        return None
+    return _from_cache(cache.get(_probe_cache_key(url, method)), ttl)
+
+
+def _from_cache(entry, ttl):
+    if entry is None:
+        return None
+    status_code, elapsed_ms, checked_ts, owner, details = entry
+    age_ms = max(0, int((time.time() - checked_ts) * 1000))
+    if age_ms > ttl * 1000:
+        return None
+    checked_at = datetime.fromtimestamp(checked_ts, tz=timezone.get_current_timezone())
+    return ProbeResult(status_code, elapsed_ms, checked_at, True, age_ms, owner, details)
+
+
+def needs_recording(probe, system) -> bool:
+    """Só grava resultados novos, ou do cache produzidos para outro sistema."""
+    return not probe.cached or probe.owner != system.pk
+
+
+def probe_url(url, owner=None, ttl=None, options=None):
+    """Verifica a URL reaproveitando resultados recentes.
+
+    Resultados ficam no cache por ``PROBE_CACHE_TTL`` segundos. Requisições
+    simultâneas para a mesma URL aguardam uma única verificação em andamento
+    (single-flight) e compartilham o resultado. ``owner`` identifica o
+    sistema para o qual a verificação foi feita; veja ``needs_recording``.
+    ``options`` vem de ``options_for(system)``; resultados só são
+    compartilhados entre verificações com o mesmo método.
+    """
+    if ttl is None:
+        ttl = getattr(settings, "PROBE_CACHE_TTL", 5)
+    options = options or DEFAULT_OPTIONS
+    flight_key = (options.method, url)
+
+    while True:
+        cached = _cached_probe(url, options.method, ttl)
+        if cached is not None:
+            return cached
+
+        with _in_flight_lock:
+            flight = _in_flight_probes.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = _InFlightProbe()
+                _in_flight_probes[flight_key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.result is None:
+                # A verificação original falhou de forma inesperada; tenta de novo
+                continue
+            status_code, elapsed_ms, checked_at, flight_owner, details = flight.result
+            age_ms = max(0, int((timezone.now() - checked_at).total_seconds() * 1000))
+            return ProbeResult(status_code, elapsed_ms, checked_at, True, age_ms, flight_owner, details)
+
+        try:
+            status_code, elapsed_ms, details = check_url(url, options)
+            checked_at = timezone.now()
+            flight.result = (status_code, elapsed_ms, checked_at, owner, details)
+            if ttl > 0:
+                cache.set(
+                    _probe_cache_key(url, options.method),
+                    (status_code, elapsed_ms, checked_at.timestamp(), owner, details),
+                    timeout=ttl,
+                )
+        finally:
+            with _in_flight_lock:
+                _in_flight_probes.pop(flight_key, None)
+            flight.done.set()
+
+        return ProbeResult(status_code, elapsed_ms, checked_at, False, 0, owner, details)
+
+
+# Verificações em andamento por event loop: (método, url) -> Task
+_async_flights = {}
+
+
+async def _probe_and_cache(url, owner, ttl, options):
+    status_code, elapsed_ms, details = await fetch_async(url, options)
+    checked_at = timezone.now()
+    if ttl > 0:
+        await cache.aset(
+            _probe_cache_key(url, options.method),
+            (status_code, elapsed_ms, checked_at.timestamp(), owner, details),
+            timeout=ttl,
+        )
+    return status_code, elapsed_ms, checked_at, owner, details
+
+
+async def probe_url_async(url, owner=None, ttl=None, options=None):
+    """``probe_url`` para views assíncronas: mesmo cache por URL e mesma
+    junção de verificações simultâneas, mas esperando no event loop.
+
+    O cache é compartilhado com ``probe_url``; a junção vale entre as
+    requisições do mesmo loop.
+    """
+    if ttl is None:
+        ttl = getattr(settings, "PROBE_CACHE_TTL", 5)
+    options = options or DEFAULT_OPTIONS
+    if ttl > 0:
+        cached = _from_cache(await cache.aget(_probe_cache_key(url, options.method)), ttl)
+        if cached is not None:
+            return cached
+
+    flights = _async_flights.setdefault(asyncio.get_running_loop(), {})
+    flight_key = (options.method, url)
+    task = flights.get(flight_key)
+    leader = task is None
+    if leader:
+        task = flights[flight_key] = asyncio.ensure_future(_probe_and_cache(url, owner, ttl, options))
+        task.add_done_callback(lambda _: flights.pop(flight_key, None))
+    # shield: um cliente que desconecta não cancela a verificação dos outros
+    status_code, elapsed_ms, checked_at, flight_owner, details = await asyncio.shield(task)
+    if leader:
+        return ProbeResult(status_code, elapsed_ms, checked_at, False, 0, flight_owner, details)
+    age_ms = max(0, int((timezone.now() - checked_at).total_seconds() * 1000))
+    return ProbeResult(status_code, elapsed_ms, checked_at, True, age_ms, flight_owner, details)
+
+
+def get_status_string(status_code, expected=None):
+    """``expected`` são os códigos que contam como UP (``System.expected_codes``);
+    sem ele, só 200."""
+    if status_code in (expected or (200,)):
+        return "UP"
+    elif status_code == 403:
+        return "FORBIDDEN"
+    else:
+        return "DOWN"
+
+
+# ``details``: ``ProbeDetails`` da verificação, quando houve uma de verdade
+CheckResult = namedtuple(
+    "CheckResult", ["system", "status_code", "elapsed_ms", "checked_at", "details"], defaults=(None,)
+)
+
+
+def check_status(check):
+    return get_status_string(check.status_code, check.system.expected_codes)
+
+
+def _apply_checks(checks):
+    system_ids = {check.system.pk for check in checks}
+
+    current = {
+        status.system_id: status
+        for status in SystemStatus.objects.filter(system_id__in=system_ids)
+    }
+    open_downtimes = {}
+    for downtime in SystemDowntime.objects.filter(system_id__in=system_ids, ended_at__isnull=True):
+        # Mantém o downtime aberto mais recente, como fazia o .first() anterior
+        previous = open_downtimes.get(downtime.system_id)
+        if previous is None or downtime.started_at > previous.started_at:
+            open_downtimes[downtime.system_id] = downtime
+
+    # No modo "intervals" o histórico fica só em SystemStatusInterval
+    store_checks = getattr(settings, "STATUS_HISTORY_MODE", "checks") != "intervals"
+
+    history = []
+    new_statuses = {}
+    changed_statuses = {}
+    new_downtimes = []
+    changed_downtimes = {}
+    transitions = []
+    downtime_events = []
+    closed_downtimes = []
+
+    # Versão desta gravação; marca os status que mudaram (systems_list?since=)
+    version = bump_version()
+
+    ordered = sorted(checks, key=lambda c: c.checked_at)
+    for check in ordered:
+        system_id = check.system.pk
+        status_str = check_status(check)
+
+        # 1️⃣ Atualiza status atual
+        obj = current.get(system_id)
+        if obj is None:
+            obj = SystemStatus(system_id=system_id)
+            current[system_id] = obj
+            new_statuses[system_id] = obj
+        elif system_id not in new_statuses:
+            changed_statuses[system_id] = obj
+        if obj.status != status_str:
+            transitions.append((check.system, obj.status, status_str, check.checked_at, check.status_code))
+            obj.change_seq = version
+        obj.status = status_str
+        obj.status_code = check.status_code
+        obj.response_ms = check.elapsed_ms
+        obj.checked_at = check.checked_at
+        details = check.details
+        obj.phases = details.phases if details else None
+        obj.resolved_ip = details.resolved_ip if details else None
+        obj.tls_expires_at = details.tls_expires_at if details else None
+
+        # 2️⃣ Histórico de status
+        if store_checks:
+            history.append(
+                SystemStatusHistory(
+                    system_id=system_id,
+                    status=status_str,
+                    status_code=check.status_code,
+                    response_ms=check.elapsed_ms,
+                    checked_at=check.checked_at,
+                    phases=obj.phases,
+                )
+            )
+
+        # 3️⃣ Controle de downtime
+        active_downtime = open_downtimes.get(system_id)
+        if status_str == "UP":
+            if active_downtime:
+                active_downtime.ended_at = check.checked_at
+                del open_downtimes[system_id]
+                downtime_events.append((check.system, "closed", active_downtime))
+                closed_downtimes.append(active_downtime)
+                if active_downtime.pk:
+                    changed_downtimes[active_downtime.pk] = active_downtime
+        elif status_str in {"DOWN", "FORBIDDEN"}:
+            if active_downtime:
+                if active_downtime.status != status_str:
+                    active_downtime.status = status_str
+                    downtime_events.append((check.system, "changed", active_downtime))
+                    if active_downtime.pk:
+                        changed_downtimes[active_downtime.pk] = active_downtime
+            else:
+                downtime = SystemDowntime(
+                    system_id=system_id,
+                    status=status_str,
+                    started_at=check.checked_at,
+                )
+                open_downtimes[system_id] = downtime
+                new_downtimes.append(downtime)
+                downtime_events.append((check.system, "opened", downtime))
+
+    SystemStatus.objects.bulk_create(new_statuses.values())
+    SystemStatus.objects.bulk_update(
+        changed_statuses.values(),
+        ["status", "status_code", "response_ms", "checked_at", "change_seq", "phases", "resolved_ip", "tls_expires_at"],
+    )
+    SystemStatusHistory.objects.bulk_create(history)
+    SystemDowntime.objects.bulk_create(new_downtimes)
+    # bulk_update não aplica o auto_now de updated_at
+    updated_at = timezone.now()
+    for downtime in changed_downtimes.values():
+        downtime.updated_at = updated_at
+    SystemDowntime.objects.bulk_update(changed_downtimes.values(), ["status", "ended_at", "updated_at"])
+    record_closed_downtimes(closed_downtimes)
+
+    # 4️⃣ Intervalos de status, distribuição de latência e agregações por hora/dia
+    update_intervals(
+        (check.system.pk, check_status(check), check.status_code, check.checked_at)
+        for check in ordered
+    )
+    update_sketches(checks)
+    update_rollups(
+        (check.system.pk, check_status(check), check.checked_at)
+        for check in checks
+    )
+
+    # 5️⃣ Eventos para o stream e snapshot em memória deste processo (com a
+    # versão global do início da gravação)
+    last_event_id = publish_events(ordered, transitions, downtime_events)
+    latest = {
+        check.system.pk: {
+            "id": check.system.pk,
+            "status": check_status(check),
+            "status_code": check.status_code,
+            "response_ms": check.elapsed_ms,
+            "checked_at": check.checked_at,
+            "phases": current[check.system.pk].phases,
+            "resolved_ip": current[check.system.pk].resolved_ip,
+            "tls_expires_at": current[check.system.pk].tls_expires_at,
+        }
+        for check in ordered
+    }
+    transaction.on_commit(partial(apply_committed, version, last_event_id, list(latest.values())))
+    if transitions:
+        transaction.on_commit(partial(count_transitions, [(t[1], t[2]) for t in transitions]))
+
+    # 6️⃣ Avisos no Discord: só transições reais, enviados após o commit
+    if enqueue_notifications(transitions):
+        transaction.on_commit(wake_dispatcher)
+
+
+def record_checks(checks, max_retries=3):
+    """Grava várias verificações (status atual, histórico e downtime) em uma
+    única transação, usando inserções e atualizações em lote.
+
+    Chamado pela thread de escrita (``monitor/writer.py``), que junta as
+    verificações das views e do agendador ``run_probes`` em lotes. Se o
+    SQLite continuar travado após ``max_retries`` tentativas, o
+    ``OperationalError`` é propagado para o chamador.
+    """
+    checks = list(checks)
+    if not checks:
+        return
+
+    # Tentar evitar bloqueio SQLite com retry
+    for attempt in range(max_retries):
+        try:
+            with transaction.atomic():
+                _apply_checks(checks)
+            return
+        except OperationalError:
+            # SQLite pode travar, então damos uma pequena pausa e tentamos de novo
+            if attempt < max_retries - 1:
+                SQLITE_RETRIES.inc("record_checks")
+                time.sleep(0.5)
+                continue
+            raise
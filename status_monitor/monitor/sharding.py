@@ -0,0 +1,241 @@
+import logging
+import math
+import os
+import random
+import socket
+import time
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Mod
+from django.utils import timezone
+from .models import ProbeShardLease, ProbeWorker, System
+from .scheduler import SYSTEM_FIELDS, ProbeScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+class ShardCoordinator:
+    """Divide os shards entre os workers vivos usando ``ProbeShardLease``.
+
+    A cada heartbeat o worker renova as posses que ainda valem, devolve as
+    que sobram acima da sua parte (``ceil(shards / workers vivos)``) e toma
+    shards livres até completá-la. Tomar um shard é um UPDATE condicional
+    (livre ou expirado), então dois workers nunca ficam com o mesmo.
+
+    Um shard a devolver sai antes da lista de ativos e só é liberado no banco
+    quando não tem mais verificação em andamento; quem o toma depois começa
+    pelo ``checked_at`` da última verificação gravada.
+    """
+
+    def __init__(self, name=None, shards=None, lease_seconds=None):
+        self.hostname = socket.gethostname()
+        self.name = name or f"{self.hostname}-{os.getpid()}"
+        self.shards = shards or getattr(settings, "PROBE_SHARDS", 64)
+        self.lease_seconds = lease_seconds or getattr(settings, "PROBE_LEASE_SECONDS", 30)
+        self.worker = None
+        # Posses no banco (inclusive as que estão sendo devolvidas)
+        self.owned = set()
+        self.releasing = set()
+
+    def ensure_shards(self):
+        ProbeShardLease.objects.bulk_create(
+            (ProbeShardLease(shard=shard) for shard in range(self.shards)), ignore_conflicts=True
+        )
+
+    def heartbeat(self, stats, busy=frozenset()):
+        """Renova, devolve e toma shards. ``busy`` são os shards com
+        verificação em andamento (ainda não podem ser liberados). Retorna os
+        shards que o worker deve verificar."""
+        now = timezone.now()
+        expires = now + timedelta(seconds=self.lease_seconds)
+        with transaction.atomic():
+            worker, _ = ProbeWorker.objects.update_or_create(
+                name=self.name,
+                defaults={"hostname": self.hostname, "pid": os.getpid(), "heartbeat_at": now, **stats},
+            )
+            self.worker = worker
+            leases = ProbeShardLease.objects.filter(shard__lt=self.shards)
+
+            # 1️⃣ Renova o que ainda vale; o que expirou pode já ter outro dono
+            leases.filter(worker=worker, expires_at__gt=now).update(expires_at=expires)
+            owned = set(leases.filter(worker=worker, expires_at__gte=expires).values_list("shard", flat=True))
+
+            # 2️⃣ Libera os que estavam sendo devolvidos e já não têm verificação em andamento
+            ready = (self.releasing & owned) - set(busy)
+            if ready:
+                leases.filter(worker=worker, shard__in=ready).update(worker=None, expires_at=None)
+                owned -= ready
+            self.releasing &= owned
+
+            # 3️⃣ Ajusta à parte justa entre os workers vivos
+            alive = ProbeWorker.objects.filter(
+                heartbeat_at__gt=now - timedelta(seconds=self.lease_seconds)
+            ).count()
+            fair = math.ceil(self.shards / max(1, alive))
+            active = owned - self.releasing
+            if len(active) > fair:
+                extra = set(sorted(active)[fair:])
+                self.releasing |= extra
+                active -= extra
+            elif len(active) < fair:
+                # Primeiro desiste de devolver, depois procura shards livres
+                kept = set(sorted(self.releasing)[: fair - len(active)])
+                self.releasing -= kept
+                active |= kept
+                free = list(
+                    leases.filter(Q(worker__isnull=True) | Q(expires_at__lte=now)).values_list("shard", flat=True)
+                )
+                random.shuffle(free)
+                for shard in free:
+                    if len(active) >= fair:
+                        break
+                    claimed = (
+                        leases.filter(shard=shard)
+                        .filter(Q(worker__isnull=True) | Q(expires_at__lte=now))
+                        .update(worker=worker, expires_at=expires)
+                    )
+                    if claimed:
+                        active.add(shard)
+                        owned.add(shard)
+
+            ProbeWorker.objects.filter(pk=worker.pk).update(shards=len(active))
+            # Workers mortos há muito tempo saem da lista (as posses já expiraram)
+            ProbeWorker.objects.filter(
+                heartbeat_at__lt=now - timedelta(seconds=self.lease_seconds * 10)
+            ).delete()
+
+        self.owned = owned
+        return frozenset(active)
+
+    def leave(self):
+        """Libera todos os shards e sai da lista de workers."""
+        if self.worker is None:
+            return
+        ProbeShardLease.objects.filter(worker=self.worker).update(worker=None, expires_at=None)
+        ProbeWorker.objects.filter(pk=self.worker.pk).delete()
+        self.owned = set()
+        self.releasing = set()
+
+
+class ShardedProbeScheduler(ProbeScheduler):
+    """``ProbeScheduler`` que verifica só os sistemas dos shards que possui.
+
+    O heartbeat roda a cada ``PROBE_LEASE_SECONDS / 3`` no lugar do
+    recarregamento periódico. Se o heartbeat não for renovado a tempo (banco
+    travado, processo pausado), o worker para de despachar verificações
+    antes de a posse expirar para os outros.
+    """
+
+    def __init__(self, workers=20, jitter=0.1, reload_interval=60, shards=None, lease_seconds=None, name=None):
+        self.coordinator = ShardCoordinator(name=name, shards=shards, lease_seconds=lease_seconds)
+        heartbeat = max(1.0, self.coordinator.lease_seconds / 3)
+        super().__init__(workers=workers, jitter=jitter, reload_interval=heartbeat)
+        # Cadastro relido a cada catalog_interval, ou quando os shards mudam
+        self.catalog_interval = reload_interval
+        self.active_shards = frozenset()
+        self._valid_until = 0.0
+        self._next_catalog = 0.0
+        self._window = (time.monotonic(), 0)
+
+    def shard_of(self, system_id):
+        return system_id % self.coordinator.shards
+
+    def load_systems(self):
+        if not self.active_shards:
+            return {}
+        systems = (
+            System.objects.annotate(
+                shard=Mod("id", self.coordinator.shards),
+                last_checked=F("current_status__checked_at"),
+            )
+            .filter(shard__in=self.active_shards)
+            .only(*SYSTEM_FIELDS)
+        )
+        return {system.pk: system for system in systems}
+
+    def _first_run(self, system, now):
+        # Continua de onde o dono anterior do shard parou
+        if system.last_checked is None:
+            return super()._first_run(system, now)
+        wait = (system.last_checked - timezone.now()).total_seconds() + system.check_interval
+        return now + max(0.0, wait)
+
+    def _can_dispatch(self):
+        return time.monotonic() < self._valid_until
+
+    def _stats(self):
+        now = time.monotonic()
+        with self._lock:
+            completed = self.completed
+            backlog = sum(1 for when, system_id in self._queue if when <= now and system_id in self._systems)
+            in_flight = len(self._in_flight)
+            busy = {self.shard_of(system_id) for system_id in self._in_flight}
+        started, previous = self._window
+        elapsed = max(now - started, 1e-6)
+        self._window = (now, completed)
+        return {
+            "probes_total": completed,
+            "probes_per_minute": round((completed - previous) * 60 / elapsed, 1),
+            "backlog": backlog,
+            "in_flight": in_flight,
+        }, busy
+
+    def reload(self):
+        if self.coordinator.worker is None:
+            self.coordinator.ensure_shards()
+        started = time.monotonic()
+        stats, busy = self._stats()
+        active = self.coordinator.heartbeat(stats, busy)
+        # Margem de um heartbeat antes da expiração vista pelos outros workers
+        self._valid_until = started + self.coordinator.lease_seconds - self.reload_interval
+
+        previous = self.active_shards
+        if active != previous:
+            gained, lost = active - self.active_shards, self.active_shards - active
+            logger.info(
+                "Worker %s: %d shards (+%d -%d)", self.coordinator.name, len(active), len(gained), len(lost)
+            )
+            self.active_shards = active
+        if active != previous or time.monotonic() >= self._next_catalog:
+            super().reload()
+            self._next_catalog = time.monotonic() + self.catalog_interval
+        else:
+            self._next_reload = time.monotonic() + self.reload_interval
+        logger.debug("Worker %s: %s", self.coordinator.name, stats)
+
+    def run(self):
+        try:
+            super().run()
+        finally:
+            self.coordinator.leave()
+            logger.info("Worker %s saiu; shards liberados", self.coordinator.name)
+
+
+def worker_stats():
+    """Workers registrados, com vazão e fila, e os shards sem dono válido."""
+    now = timezone.now()
+    lease_seconds = getattr(settings, "PROBE_LEASE_SECONDS", 30)
+    alive_since = now - timedelta(seconds=lease_seconds)
+    workers = [
+        {
+            "name": worker.name,
+            "hostname": worker.hostname,
+            "pid": worker.pid,
+            "alive": worker.heartbeat_at > alive_since,
+            "heartbeat_age_s": round((now - worker.heartbeat_at).total_seconds(), 1),
+            "shards": worker.shards,
+            "probes_total": worker.probes_total,
+            "probes_per_minute": worker.probes_per_minute,
+            "backlog": worker.backlog,
+            "in_flight": worker.in_flight,
+        }
+        for worker in ProbeWorker.objects.all()
+    ]
+    unowned = ProbeShardLease.objects.filter(
+        Q(worker__isnull=True) | Q(expires_at__lte=now), shard__lt=getattr(settings, "PROBE_SHARDS", 64)
+    ).count()
+    return {"workers": workers, "unowned_shards": unowned}
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.signals import got_request_exception
+from django.db import OperationalError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .events import publish_catalog_change
+from .metrics import DATABASE_LOCKED_ERRORS
+from .models import Server, System
+from .versioning import bump_version
+
+
+@receiver(post_save, sender=Server)
+@receiver(post_delete, sender=Server)
+@receiver(post_save, sender=System)
+@receiver(post_delete, sender=System)
+def bump_on_inventory_change(sender, **kwargs):
+    # Cadastro de servidores/sistemas também muda o conteúdo de systems_list.
+    # O evento vem antes da versão: quem vê a versão nova já vê o evento e
+    # recarrega o snapshot inteiro.
+    publish_catalog_change()
+    bump_version(catalog=True)
+
+
+@receiver(got_request_exception)
+def count_database_locked(sender, **kwargs):
+    # Enviado dentro do except que vai virar a resposta 500
+    exc = sys.exc_info()[1]
+    if isinstance(exc, OperationalError) and "locked" in str(exc):
+        DATABASE_LOCKED_ERRORS.inc()
@@ -0,0 +1,296 @@
+import numpy as np
+
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from .models import System, SystemDowntime
+from .versioning import current_catalog_version
+
+
+def parse_month(value):
+    """``"2025-01"`` -> ``(2025, 1)``; ``ValueError`` se inválido."""
+    try:
+        year, month = (int(part) for part in value.split("-"))
+    except (AttributeError, ValueError) as exc:
+        raise ValueError(value) from exc
+    if not 1 <= month <= 12 or year < 1970:
+        raise ValueError(value)
+    return year, month
+
+
+def month_starts(first, count):
+    """Início (meia-noite local) de ``count + 1`` meses a partir de ``first``:
+    as fronteiras dos ``count`` meses."""
+    year, month = first
+    tz = timezone.get_current_timezone()
+    starts = []
+    for offset in range(count + 1):
+        years, index = divmod(month - 1 + offset, 12)
+        starts.append(timezone.make_aware(datetime(year + years, index + 1, 1), tz))
+    return starts
+
+
+def merge_intervals(group, start, end):
+    """Une os intervalos ``[start, end)`` sobrepostos ou encostados de cada
+    grupo. Devolve ``(group, start, end)`` dos intervalos unidos, em ordem de
+    grupo e início.
+
+    ``group`` são inteiros não negativos; ``start`` e ``end``, segundos.
+    """
+    if not len(start):
+        return group, start, end
+    order = np.lexsort((start, group))
+    group, start, end = group[order], start[order], end[order]
+    # Cada grupo é deslocado para uma faixa própria da reta: um único máximo
+    # acumulado dos fins serve para todos, sem vazar de um grupo para outro
+    span = end.max() - start.min() + 1
+    shift = group * span - start.min()
+    reach = np.maximum.accumulate(end + shift)
+    opens = np.ones(len(start), dtype=bool)
+    opens[1:] = start[1:] + shift[1:] > reach[:-1]
+    first = np.flatnonzero(opens)
+    return group[first], start[first], np.maximum.reduceat(end, first)
+
+
+def split_at(bounds, start, end):
+    """Corta cada ``[start, end)`` nas fronteiras ``bounds`` (crescentes, e
+    que contêm todos os intervalos). Devolve ``(índice do intervalo, índice
+    da faixa, início, fim)`` de cada pedaço."""
+    first = np.searchsorted(bounds, start, "right") - 1
+    last = np.searchsorted(bounds, end, "left") - 1
+    counts = last - first + 1
+    owner = np.repeat(np.arange(len(start)), counts)
+    # Posição de cada pedaço dentro do seu intervalo: 0, 1, ...
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    bucket = first[owner] + step
+    return owner, bucket, np.maximum(start[owner], bounds[bucket]), np.minimum(end[owner], bounds[bucket + 1])
+
+
+def period_fingerprint(start, end):
+    """Resumo dos downtimes que tocam ``[start, end)``: muda quando um deles é
+    criado, alterado (``updated_at``) ou apagado."""
+    row = (
+        SystemDowntime.objects.filter(started_at__lt=end)
+        .filter(Q(ended_at__isnull=True) | Q(ended_at__gt=start))
+        .aggregate(count=Count("id"), updated=Max("updated_at"))
+    )
+    updated = row["updated"].timestamp() if row["updated"] else 0
+    return f"{row['count']}:{updated}"
+
+
+def _compute(bounds, now):
+    """Downtime, incidentes e maior queda por sistema, no período todo e por
+    mês, com a frota inteira; as somas por servidor ficam para ``_report``."""
+    systems = list(
+        System.objects.order_by("server__name", "name").values_list("id", "name", "server_id", "server__name")
+    )
+    ids = np.array([system[0] for system in systems], dtype=np.int64)
+    by_id = np.argsort(ids)
+    # Meses (ou o trecho deles) ainda no futuro não contam
+    edges = np.minimum(np.array([moment.timestamp() for moment in bounds]), now.timestamp())
+    period_start, period_end = edges[0], edges[-1]
+    months = len(bounds) - 1
+
+    rows = (
+        SystemDowntime.objects.filter(started_at__lt=bounds[-1])
+        .filter(Q(ended_at__isnull=True) | Q(ended_at__gt=bounds[0]))
+        .values_list("system_id", "started_at", "ended_at")
+    )
+    system_ids, starts, ends = [], [], []
+    for system_id, started_at, ended_at in rows:
+        system_ids.append(system_id)
+        starts.append(started_at.timestamp())
+        ends.append(ended_at.timestamp() if ended_at else period_end)
+
+    # Posição de cada sistema na lista; sistemas cadastrados depois dela ficam
+    # de fora (chegam no próximo cálculo, pela versão do cadastro)
+    system_ids = np.array(system_ids, dtype=np.int64)
+    known = np.isin(system_ids, ids)
+    group = by_id[np.searchsorted(ids[by_id], system_ids[known])]
+    start = np.clip(np.array(starts, dtype=float)[known], period_start, period_end)
+    end = np.clip(np.array(ends, dtype=float)[known], period_start, period_end)
+    keep = end > start
+    group, start, end = merge_intervals(group[keep], start[keep], end[keep])
+
+    count = len(systems)
+    duration = end - start
+    longest = np.zeros(count)
+    np.maximum.at(longest, group, duration)
+
+    owner, bucket, piece_start, piece_end = split_at(edges, start, end)
+    key = group[owner] * months + bucket
+    piece = piece_end - piece_start
+    month_longest = np.zeros(count * months)
+    np.maximum.at(month_longest, key, piece)
+
+    return {
+        "systems": systems,
+        "months": [timezone.localtime(moment).strftime("%Y-%m") for moment in bounds[:-1]],
+        "start": bounds[0],
+        "end": datetime.fromtimestamp(period_end, tz=timezone.get_current_timezone()),
+        "seconds": period_end - period_start,
+        "month_seconds": np.diff(edges),
+        "downtime": np.bincount(group, weights=duration, minlength=count),
+        "incidents": np.bincount(group, minlength=count),
+        "longest": longest,
+        # Incidentes por mês: quedas que tocam o mês (uma que atravessa a
+        # virada conta nos dois)
+        "month_downtime": np.bincount(key, weights=piece, minlength=count * months).reshape(count, months),
+        "month_incidents": np.bincount(key, minlength=count * months).reshape(count, months),
+        "month_longest": month_longest.reshape(count, months),
+    }
+
+
+def _summary(seconds, downtime, incidents, longest):
+    """Indicadores de ``seconds`` segundos de operação somados (sistemas x
+    tempo) com ``downtime`` segundos fora do ar em ``incidents`` quedas."""
+    if seconds <= 0:
+        return {"availability": None, "downtime_s": 0, "incidents": 0, "mttr_s": None, "mtbf_s": None, "longest_s": 0}
+    incidents = int(incidents)
+    return {
+        "availability": round(float(100 * (1 - downtime / seconds)), 4),
+        "downtime_s": round(downtime),
+        "incidents": incidents,
+        "mttr_s": round(downtime / incidents) if incidents else None,
+        "mtbf_s": round((seconds - downtime) / incidents) if incidents else None,
+        "longest_s": round(longest),
+    }
+
+
+def _months(labels, month_seconds, downtime, incidents, longest, weight=1):
+    return [
+        {"month": label, **_summary(seconds * weight, down, count, peak)}
+        for label, seconds, down, count, peak in zip(labels, month_seconds, downtime, incidents, longest)
+    ]
+
+
+def _report(data, selected):
+    systems = data["systems"]
+    labels, month_seconds = data["months"], data["month_seconds"]
+    rows = np.flatnonzero(selected)
+
+    server_names = []
+    server_of = np.zeros(len(rows), dtype=np.int64)
+    for position, row in enumerate(rows):
+        name = systems[row][3]
+        if not server_names or server_names[-1] != name:
+            server_names.append(name)
+        server_of[position] = len(server_names) - 1
+    servers = len(server_names)
+
+    def per_server(values, reduce=np.add):
+        shape = (servers,) + values.shape[1:]
+        totals = np.zeros(shape, dtype=float)
+        reduce.at(totals, server_of, values[rows])
+        return totals
+
+    server_downtime = per_server(data["downtime"])
+    server_incidents = per_server(data["incidents"])
+    server_longest = per_server(data["longest"], np.maximum)
+    server_month_downtime = per_server(data["month_downtime"])
+    server_month_incidents = per_server(data["month_incidents"])
+    server_month_longest = per_server(data["month_longest"], np.maximum)
+    sizes = np.bincount(server_of, minlength=servers)
+    count = len(rows)
+
+    return {
+        "from": labels[0],
+        "to": labels[-1],
+        "start": timezone.localtime(data["start"]).isoformat(),
+        "end": timezone.localtime(data["end"]).isoformat(),
+        "overall": _summary(
+            data["seconds"] * count,
+            server_downtime.sum(),
+            server_incidents.sum(),
+            server_longest.max(initial=0),
+        ),
+        "months": _months(
+            labels,
+            month_seconds,
+            server_month_downtime.sum(axis=0),
+            server_month_incidents.sum(axis=0),
+            server_month_longest.max(axis=0, initial=0),
+            weight=count,
+        ),
+        "servers": [
+            {
+                "server": name,
+                "systems": int(sizes[index]),
+                **_summary(
+                    data["seconds"] * sizes[index],
+                    server_downtime[index],
+                    server_incidents[index],
+                    server_longest[index],
+                ),
+                "months": _months(
+                    labels,
+                    month_seconds,
+                    server_month_downtime[index],
+                    server_month_incidents[index],
+                    server_month_longest[index],
+                    weight=sizes[index],
+                ),
+            }
+            for index, name in enumerate(server_names)
+        ],
+        "systems": [
+            {
+                "system": systems[row][1],
+                "server": systems[row][3],
+                **_summary(data["seconds"], data["downtime"][row], data["incidents"][row], data["longest"][row]),
+                "months": _months(
+                    labels,
+                    month_seconds,
+                    data["month_downtime"][row],
+                    data["month_incidents"][row],
+                    data["month_longest"][row],
+                ),
+            }
+            for row in rows
+        ],
+    }
+
+
+def sla_report(first, last, system=None, server=None):
+    """Disponibilidade (%), incidentes, tempo fora do ar, MTTR, MTBF e maior
+    queda de ``first`` a ``last`` (meses ``(ano, mês)``, inclusive): no total,
+    por mês, por servidor e por sistema.
+
+    Quedas sobrepostas de um sistema contam como uma só. Os números de um
+    servidor somam os seus sistemas (sistemas x tempo), e os de ``overall``,
+    os sistemas escolhidos. O cálculo da frota inteira é guardado em cache
+    por período e só refeito quando um downtime do período (ou o cadastro)
+    muda; períodos que ainda não terminaram são sempre recalculados.
+    ``ValueError`` se ``last`` vier antes de ``first`` ou se o período
+    passar de ``SLA_MAX_MONTHS``.
+    """
+    count = (last[0] - first[0]) * 12 + last[1] - first[1] + 1
+    if count < 1:
+        raise ValueError("O mês final vem antes do inicial")
+    max_months = getattr(settings, "SLA_MAX_MONTHS", 36)
+    if count > max_months:
+        raise ValueError(f"Período acima de {max_months} meses")
+
+    bounds = month_starts(first, count)
+    now = timezone.now()
+    if bounds[-1] > now:
+        data = _compute(bounds, now)
+    else:
+        # A chave muda com os downtimes do período: nada a invalidar à mão
+        key = (
+            f"sla:{bounds[0].timestamp():.0f}:{bounds[-1].timestamp():.0f}:"
+            f"{current_catalog_version()}:{period_fingerprint(bounds[0], bounds[-1])}"
+        )
+        data = cache.get(key)
+        if data is None:
+            data = _compute(bounds, now)
+            cache.set(key, data, getattr(settings, "SLA_CACHE_TIMEOUT", 7 * 24 * 3600))
+
+    selected = np.ones(len(data["systems"]), dtype=bool)
+    if system:
+        selected &= np.array([entry[1] == system for entry in data["systems"]], dtype=bool)
+    if server:
+        selected &= np.array([entry[3] == server for entry in data["systems"]], dtype=bool)
+    return _report(data, selected)
@@ -0,0 +1,344 @@
+import json
+import logging
+import threading
+
+from datetime import datetime
+from django.utils import timezone
+from .events import CHECKED_AT_FORMAT, latest_event_id
+from .models import Server, StatusEvent
+from .versioning import current_version
+
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("UP", "FORBIDDEN", "DOWN")
+
+# Acima disso é mais barato recarregar tudo do que reaplicar os eventos
+CATCH_UP_LIMIT = 500
+
+
+def status_bucket(status):
+    if status is None:
+        return None
+    return status if status in ("UP", "FORBIDDEN") else "DOWN"
+
+
+def _measured(value):
+    # Sistemas ainda sem o valor ficam por último nas duas direções
+    return (0, value) if value is not None else (1, 0)
+
+
+def _response_ms(entry):
+    return entry["current_status"] and entry["current_status"]["response_ms"]
+
+
+def _checked_ts(entry):
+    checked_at = entry["current_status"] and entry["current_status"]["checked_at"]
+    return checked_at.timestamp() if checked_at else None
+
+
+def _negate(value):
+    return -value if value is not None else None
+
+
+def _setup_share(entry):
+    """Fração do tempo até o primeiro byte gasta em DNS, conexão e TLS."""
+    phases = entry["current_status"] and entry["current_status"]["phases"]
+    if not phases:
+        return None
+    dns, connect, tls, ttfb, _ = phases
+    setup = (dns or 0) + (connect or 0) + (tls or 0)
+    total = setup + (ttfb or 0)
+    return round(setup / total, 4) if total else None
+
+
+# Chave de ordenação de cada sistema (sem o id, acrescentado no fim para
+# desempate); precisa ser serializável em JSON, pois vira o cursor da grade
+SORT_KEYS = {
+    "name": lambda entry: (entry["name"].lower(),),
+    "latency": lambda entry: _measured(_response_ms(entry)),
+    "-latency": lambda entry: _measured(_negate(_response_ms(entry))),
+    "checked": lambda entry: _measured(_checked_ts(entry)),
+    "-checked": lambda entry: _measured(_negate(_checked_ts(entry))),
+    "-setup": lambda entry: _measured(_negate(_setup_share(entry))),
+}
+
+# Ordens que não dependem do status e sobrevivem a with_results
+STATIC_SORTS = ("name",)
+
+
+class StatusSnapshot:
+    """Status atual de todos os sistemas e contadores por status e por
+    servidor, válidos para uma versão global (``StatusVersion``).
+
+    Uma instância nunca é alterada depois de publicada: atualizações criam
+    uma nova, então as views leem sem lock.
+    """
+
+    def __init__(self, version, last_event_id, servers, systems, counts=None, server_counts=None, reuse=None):
+        self.version = version
+        self.last_event_id = last_event_id
+        # [(server_id, nome, (system_id, ...)), ...] em ordem de id
+        self.servers = servers
+        # system_id -> {"id", "name", "url", "server_id", "current_status"}
+        self.systems = systems
+        if counts is None:
+            counts, server_counts = self._count(servers, systems)
+        self.counts = counts
+        self.server_counts = server_counts
+        self._systems_json = None
+        # Nome e URL não mudam com as verificações: ordem por nome e texto de
+        # busca passam para as instâncias seguintes
+        self._ordered = {}
+        self._search_text = None
+        if reuse is not None:
+            self._ordered = {sort: keys for sort, keys in reuse._ordered.items() if sort in STATIC_SORTS}
+            self._search_text = reuse._search_text
+
+    @staticmethod
+    def _count(servers, systems):
+        counts = dict.fromkeys(STATUSES, 0)
+        server_counts = {server_id: dict.fromkeys(STATUSES, 0) for server_id, _, _ in servers}
+        for entry in systems.values():
+            bucket = status_bucket(entry["current_status"] and entry["current_status"]["status"])
+            if bucket:
+                counts[bucket] += 1
+                server_counts[entry["server_id"]][bucket] += 1
+        return counts, server_counts
+
+    @property
+    def total(self):
+        return len(self.systems)
+
+    def with_results(self, results, version, last_event_id):
+        """Nova instância com os resultados ``{"id", "status", "status_code",
+        "response_ms", "checked_at", "phases", "resolved_ip",
+        "tls_expires_at"}`` aplicados; contadores ajustados só pelos sistemas
+        que mudaram."""
+        systems = dict(self.systems)
+        counts = dict(self.counts)
+        server_counts = dict(self.server_counts)
+        for result in results:
+            entry = systems.get(result["id"])
+            if entry is None:
+                continue
+            previous = status_bucket(entry["current_status"] and entry["current_status"]["status"])
+            current = status_bucket(result["status"])
+            systems[result["id"]] = {
+                **entry,
+                "current_status": {
+                    "status": result["status"],
+                    "status_code": result["status_code"],
+                    "response_ms": result["response_ms"],
+                    "checked_at": result["checked_at"],
+                    # Eventos gravados antes das fases não as trazem
+                    "phases": result.get("phases"),
+                    "resolved_ip": result.get("resolved_ip"),
+                    "tls_expires_at": result.get("tls_expires_at"),
+                },
+            }
+            if previous == current:
+                continue
+            per_server = server_counts[entry["server_id"]] = dict(server_counts[entry["server_id"]])
+            if previous:
+                counts[previous] -= 1
+                per_server[previous] -= 1
+            counts[current] += 1
+            per_server[current] += 1
+        return StatusSnapshot(version, last_event_id, self.servers, systems, counts, server_counts, reuse=self)
+
+    def systems_json(self):
+        """Corpo de ``systems_list``, montado uma vez por versão."""
+        if self._systems_json is None:
+            payload = {}
+            for _, server_name, system_ids in self.servers:
+                payload[server_name] = [
+                    {
+                        "name": entry["name"],
+                        "url": entry["url"],
+                        "status": status and status["status"],
+                        "checked_at": timezone.localtime(status["checked_at"]).strftime(CHECKED_AT_FORMAT)
+                        if status and status["checked_at"]
+                        else None,
+                    }
+                    for entry in (self.systems[system_id] for system_id in system_ids)
+                    for status in (entry["current_status"],)
+                ]
+            self._systems_json = json.dumps(payload)
+        return self._systems_json
+
+    def ordered(self, sort):
+        """Chaves ``(*SORT_KEYS[sort](sistema), system_id)`` de todos os
+        sistemas em ordem crescente, montadas uma vez por versão."""
+        keys = self._ordered.get(sort)
+        if keys is None:
+            key_func = SORT_KEYS[sort]
+            keys = self._ordered[sort] = sorted(
+                key_func(entry) + (system_id,) for system_id, entry in self.systems.items()
+            )
+        return keys
+
+    def search_text(self):
+        """``system_id -> "nome\nurl"`` em minúsculas, para a busca da grade."""
+        if self._search_text is None:
+            self._search_text = {
+                system_id: f"{entry['name']}\n{entry['url']}".lower() for system_id, entry in self.systems.items()
+            }
+        return self._search_text
+
+
+def _load():
+    # Versão e último evento lidos antes dos status, sem transação (que com
+    # transaction_mode=IMMEDIATE pegaria o lock de escrita): os dados ficam no
+    # mínimo tão novos quanto a versão, e reaplicar um evento já refletido não
+    # muda o resultado.
+    version = current_version()
+    last_event_id = latest_event_id()
+    rows = list(
+        Server.objects.order_by("id", "systems__id").values_list(
+            "id",
+            "name",
+            "systems__id",
+            "systems__name",
+            "systems__url",
+            "systems__current_status__status",
+            "systems__current_status__status_code",
+            "systems__current_status__response_ms",
+            "systems__current_status__checked_at",
+            "systems__current_status__phases",
+            "systems__current_status__resolved_ip",
+            "systems__current_status__tls_expires_at",
+        )
+    )
+
+    servers, systems = [], {}
+    for (
+        server_id,
+        server_name,
+        system_id,
+        name,
+        url,
+        status,
+        status_code,
+        response_ms,
+        checked_at,
+        phases,
+        resolved_ip,
+        tls_expires_at,
+    ) in rows:
+        if not servers or servers[-1][0] != server_id:
+            servers.append((server_id, server_name, []))
+        if system_id is None:
+            continue
+        servers[-1][2].append(system_id)
+        systems[system_id] = {
+            "id": system_id,
+            "name": name,
+            "url": url,
+            "server_id": server_id,
+            "current_status": {
+                "status": status,
+                "status_code": status_code,
+                "response_ms": response_ms,
+                "checked_at": checked_at,
+                "phases": phases,
+                "resolved_ip": resolved_ip,
+                "tls_expires_at": tls_expires_at,
+            }
+            if status is not None
+            else None,
+        }
+    servers = [(server_id, name, tuple(system_ids)) for server_id, name, system_ids in servers]
+    return StatusSnapshot(version, last_event_id, servers, systems)
+
+
+def _parse_moment(value, tz):
+    return timezone.make_aware(datetime.strptime(value, CHECKED_AT_FORMAT), tz) if value else None
+
+
+def _event_results(payload):
+    tz = timezone.get_current_timezone()
+    for result in payload.get("results", []):
+        yield {
+            **result,
+            "checked_at": _parse_moment(result.get("checked_at"), tz),
+            "tls_expires_at": _parse_moment(result.get("tls_expires_at"), tz),
+        }
+
+
+def _catch_up(snapshot):
+    """Traz ``snapshot`` para a versão atual reaplicando os eventos gravados
+    por outros processos; recarrega tudo se o cadastro mudou, se faltarem
+    eventos (já podados) ou se forem muitos."""
+    # A versão é lida antes dos eventos: eles incluem tudo o que ela cobre
+    version = current_version()
+    if version == snapshot.version:
+        return snapshot
+    events = list(
+        StatusEvent.objects.filter(id__gt=snapshot.last_event_id)
+        .order_by("id")
+        .values_list("id", "kind", "payload")[: CATCH_UP_LIMIT + 1]
+    )
+
+    if (
+        len(events) > CATCH_UP_LIMIT
+        or (events and events[0][0] != snapshot.last_event_id + 1)
+        or any(kind == "catalog" for _, kind, _ in events)
+    ):
+        return _load()
+
+    results = [
+        result
+        for _, kind, payload in events
+        if kind == "checks"
+        for result in _event_results(payload)
+    ]
+    last_event_id = events[-1][0] if events else snapshot.last_event_id
+    return snapshot.with_results(results, version, last_event_id)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    """Snapshot da versão atual. Custa uma consulta pela versão quando nada
+    mudou; sem agregações em nenhum caso."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and current_version() == snapshot.version:
+        return snapshot
+    with _lock:
+        if _snapshot is None:
+            _snapshot = _load()
+        else:
+            _snapshot = _catch_up(_snapshot)
+        return _snapshot
+
+
+def cached_snapshot():
+    """Último snapshot deste processo, sem conferir a versão no banco (só a
+    primeira chamada carrega). Fica em dia pelas gravações do processo
+    (``apply_committed``), pelas leituras das views e, sob ASGI, pelos
+    eventos que o broadcaster do SSE recebe."""
+    snapshot = _snapshot
+    return snapshot if snapshot is not None else get_snapshot()
+
+
+def apply_committed(version, last_event_id, results):
+    """Aplica ao snapshot local as verificações que este processo acabou de
+    gravar (``on_commit``). Se outra gravação aconteceu no meio, alcança a
+    versão pelos eventos, para ``cached_snapshot`` não ficar para trás."""
+    global _snapshot
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version >= version:
+            return
+        try:
+            if snapshot.version == version - 1:
+                _snapshot = snapshot.with_results(results, version, last_event_id)
+            else:
+                _snapshot = _catch_up(snapshot)
+        except Exception:
+            logger.exception("Falha ao atualizar o snapshot; será recarregado")
+            _snapshot = None
@@ -0,0 +1,93 @@
+import hashlib
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubTargetHandler(BaseHTTPRequestHandler):
+    """Alvos falsos para testes de carga. A primeira parte do caminho escolhe
+    o comportamento; o resto só diferencia os sistemas:
+
+    - ``/fast/...``: 200 imediato;
+    - ``/slow/...``: 200 depois de ``?ms=`` (padrão ``slow_ms`` ±50%);
+    - ``/hang/...``: não responde por ``hang_seconds`` e fecha a conexão;
+    - ``/flap/...``: alterna entre 200 e 500 a cada ``flap_period`` segundos,
+      com fase diferente por caminho;
+    - ``/forbidden/...``: 403;
+    - ``/error/...``: 500.
+
+    ``?bytes=`` define o tamanho do corpo (padrão: 512).
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "StubTarget/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def _respond(self, body):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        kind = parts.path.strip("/").split("/", 1)[0]
+
+        if kind == "hang":
+            time.sleep(self.server.hang_seconds)
+            self.close_connection = True
+            return
+        if kind == "slow":
+            delay_ms = float(query.get("ms", [0])[0]) or self.server.slow_ms * random.uniform(0.5, 1.5)
+            time.sleep(delay_ms / 1000)
+            status = 200
+        elif kind == "flap":
+            phase = int(hashlib.sha1(parts.path.encode("utf-8")).hexdigest()[:8], 16)
+            status = 200 if (int(time.time() / self.server.flap_period) + phase) % 2 == 0 else 500
+        elif kind == "forbidden":
+            status = 403
+        elif kind == "error":
+            status = 500
+        elif kind == "fast":
+            status = 200
+        else:
+            status = 404
+
+        payload = b"x" * int(query.get("bytes", [512])[0])
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if body:
+            self.wfile.write(payload)
+
+
+class StubTargetServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, slow_ms=800, hang_seconds=30, flap_period=60, verbose=False):
+        super().__init__(address, StubTargetHandler)
+        self.slow_ms = slow_ms
+        self.hang_seconds = hang_seconds
+        self.flap_period = flap_period
+        self.verbose = verbose
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(host="127.0.0.1", port=0, **options):
+    """Sobe o servidor em uma thread e o devolve (``server.shutdown()`` para parar)."""
+    server = StubTargetServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="stub-targets", daemon=True).start()
+    return server
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import json
+import numpy as np
+import random
+import re
+import threading
 
-# Create your tests here.
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    DowntimeDaily,
+    NotificationOutbox,
+    ProbeShardLease,
+    ProbeWorker,
+    LatencySketch,
+    Server,
+    StatusRollupDaily,
+    StatusEvent,
+    StatusRollupHourly,
+    System,
+    SystemDowntime,
+    SystemStatus,
+    SystemStatusHistory,
+    SystemStatusInterval,
+)
+from .downtime import downtime_by_system, ledger_entries, record_closed_downtimes, split_by_day
+from .intervals import status_at, update_intervals, uptime_between
+from .latency import update_sketches
+from .metrics import _ShardedMetric
+from .probe import ProbeDetails
+from .notifications import NotificationDispatcher
+from .rollups import day_bucket, hour_bucket
+from .sla import merge_intervals, sla_report, split_at
+from .sharding import ShardCoordinator
+from .services import CheckResult, needs_recording, probe_url, record_checks
+from . import snapshot
+from .stubs import start_stub_server
+from .writer import CheckWriter
+
+
+# Tabelas que crescem com o tempo: as views nunca devem percorrê-las inteiras,
+# nem mesmo pela ordem de um índice.
+TIME_SERIES_TABLES = {
+    model._meta.db_table
+    for model in (
+        SystemStatusHistory,
+        SystemStatusInterval,
+        SystemDowntime,
+        LatencySketch,
+        StatusRollupHourly,
+        StatusRollupDaily,
+        StatusEvent,
+        DowntimeDaily,
+    )
+}
+# Tabelas do tamanho da frota: percorrer um índice é aceitável (contagens por
+# status), mas não a tabela inteira. Server/System são listadas por completo.
+FLEET_TABLES = {SystemStatus._meta.db_table}
+
+SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX)?")
+# Skip-scan "(ANY(col) ...)" também lê o índice inteiro
+SKIP_SCAN = re.compile(r"^SEARCH (\w+) USING .*\(ANY\(")
+
+
+class QueryPlanTests(TestCase):
+    """Roda EXPLAIN QUERY PLAN nas consultas de cada view sobre uma base
+    sintética grande e falha se alguma delas varrer uma tabela inteira."""
+
+    SERVERS = 20
+    SYSTEMS_PER_SERVER = 25
+    HISTORY_HOURS = 48
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        now = timezone.now()
+        statuses = ["UP"] * 8 + ["DOWN", "FORBIDDEN"]
+
+        servers = Server.objects.bulk_create(
+            Server(name=f"server-{index}") for index in range(cls.SERVERS)
+        )
+        systems = System.objects.bulk_create(
+            System(name=f"system-{server.pk}-{index}", url=f"https://example.com/{server.pk}/{index}", server=server)
+            for server in servers
+            for index in range(cls.SYSTEMS_PER_SERVER)
+        )
+        cls.system = systems[0]
+
+        SystemStatus.objects.bulk_create(
+            SystemStatus(system=system, status=rng.choice(statuses), status_code=200, checked_at=now)
+            for system in systems
+        )
+
+        history, hourly, daily, intervals, sketches, downtimes = [], [], [], [], [], []
+        for system in systems:
+            for hour in range(cls.HISTORY_HOURS):
+                checked_at = now - timedelta(hours=hour)
+                status = rng.choice(statuses)
+                history.append(SystemStatusHistory(
+                    system=system, status=status, status_code=200, response_ms=100, checked_at=checked_at,
+                ))
+                hourly.append(StatusRollupHourly(
+                    system=system, bucket_start=hour_bucket(checked_at), checks=1, up=int(status == "UP"),
+                ))
+                intervals.append(SystemStatusInterval(
+                    system=system, status=status, status_code=200, first_seen=checked_at, last_seen=checked_at,
+                ))
+                sketches.append(LatencySketch(
+                    system=system,
+                    bucket_start=hour_bucket(checked_at),
+                    count=1,
+                    sketch={"a": 0.01, "b": {"232": 1}, "z": 0, "n": 1, "s": 100, "min": 100, "max": 100},
+                ))
+            for day in range(cls.HISTORY_HOURS // 24 + 1):
+                daily.append(StatusRollupDaily(system=system, day=day_bucket(now - timedelta(days=day)), checks=24))
+            for index in range(40):
+                started_at = now - timedelta(days=index * 5 + rng.random())
+                downtimes.append(SystemDowntime(
+                    system=system,
+                    status="DOWN",
+                    started_at=started_at,
+                    ended_at=None if index == 0 else started_at + timedelta(minutes=30),
+                ))
+
+        for model, rows in (
+            (SystemStatusHistory, history),
+            (StatusRollupHourly, hourly),
+            (StatusRollupDaily, daily),
+            (SystemStatusInterval, intervals),
+            (LatencySketch, sketches),
+            (SystemDowntime, downtimes),
+        ):
+            model.objects.bulk_create(rows, batch_size=2000, ignore_conflicts=True)
+
+        DowntimeDaily.objects.bulk_create(
+            (
+                DowntimeDaily(system_id=system_id, day=day, seconds=seconds, tail_start=tail_start)
+                for (system_id, day), (seconds, tail_start) in ledger_entries(
+                    (downtime.system_id, downtime.started_at, downtime.ended_at)
+                    for downtime in downtimes
+                    if downtime.ended_at
+                ).items()
+            ),
+            batch_size=2000,
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertNoFullScans(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+
+        selects = [query["sql"] for query in ctx.captured_queries if query["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertTrue(selects, "Nenhuma consulta capturada")
+
+        problems = []
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    scan = SCAN.match(detail)
+                    skip_scan = SKIP_SCAN.match(detail)
+                    if (
+                        (scan and scan.group(1) in TIME_SERIES_TABLES)
+                        or (scan and scan.group(1) in FLEET_TABLES and not scan.group(2))
+                        or (skip_scan and skip_scan.group(1) in TIME_SERIES_TABLES | FLEET_TABLES)
+                    ):
+                        problems.append(f"{detail}\n    em: {sql}")
+        self.assertFalse(problems, "Varredura completa de tabela:\n" + "\n".join(problems))
+
+    def test_dashboard(self):
+        self.assertNoFullScans(lambda: self.client.get(reverse("dashboard")))
+
+    def test_dashboard_summary(self):
+        self.assertNoFullScans(lambda: self.client.get(reverse("dashboard_summary"), {"days": 7}))
+
+    def test_systems_list(self):
+        self.assertNoFullScans(lambda: self.client.get(reverse("systems_list")))
+
+    def test_latency_summary(self):
+        self.assertNoFullScans(lambda: self.client.get(reverse("latency_summary"), {"hours": 6}))
+
+    def test_system_intervals(self):
+        self.assertNoFullScans(
+            lambda: self.client.get(reverse("system_intervals"), {"system": self.system.name})
+        )
+
+    def test_export_history(self):
+        since = (timezone.now() - timedelta(hours=6)).isoformat()
+        self.assertNoFullScans(
+            lambda: b"".join(
+                self.client.get(
+                    reverse("export_data", args=["history", "csv"]), {"system": self.system.name, "from": since}
+                ).streaming_content
+            )
+        )
+
+    def test_sla(self):
+        self.assertNoFullScans(lambda: self.client.get(reverse("sla")))
+
+    def test_record_checks(self):
+        systems = list(System.objects.filter(server__name="server-0"))
+        now = timezone.now()
+        details = ProbeDetails([2, 10, 30, 78, None], "10.0.0.1", now + timedelta(days=30))
+        self.assertNoFullScans(
+            lambda: record_checks(CheckResult(system, 500, 120, now, details) for system in systems)
+        )
+
+
+class ProbeCacheTests(TestCase):
+    """Resultados do cache de verificações não são gravados de novo."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = start_stub_server()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.shutdown()
+        cls.stub.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        server = Server.objects.create(name="stub")
+        # Um id diferente de 1: o dono não pode ser confundido com True
+        System.objects.create(server=server, name="other", url=f"{self.stub.base_url}/fast/other")
+        self.system = System.objects.create(server=server, name="fast", url=f"{self.stub.base_url}/fast/")
+
+    def probe_and_record(self):
+        # Mesmo caminho do agendador: verifica e grava só resultados novos
+        probe = probe_url(self.system.url, owner=self.system.pk, ttl=60)
+        if needs_recording(probe, self.system):
+            record_checks([CheckResult(self.system, probe.status_code, probe.elapsed_ms, probe.checked_at)])
+        return probe
+
+    def test_cached_result_recorded_once(self):
+        first = self.probe_and_record()
+        second = self.probe_and_record()
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.owner, self.system.pk)
+        self.assertEqual(SystemStatusHistory.objects.filter(system=self.system).count(), 1)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        server = Server.objects.create(name="srv")
+        cls.system = System.objects.create(server=server, name="site", url="http://site.invalid/")
+        start = timezone.now() - timedelta(hours=1)
+        SystemStatusHistory.objects.bulk_create(
+            SystemStatusHistory(
+                system=cls.system,
+                status="UP",
+                status_code=200,
+                response_ms=10 + minute,
+                checked_at=start + timedelta(minutes=minute),
+            )
+            for minute in range(25)
+        )
+
+    @override_settings(EXPORT_PAGE_SIZE=10, EXPORT_CHUNK_SIZE=4)
+    def test_csv_pages(self):
+        response = self.client.get(reverse("export_data", args=["history", "csv"]))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,server,system,status,status_code,response_ms,checked_at")
+        ids = [int(line.split(",")[0]) for line in lines[1:]]
+        self.assertEqual(ids, sorted(SystemStatusHistory.objects.values_list("id", flat=True)))
+
+        # Retomada: sem cabeçalho, só o que vem depois do cursor
+        response = self.client.get(reverse("export_data", args=["history", "csv"]), {"after": ids[19]})
+        resumed = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([int(line.split(",")[0]) for line in resumed], ids[20:])
+
+    @override_settings(EXPORT_PAGE_SIZE=10, EXPORT_CHUNK_SIZE=4)
+    async def test_asgi_streams_in_blocks(self):
+        response = await AsyncClient().get(reverse("export_data", args=["history", "ndjson"]))
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # Blocos de EXPORT_CHUNK_SIZE linhas, não o corpo inteiro de uma vez
+        self.assertEqual(len(chunks), 7)
+        rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual({row["system"] for row in rows}, {"site"})
+
+
+class IntervalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        server = Server.objects.create(name="srv")
+        cls.system = System.objects.create(server=server, name="site", url="http://site.invalid/", check_interval=60)
+        cls.t0 = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def at(self, seconds):
+        return self.t0 + timedelta(seconds=seconds)
+
+    def record(self, *checks):
+        update_intervals((self.system.pk, status, code, self.at(seconds)) for seconds, status, code in checks)
+
+    def test_repeated_checks_extend_interval(self):
+        self.record((0, "UP", 200), (60, "UP", 200))
+        self.record((120, "UP", 200))
+        interval = SystemStatusInterval.objects.get(system=self.system)
+        self.assertEqual((interval.first_seen, interval.last_seen, interval.check_count), (self.at(0), self.at(120), 3))
+
+    def test_status_code_change_opens_interval(self):
+        self.record((0, "DOWN", 500), (60, "DOWN", 503), (120, "DOWN", 503))
+        intervals = list(SystemStatusInterval.objects.filter(system=self.system).order_by("first_seen"))
+        self.assertEqual([(i.status_code, i.check_count) for i in intervals], [(500, 1), (503, 2)])
+
+    def test_uptime_from_known_sequence(self):
+        self.record(
+            (0, "UP", 200),
+            (60, "UP", 200),
+            (120, "UP", 200),
+            (180, "DOWN", 500),
+            (240, "DOWN", 500),
+            (300, "UP", 200),
+        )
+        self.assertEqual(status_at(self.system, self.at(200)).status, "DOWN")
+        self.assertEqual(status_at(self.system, self.at(300)).status, "UP")
+        self.assertIsNone(status_at(self.system, self.at(-1)))
+        # UP de 0 a 180 e DOWN de 180 a 300
+        self.assertEqual(
+            uptime_between(self.system, self.at(0), self.at(300)),
+            {"covered_seconds": 300.0, "up_seconds": 180.0, "uptime": 60.0},
+        )
+        # Recorte no meio dos intervalos
+        self.assertEqual(uptime_between(self.system, self.at(150), self.at(210))["up_seconds"], 30.0)
+
+    def test_gap_without_checks_is_not_covered(self):
+        # Verificações param depois de 60 s e voltam uma hora depois, DOWN
+        self.record((0, "UP", 200), (60, "UP", 200), (3600, "DOWN", 500), (3660, "DOWN", 500))
+        result = uptime_between(self.system, self.at(0), self.at(3660))
+        # UP só até um check_interval depois da última verificação (120 s)
+        self.assertEqual(result["covered_seconds"], 180.0)
+        self.assertEqual(result["up_seconds"], 120.0)
+
+
+class IntervalMigrationTests(TransactionTestCase):
+    """A migração 0006 converte o histórico existente em intervalos."""
+
+    before = [("monitor", "0005_status_rollups")]
+    after = [("monitor", "0006_systemstatusinterval")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_history_converted(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        server = apps.get_model("monitor", "Server").objects.create(name="srv")
+        OldSystem = apps.get_model("monitor", "System")
+        OldHistory = apps.get_model("monitor", "SystemStatusHistory")
+        first = OldSystem.objects.create(server=server, name="a", url="http://a.invalid/")
+        second = OldSystem.objects.create(server=server, name="b", url="http://b.invalid/")
+        t0 = timezone.now().replace(microsecond=0)
+        rows = [
+            (first, "UP", 200, 0),
+            (first, "UP", 200, 60),
+            (first, "DOWN", 500, 120),
+            (first, "UP", 200, 180),
+            (second, "FORBIDDEN", 403, 30),
+            (second, "FORBIDDEN", 403, 90),
+        ]
+        OldHistory.objects.bulk_create(
+            OldHistory(
+                system=system, status=status, status_code=code, checked_at=t0 + timedelta(seconds=seconds)
+            )
+            for system, status, code, seconds in rows
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        intervals = apps.get_model("monitor", "SystemStatusInterval").objects.order_by("system_id", "first_seen")
+        self.assertEqual(
+            [
+                (i.system_id, i.status, (i.first_seen - t0).seconds, (i.last_seen - t0).seconds, i.check_count)
+                for i in intervals
+            ],
+            [
+                (first.pk, "UP", 0, 60, 2),
+                (first.pk, "DOWN", 120, 120, 1),
+                (first.pk, "UP", 180, 180, 1),
+                (second.pk, "FORBIDDEN", 30, 90, 2),
+            ],
+        )
+
+
+class DowntimeLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        server = Server.objects.create(name="srv")
+        cls.systems = [
+            System.objects.create(server=server, name=f"site-{index}", url=f"http://site-{index}.invalid/")
+            for index in range(3)
+        ]
+        cls.day = timezone.localdate() - timedelta(days=3)
+
+    def local(self, days, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day + timedelta(days=days), time(hour, minute)))
+
+    def test_split_across_midnight(self):
+        self.assertEqual(
+            split_by_day(self.local(0, 23), self.local(1, 1)),
+            [(self.day, 3600.0, self.local(0, 23)), (self.day + timedelta(days=1), 3600.0, None)],
+        )
+
+    def test_window_clips_downtimes(self):
+        crossing, before, still_open = self.systems
+        downtimes = [
+            # Atravessa a meia-noite e começou antes da janela
+            SystemDowntime.objects.create(
+                system=crossing, status="DOWN", started_at=self.local(0, 23), ended_at=self.local(1, 1)
+            ),
+            # Começou antes da janela e terminou no primeiro dia dela
+            SystemDowntime.objects.create(
+                system=before, status="DOWN", started_at=self.local(0, 20), ended_at=self.local(0, 23, 45)
+            ),
+        ]
+        record_closed_downtimes(downtimes)
+        SystemDowntime.objects.create(system=still_open, status="DOWN", started_at=self.local(0, 10))
+
+        self.assertEqual(
+            sorted(DowntimeDaily.objects.filter(system=crossing).values_list("day", "seconds", "tail_start")),
+            [(self.day, 3600.0, self.local(0, 23)), (self.day + timedelta(days=1), 3600.0, None)],
+        )
+        since, now = self.local(0, 23, 30), self.local(2, 12)
+        self.assertEqual(
+            downtime_by_system(since, now),
+            {
+                crossing.pk: 1800.0 + 3600.0,
+                before.pk: 900.0,
+                still_open.pk: (now - since).total_seconds(),
+            },
+        )
+
+
+class SlaTests(TestCase):
+    """Números do relatório de SLA sobre janeiro e fevereiro de 2024."""
+
+    JANUARY = 31 * 86400
+    FEBRUARY = 29 * 86400
+
+    @classmethod
+    def setUpTestData(cls):
+        server = Server.objects.create(name="srv")
+        cls.flaky = System.objects.create(server=server, name="flaky", url="http://flaky.invalid/")
+        cls.steady = System.objects.create(server=server, name="steady", url="http://steady.invalid/")
+
+        def moment(month, day, hour, minute=0):
+            return timezone.make_aware(datetime(2024, month, day, hour, minute))
+
+        for started_at, ended_at in [
+            # Duas quedas sobrepostas: um incidente de 10:00 às 12:00
+            (moment(1, 10, 10), moment(1, 10, 11)),
+            (moment(1, 10, 10, 30), moment(1, 10, 12)),
+            # Atravessa a virada do mês: uma hora em cada
+            (moment(1, 31, 23), moment(2, 1, 1)),
+        ]:
+            SystemDowntime.objects.create(system=cls.flaky, status="DOWN", started_at=started_at, ended_at=ended_at)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_merge_intervals(self):
+        group, start, end = merge_intervals(
+            np.array([0, 0, 1, 0, 0]),
+            np.array([0.0, 5.0, 0.0, 20.0, 10.0]),
+            np.array([10.0, 8.0, 4.0, 25.0, 12.0]),
+        )
+        # Encostados ([0, 10) e [10, 12)) também se unem; grupos não se misturam
+        self.assertEqual(list(zip(group, start, end)), [(0, 0.0, 12.0), (0, 20.0, 25.0), (1, 0.0, 4.0)])
+
+    def test_split_at_bounds(self):
+        owner, bucket, start, end = split_at(
+            np.array([0.0, 10.0, 20.0, 30.0]), np.array([5.0, 15.0]), np.array([25.0, 18.0])
+        )
+        self.assertEqual(
+            list(zip(owner, bucket, start, end)),
+            [(0, 0, 5.0, 10.0), (0, 1, 10.0, 20.0), (0, 2, 20.0, 25.0), (1, 1, 15.0, 18.0)],
+        )
+
+    def test_report(self):
+        report = sla_report((2024, 1), (2024, 2))
+        systems = {row["system"]: row for row in report["systems"]}
+        flaky, steady = systems["flaky"], systems["steady"]
+        seconds = self.JANUARY + self.FEBRUARY
+
+        self.assertEqual(flaky["downtime_s"], 4 * 3600)
+        self.assertEqual(flaky["incidents"], 2)
+        self.assertEqual(flaky["mttr_s"], 2 * 3600)
+        self.assertEqual(flaky["mtbf_s"], (seconds - 4 * 3600) / 2)
+        self.assertEqual(flaky["longest_s"], 2 * 3600)
+        self.assertEqual(flaky["availability"], round(100 * (1 - 4 * 3600 / seconds), 4))
+
+        january, february = flaky["months"]
+        self.assertEqual(
+            (january["month"], january["downtime_s"], january["incidents"], january["longest_s"]),
+            ("2024-01", 3 * 3600, 2, 2 * 3600),
+        )
+        self.assertEqual(
+            (february["month"], february["downtime_s"], february["incidents"], february["longest_s"]),
+            ("2024-02", 3600, 1, 3600),
+        )
+        self.assertEqual(february["availability"], round(100 * (1 - 3600 / self.FEBRUARY), 4))
+
+        self.assertEqual(
+            (steady["availability"], steady["incidents"], steady["mttr_s"], steady["mtbf_s"]), (100.0, 0, None, None)
+        )
+        # O servidor soma os dois sistemas (sistemas x tempo)
+        (server,) = report["servers"]
+        self.assertEqual(server["availability"], round(100 * (1 - 4 * 3600 / (2 * seconds)), 4))
+        self.assertEqual(report["overall"], {key: value for key, value in server.items() if key in report["overall"]})
+
+
+class FakeWebhookResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.headers = {}
+        self.text = json.dumps(self.payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeWebhookSession:
+    """Responde com os códigos de ``statuses`` (200 depois que acabarem) e
+    guarda as mensagens recebidas."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.sent = []
+
+    def post(self, url, json, timeout):
+        self.sent.append(json["content"])
+        status_code, payload = self.statuses.pop(0) if self.statuses else (200, None)
+        return FakeWebhookResponse(status_code, payload)
+
+
+@override_settings(NOTIFY_IN_PROCESS=False, DISCORD_WEBHOOK_URL="")
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        server = Server.objects.create(name="srv")
+        cls.first = System.objects.create(server=server, name="a", url="http://a.invalid/")
+        cls.second = System.objects.create(server=server, name="b", url="http://b.invalid/")
+
+    def enqueue(self, system, status):
+        return NotificationOutbox.objects.create(
+            system=system, status=status, message={"content": f"{system.name} {status}"}
+        )
+
+    def dispatcher(self, *statuses):
+        dispatcher = NotificationDispatcher(webhook_url="http://discord.invalid/webhook")
+        dispatcher.session = FakeWebhookSession(*statuses)
+        return dispatcher
+
+    def test_rate_limit_pauses_for_retry_after(self):
+        first = self.enqueue(self.first, "DOWN")
+        self.enqueue(self.second, "DOWN")
+        dispatcher = self.dispatcher((429, {"retry_after": 30}))
+        before = timezone.now()
+
+        with self.assertLogs("monitor.notifications", "WARNING"):
+            self.assertEqual(dispatcher.dispatch_once(), 1)
+        first.refresh_from_db()
+        # Adiada pelo retry_after, sem contar como tentativa
+        self.assertEqual(first.state, NotificationOutbox.PENDING)
+        self.assertEqual(first.attempts, 0)
+        self.assertGreaterEqual(first.next_attempt_at, before + timedelta(seconds=30))
+        self.assertEqual(first.last_error, "429: retry_after=30.0")
+        # Pausa vale para a fila toda, não só para a mensagem limitada
+        self.assertEqual(dispatcher.dispatch_once(), 0)
+        self.assertEqual(dispatcher.session.sent, ["a DOWN"])
+        self.assertGreater(dispatcher.snapshot()["paused_for_s"], 25)
+
+    def test_order_per_system(self):
+        down = self.enqueue(self.first, "DOWN")
+        up = self.enqueue(self.first, "UP")
+        self.enqueue(self.second, "DOWN")
+        dispatcher = self.dispatcher((500, None))
+
+        with self.assertLogs("monitor.notifications", "WARNING"):
+            dispatcher.drain()
+        # O alerta de "a" falhou: o "voltou" espera, "b" segue
+        self.assertEqual(dispatcher.session.sent, ["a DOWN", "b DOWN"])
+        up.refresh_from_db()
+        self.assertEqual(up.state, NotificationOutbox.PENDING)
+
+        NotificationOutbox.objects.filter(pk=down.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        dispatcher.drain()
+        self.assertEqual(dispatcher.session.sent, ["a DOWN", "b DOWN", "a DOWN", "a UP"])
+        self.assertFalse(NotificationOutbox.objects.filter(state=NotificationOutbox.PENDING).exists())
+
+    @override_settings(DISCORD_WEBHOOK_URL="http://discord.invalid/webhook")
+    def test_recording_never_starts_the_thread(self):
+        for status_code in (200, 500):
+            with self.captureOnCommitCallbacks(execute=True):
+                record_checks([CheckResult(self.first, status_code, 50, timezone.now())])
+        self.assertTrue(NotificationOutbox.objects.filter(system=self.first, status="DOWN").exists())
+        self.assertNotIn("discord-dispatcher", [thread.name for thread in threading.enumerate()])
+        dispatcher = self.dispatcher()
+        self.assertEqual(dispatcher.drain(), 1)
+        self.assertEqual(len(dispatcher.session.sent), 1)
+
+
+class CheckWriterTests(TransactionTestCase):
+    """A thread de escrita usa a própria conexão: os dados precisam estar
+    gravados de verdade (sem a transação do TestCase)."""
+
+    def setUp(self):
+        server = Server.objects.create(name="srv")
+        self.systems = [
+            System.objects.create(server=server, name=f"site-{index}", url=f"http://site-{index}.invalid/")
+            for index in range(7)
+        ]
+
+    def checks(self):
+        now = timezone.now()
+        return [CheckResult(system, 200, 50, now) for system in self.systems]
+
+    def test_flush_writes_in_batches(self):
+        writer = CheckWriter(batch_size=3, max_delay=0.5)
+        try:
+            self.assertTrue(writer.submit(self.checks()))
+            self.assertTrue(writer.flush(timeout=10))
+        finally:
+            writer.stop(timeout=5)
+        self.assertEqual(writer.pending(), 0)
+        self.assertEqual((writer.stats["written"], writer.stats["batches"]), (7, 3))
+        self.assertEqual(SystemStatusHistory.objects.count(), 7)
+        self.assertEqual(SystemStatus.objects.filter(status="UP").count(), 7)
+
+    def test_full_buffer_rejects_everything(self):
+        writer = CheckWriter(max_pending=5)
+        try:
+            # Sem espaço para todas: nenhuma é enfileirada
+            self.assertFalse(writer.submit(self.checks()))
+            self.assertTrue(writer.flush(timeout=10))
+        finally:
+            writer.stop(timeout=5)
+        self.assertEqual(writer.stats["rejected"], 7)
+        self.assertEqual(SystemStatusHistory.objects.count(), 0)
+
+    def test_blocking_and_non_blocking_submitters_at_capacity(self):
+        writer = GatedWriter(max_pending=5, batch_size=2, max_delay=0)
+        check = self.checks()[0]
+        accepted, errors = [], []
+
+        def blocking():
+            try:
+                for _ in range(20):
+                    writer.submit([check], block=True, timeout=10)
+            except Exception as exc:
+                errors.append(exc)
+
+        def non_blocking():
+            try:
+                for _ in range(200):
+                    accepted.append(writer.submit([check] * 3))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=target) for target in (blocking, blocking, non_blocking, non_blocking)]
+        try:
+            for thread in threads:
+                thread.start()
+            # Fila cheia por um tempo: quem usa block espera, os demais são recusados
+            threading.Event().wait(0.2)
+            writer.gate.set()
+            for thread in threads:
+                thread.join(timeout=20)
+            self.assertTrue(writer.flush(timeout=10))
+        finally:
+            writer.gate.set()
+            writer.stop(timeout=5)
+
+        self.assertEqual(errors, [])
+        # Cada lote sem block entrou inteiro ou não entrou
+        self.assertEqual(writer.stats["rejected"], 3 * accepted.count(False))
+        self.assertEqual(writer.stats["written"], 2 * 20 + 3 * accepted.count(True))
+        self.assertIn(False, accepted)
+
+
+class GatedWriter(CheckWriter):
+    """Só "grava" (conta) depois de ``gate``; mantém a fila cheia enquanto
+    os testes enfileiram."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.gate = threading.Event()
+
+    def _write(self, batch):
+        self.gate.wait()
+        self.stats["written"] += len(batch)
+
+
+class ShardLeaseTests(TestCase):
+    SHARDS = 4
+
+    def coordinator(self, name):
+        return ShardCoordinator(name=name, shards=self.SHARDS, lease_seconds=30)
+
+    def owners(self):
+        return dict(ProbeShardLease.objects.values_list("shard", "worker__name"))
+
+    def test_takeover_after_missed_heartbeat(self):
+        first, second = self.coordinator("first"), self.coordinator("second")
+        first.ensure_shards()
+        self.assertEqual(first.heartbeat({}), frozenset(range(self.SHARDS)))
+        # Posses válidas não são tomadas
+        self.assertEqual(second.heartbeat({}), frozenset())
+
+        # "first" para de renovar: heartbeat e posses vencem
+        past = timezone.now() - timedelta(seconds=31)
+        ProbeWorker.objects.filter(name="first").update(heartbeat_at=past)
+        ProbeShardLease.objects.filter(worker__name="first").update(expires_at=past)
+
+        self.assertEqual(second.heartbeat({}), frozenset(range(self.SHARDS)))
+        self.assertEqual(set(self.owners().values()), {"second"})
+        # Ao voltar, "first" não renova o que perdeu nem divide um shard
+        self.assertEqual(first.heartbeat({}), frozenset())
+        self.assertEqual(set(self.owners().values()), {"second"})
+
+    def test_rebalance_when_worker_joins(self):
+        first, second = self.coordinator("first"), self.coordinator("second")
+        first.ensure_shards()
+        first.heartbeat({})
+        second.heartbeat({})
+        # Passa a ter dois workers vivos: devolve a metade (sem verificação em andamento)
+        kept = first.heartbeat({})
+        self.assertEqual(len(kept), self.SHARDS // 2)
+        first.heartbeat({})
+        taken = second.heartbeat({})
+        self.assertEqual(kept | taken, frozenset(range(self.SHARDS)))
+        self.assertFalse(kept & taken)
+
+
+class SystemsDeltaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.server = Server.objects.create(name="srv")
+        cls.systems = [
+            System.objects.create(server=cls.server, name=name, url=f"http://{name}.invalid/") for name in "abc"
+        ]
+        now = timezone.now()
+        record_checks(CheckResult(system, 200, 50, now) for system in cls.systems)
+
+    def test_since_returns_only_changes(self):
+        response = self.client.get(reverse("systems_list"))
+        cursor = int(response["X-Status-Cursor"])
+
+        first, second, _ = self.systems
+        record_checks([CheckResult(first, 500, 50, timezone.now()), CheckResult(second, 200, 60, timezone.now())])
+
+        data = self.client.get(reverse("systems_list"), {"since": cursor}).json()
+        # "b" foi verificado de novo, mas não mudou de status
+        self.assertEqual([(change["name"], change["status"]) for change in data["changes"]], [("a", "DOWN")])
+        self.assertGreater(data["cursor"], cursor)
+
+        data = self.client.get(reverse("systems_list"), {"since": data["cursor"]}).json()
+        self.assertEqual(data["changes"], [])
+
+    def test_stale_cursor_forces_resync(self):
+        cursor = int(self.client.get(reverse("systems_list"))["X-Status-Cursor"])
+        # Mudança no cadastro: o cursor anterior não serve mais
+        System.objects.create(server=self.server, name="d", url="http://d.invalid/")
+        response = self.client.get(reverse("systems_list"), {"since": cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["resync"])
+
+        # Cursor de outro banco (à frente da versão atual)
+        response = self.client.get(reverse("systems_list"), {"since": response.json()["cursor"] + 100})
+        self.assertEqual(response.status_code, 410)
+
+    def test_full_and_delta_have_distinct_etags(self):
+        full = self.client.get(reverse("systems_list"))
+        cursor = full["X-Status-Cursor"]
+        delta = self.client.get(reverse("systems_list"), {"since": cursor})
+        self.assertNotEqual(full["ETag"], delta["ETag"])
+        self.assertEqual(delta["Cache-Control"], "no-cache")
+
+        # O ETag da lista completa não vale para o delta, nem para a grade
+        response = self.client.get(reverse("systems_list"), {"since": cursor}, HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("systems_grid"), HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(response.status_code, 200)
+        # Cada variante revalida com o próprio ETag
+        response = self.client.get(reverse("systems_list"), {"since": cursor}, HTTP_IF_NONE_MATCH=delta["ETag"])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse("systems_list"), HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class LatencySketchTests(TestCase):
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_buckets_follow_local_hours(self):
+        # UTC+5:30: a hora UTC vira no meio da hora local
+        system = System.objects.create(server=Server.objects.create(name="srv"), name="a", url="http://a.invalid/")
+        start = timezone.make_aware(datetime(2024, 3, 1, 10, 0))
+        # Em UTC, como vêm de timezone.now()
+        update_sketches([
+            CheckResult(system, 200, elapsed, (start + timedelta(minutes=minutes)).astimezone(dt_timezone.utc))
+            for minutes, elapsed in ((20, 40), (50, 60))
+        ])
+        self.assertEqual(list(LatencySketch.objects.values_list("bucket_start", "count")), [(start, 2)])
+
+
+class EventStreamTests(TestCase):
+    def test_transition_events_without_aggregates(self):
+        system = System.objects.create(server=Server.objects.create(name="srv"), name="a", url="http://a.invalid/")
+        record_checks([CheckResult(system, 200, 50, timezone.now())])
+        last_id = StatusEvent.objects.order_by("-id").values_list("id", flat=True).first()
+        with CaptureQueriesContext(connection) as queries:
+            record_checks([CheckResult(system, 500, 50, timezone.now())])
+        # Nenhuma contagem de status dentro da transação de escrita
+        self.assertFalse([query["sql"] for query in queries.captured_queries if "COUNT(" in query["sql"]])
+        events = StatusEvent.objects.filter(id__gt=last_id).order_by("id")
+        self.assertEqual([event.kind for event in events], ["checks", "status", "downtime"])
+        self.assertEqual((events[1].payload["previous"], events[1].payload["status"]), ("UP", "DOWN"))
+
+    async def test_stream_is_not_gzipped(self):
+        response = await AsyncClient().get(reverse("status_events"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "identity")
+        stream = aiter(response.streaming_content)
+        try:
+            # Cada evento sai assim que é gerado, em texto puro
+            self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        finally:
+            await stream.aclose()
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        System.objects.create(server=Server.objects.create(name="srv"), name="a", url="http://a.invalid/")
+
+    def assertProfiled(self, response, logs):
+        line = json.loads(logs.records[-1].getMessage())
+        # As consultas da view (síncrona) entram no perfil também sob ASGI
+        self.assertGreater(line["db_queries"], 0)
+        self.assertIn(f'desc="{line["db_queries"]} queries"', response["Server-Timing"])
+
+    def test_wsgi(self):
+        with self.assertLogs("monitor.profiling", "INFO") as logs:
+            response = self.client.get(reverse("uptime"), {"system": "a"})
+        self.assertProfiled(response, logs)
+
+    async def test_asgi(self):
+        with self.assertLogs("monitor.profiling", "INFO") as logs:
+            response = await AsyncClient().get(reverse("uptime"), {"system": "a"})
+        self.assertProfiled(response, logs)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.server = Server.objects.create(name="srv")
+        cls.systems = [
+            System.objects.create(server=cls.server, name=name, url=f"http://{name}.invalid/") for name in "ab"
+        ]
+
+    def setUp(self):
+        # O snapshot é global do processo: outros testes o deixam de outro banco
+        snapshot._snapshot = None
+        self.addCleanup(setattr, snapshot, "_snapshot", None)
+
+    def gauge(self, status):
+        body = self.client.get(reverse("metrics")).content.decode()
+        return int(re.search(rf'^isdown_systems{{server="srv",status="{status}"}} (\d+)$', body, re.M).group(1))
+
+    def test_scrape_skips_the_database(self):
+        self.assertEqual(self.gauge("DOWN"), 0)
+        with self.assertNumQueries(0):
+            self.gauge("DOWN")
+
+    def test_writes_refresh_the_gauges(self):
+        self.assertEqual(self.gauge("UP"), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_checks([CheckResult(self.systems[0], 200, 50, timezone.now())])
+        with self.captureOnCommitCallbacks(execute=True):
+            record_checks([CheckResult(self.systems[1], 500, 50, timezone.now())])
+        with self.assertNumQueries(0):
+            self.assertEqual((self.gauge("UP"), self.gauge("DOWN")), (1, 1))
+
+    def test_sharded_metric_is_abstract(self):
+        with self.assertRaises(TypeError):
+            _ShardedMetric("isdown_test", "Teste.")
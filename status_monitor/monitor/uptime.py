@@ -0,0 +1,88 @@
+import math
+
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from .models import StatusRollupHourly
+from .rollups import hour_bucket
+
+
+HOUR = 3600
+
+STEP_UNITS = {"h": HOUR, "d": 24 * HOUR}
+
+
+def parse_step(value, default=HOUR):
+    """Resolução em segundos a partir de ``"3600"``, ``"6h"`` ou ``"1d"``.
+
+    As agregações são por hora, então o passo precisa ser um múltiplo de uma
+    hora; senão levanta ``ValueError``.
+    """
+    if not value:
+        return default
+    value = value.strip().lower()
+    if value[-1:] in STEP_UNITS:
+        seconds = int(value[:-1]) * STEP_UNITS[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds <= 0 or seconds % HOUR:
+        raise ValueError(value)
+    return seconds
+
+
+def uptime_series(start, end, step=HOUR, system=None, server=None):
+    """Série densa de uptime entre ``start`` e ``end`` em faixas de ``step``
+    segundos, a partir de ``StatusRollupHourly``.
+
+    A primeira faixa começa na hora local de ``start`` (à meia-noite, se o
+    passo for de dias inteiros). O banco soma as
+    agregações de todos os sistemas por hora, e cada hora vai para a sua
+    faixa por aritmética sobre o timestamp, em uma única passada. Faixas sem
+    verificações ficam com ``None``.
+    """
+    first = hour_bucket(start)
+    if step % STEP_UNITS["d"] == 0:
+        first = first.replace(hour=0)
+    count = max(1, math.ceil((end - first).total_seconds() / step))
+    max_points = getattr(settings, "UPTIME_MAX_POINTS", 1000)
+    if count > max_points:
+        raise ValueError(f"{count} pontos (máximo: {max_points})")
+
+    origin = first.timestamp()
+
+    def boundary(index):
+        # Pelo timestamp, para as faixas não mudarem de tamanho no horário de verão
+        return timezone.localtime(datetime.fromtimestamp(origin + index * step, tz=dt_timezone.utc))
+
+    rows = StatusRollupHourly.objects.filter(bucket_start__gte=first, bucket_start__lt=boundary(count))
+    if system:
+        rows = rows.filter(system__name=system)
+    if server:
+        rows = rows.filter(system__server__name=server)
+    rows = (
+        rows.values_list("bucket_start")
+        .annotate(Sum("checks"), Sum("up"), Sum("forbidden"), Sum("down"))
+        .order_by()
+    )
+
+    checks, up, forbidden, down = ([0] * count for _ in range(4))
+    for bucket_start, bucket_checks, bucket_up, bucket_forbidden, bucket_down in rows.iterator():
+        index = int(bucket_start.timestamp() - origin) // step
+        checks[index] += bucket_checks
+        up[index] += bucket_up
+        forbidden[index] += bucket_forbidden
+        down[index] += bucket_down
+
+    total_checks, total_up = sum(checks), sum(up)
+    return {
+        "from": first.isoformat(),
+        "to": boundary(count).isoformat(),
+        "step": step,
+        "buckets": [boundary(index).isoformat() for index in range(count)],
+        "uptime": [round(u / c * 100, 2) if c else None for u, c in zip(up, checks)],
+        "checks": checks,
+        "forbidden": forbidden,
+        "down": down,
+        "overall": round(total_up / total_checks * 100, 2) if total_checks else None,
+    }
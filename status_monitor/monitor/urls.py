@@ -7,4 +7,15 @@ urlpatterns = [
     path('dashboard_summary/', views.dashboard_summary, name='dashboard_summary'),
     path('systems_list/', views.systems_list, name='systems_list'),  
     path('system_status/', views.system_status, name='system_status'),  
+    path('system_status/batch/', views.system_status_batch, name='system_status_batch'),
+    path('latency/', views.latency_summary, name='latency_summary'),
+    path('intervals/', views.system_intervals, name='system_intervals'),
+    path('api/systems/', views.systems_grid, name='systems_grid'),
+    path('api/uptime/', views.uptime, name='uptime'),
+    path('api/sla/', views.sla, name='sla'),
+    path('export/<str:dataset>.<str:fmt>', views.export_data, name='export_data'),
+    path('events/', views.status_events, name='status_events'),
+    path('notifications/stats/', views.notifications_stats, name='notifications_stats'),
+    path('probes/workers/', views.probe_workers, name='probe_workers'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -0,0 +1,68 @@
+from django.db.models import F
+from django.utils import timezone
+from .events import CHECKED_AT_FORMAT
+from .models import StatusVersion, SystemStatus
+
+
+SINGLETON_PK = 1
+
+
+def current_version() -> int:
+    version = StatusVersion.objects.filter(pk=SINGLETON_PK).values_list("version", flat=True).first()
+    return version or 0
+
+
+def current_catalog_version() -> int:
+    version = StatusVersion.objects.filter(pk=SINGLETON_PK).values_list("catalog_version", flat=True).first()
+    return version or 0
+
+
+def bump_version(catalog=False) -> int:
+    """Incrementa a versão global e devolve o novo valor.
+
+    Deve ser chamado dentro da transação que grava os status, para que a
+    nova versão só fique visível junto com os dados. ``catalog=True`` marca
+    uma mudança no cadastro de servidores/sistemas.
+    """
+    fields = {"version": F("version") + 1}
+    if catalog:
+        fields["catalog_version"] = F("version") + 1
+    updated = StatusVersion.objects.filter(pk=SINGLETON_PK).update(**fields)
+    if not updated:
+        StatusVersion.objects.get_or_create(
+            pk=SINGLETON_PK, defaults={"version": 1, "catalog_version": 1 if catalog else 0}
+        )
+    return current_version()
+
+
+def changes_since(since):
+    """Sistemas cujo status mudou depois da versão ``since``.
+
+    Devolve ``(cursor, mudanças)``; ``mudanças`` é ``None`` quando o cursor é
+    anterior à última mudança no cadastro (ou de outro banco) e o cliente
+    precisa recarregar a lista inteira. A versão é lida antes dos status:
+    uma mudança gravada no meio pode vir de novo na próxima consulta, mas
+    nunca fica de fora.
+    """
+    version, catalog = (
+        StatusVersion.objects.filter(pk=SINGLETON_PK).values_list("version", "catalog_version").first() or (0, 0)
+    )
+    if since > version or since < catalog:
+        return version, None
+    if since == version:
+        return version, []
+    rows = (
+        SystemStatus.objects.filter(change_seq__gt=since)
+        .order_by("change_seq")
+        .values_list("system__server__name", "system__name", "system__url", "status", "checked_at")
+    )
+    return version, [
+        {
+            "server": server,
+            "name": name,
+            "url": url,
+            "status": status,
+            "checked_at": timezone.localtime(checked_at).strftime(CHECKED_AT_FORMAT),
+        }
+        for server, name, url, status, checked_at in rows
+    ]
@@ -1,238 +1,448 @@
-import requests
+import asyncio
 import logging
-import time
-import json
-
-from django.db.models import ExpressionWrapper, F, Q, Sum, Value, Count
-from django.db import models, transaction, OperationalError
-from django.views.decorators.http import require_GET
-from django.db.models.functions import Coalesce
-from django.utils.text import slugify
-from django.http import JsonResponse
-from django.core.cache import cache
+
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.views.decorators.http import etag, require_GET
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta
-from .models import (
-    System,
-    Server,
-    SystemStatus,
-    SystemDowntime,
-    SystemStatusHistory,
+from .models import Server, System
+from .downtime import downtime_by_system
+from .events import details_payload, event_stream
+from .export import DATASETS, FORMATS, export_lines, export_lines_async, export_rows
+from .grid import DEFAULT_LIMIT, MAX_LIMIT, STATUS_FILTERS, system_page
+from .intervals import intervals_between, uptime_between
+from .latency import latency_percentiles
+from .metrics import CONTENT_TYPE, WRITE_REJECTED, render_metrics
+from .notifications import notification_stats
+from .probe import options_for
+from .profiling import run_in_request_context
+from .sharding import worker_stats
+from .services import (
+    CheckResult,
+    get_status_string,
+    needs_recording,
+    probe_url,
+    probe_url_async,
 )
+from .sla import parse_month, sla_report
+from .snapshot import get_snapshot
+from .uptime import parse_step, uptime_series
+from .versioning import changes_since
+from .writer import submit_checks
 
 
 logger = logging.getLogger(__name__)
 
 
-def check_url(url):
-    start = time.perf_counter()
-    try:
-        response = requests.get(url, timeout=5)
-        status_code = response.status_code
-    except requests.RequestException:
-        status_code = 0
-    finally:
-        elapsed_ms = int((time.perf_counter() - start) * 1000)
-    return status_code, elapsed_ms
-
-
-def get_status_string(status_code):
-    if status_code == 200:
-        return "UP"
-    elif status_code == 403:
-        return "FORBIDDEN"
-    else:
-        return "DOWN"
-
-
-def _cache_key_for_system(name: str) -> str:
-    slug = slugify(name) or "system"
-    return f"system-status-last:{slug}"
-
-
-def notify_discord(name: str, url: str, status_str: str, status_code: int | None) -> None:
-    webhook_url = getattr(settings, "DISCORD_WEBHOOK_URL", None)
-    if not webhook_url:
-        logger.debug("DISCORD_WEBHOOK_URL não configurado; ignorando aviso para %s", name)
-        return
-
-    failure_statuses = {"DOWN"}
-    cache_key = _cache_key_for_system(name)
-    last_status = cache.get(cache_key)
-    cache.set(cache_key, status_str, timeout=24 * 3600)
-
-    message = None
-    local_now_str = timezone.localtime(timezone.now()).strftime("%Y-%m-%d %H:%M:%S")
-
-    if status_str in failure_statuses:
-        if last_status == status_str:
-            pass
-        readable_code = status_code or "sem resposta"
-        message = {
-            "content": (
-                ":rotating_light: Sistema **{name}** está com status **{status}**.\n"
-                "URL: {url}\n"
-                "Código HTTP: {code}\n"
-                "Verificado em: {checked_at}"
-            ).format(
-                name=name,
-                status=status_str,
-                url=url,
-                code=readable_code,
-                checked_at=local_now_str,
-            )
-        }
-    elif last_status in failure_statuses and status_str == "UP":
-        message = {
-            "content": (
-                ":white_check_mark: Sistema **{name}** voltou a ficar disponível.\n"
-                "URL: {url}\n"
-                "Verificado em: {checked_at}"
-            ).format(
-                name=name,
-                url=url,
-                checked_at=local_now_str,
-            )
-        }
+def index(request):
+    return render(request, 'monitor/index.html')
 
-    if not message:
-        return
 
-    try:
-        response = requests.post(webhook_url, json=message, timeout=10)
-        if not (200 <= response.status_code < 300):
-            logger.error("Falha ao enviar webhook Discord (%s): %s", response.status_code, getattr(response, 'text', ''))
-        response.raise_for_status()
-        logger.info("Notificação Discord enviada para '%s' (%s)", name, status_str)
-    except requests.RequestException:
-        logger.exception("Falha ao enviar notificação para o Discord para %s", name)
+def _systems_list_etag(request):
+    # Lista completa e delta (?since=) são corpos diferentes para a mesma
+    # versão: cada variante tem o seu ETag
+    request.status_snapshot = get_snapshot()
+    version = request.status_snapshot.version
+    since = request.GET.get("since")
+    if since is None:
+        return f"systems-{version}"
+    return f"systems-{version}-since-{since}" if since.isdigit() else f"systems-{version}-since"
 
 
-def index(request):
-    return render(request, 'monitor/index.html')
+def _grid_etag(request):
+    request.status_snapshot = get_snapshot()
+    return f"grid-{request.status_snapshot.version}"
 
 
 @require_GET
+@etag(_systems_list_etag)
 def systems_list(request):
-    servers_data = {}
-    for server in Server.objects.all():
-        systems = server.systems.select_related("current_status").all()
-        servers_data[server.name] = []
-        for system in systems:
-            try:
-                current_status = system.current_status
-            except SystemStatus.DoesNotExist:
-                current_status = None
-            servers_data[server.name].append(
-                {
-                    "name": system.name,
-                    "url": system.url,
-                    "status": current_status.status if current_status else None,
-                    "checked_at": timezone.localtime(current_status.checked_at).strftime(
-                        "%Y-%m-%d %H:%M:%S"
-                    )
-                    if current_status
-                    else None,
-                }
-            )
-    return JsonResponse(servers_data)
+    """Todos os sistemas por servidor; o cabeçalho ``X-Status-Cursor`` traz a
+    versão da lista. Com ``?since=<cursor>``, só os sistemas cujo status
+    mudou depois dele e o novo cursor, ou ``410`` se for preciso recarregar
+    a lista inteira."""
+    since = request.GET.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({"error": "Cursor inválido"}, status=400)
+        cursor, changes = changes_since(since)
+        if changes is None:
+            response = JsonResponse({"resync": True, "cursor": cursor}, status=410)
+        else:
+            response = JsonResponse({"cursor": cursor, "changes": changes})
+    else:
+        # O corpo é montado uma vez por versão, a partir do snapshot em memória
+        snapshot = request.status_snapshot
+        response = HttpResponse(snapshot.systems_json(), content_type="application/json")
+        response["X-Status-Cursor"] = str(snapshot.version)
+    # Sempre revalidar com o ETag da variante (inclusive o 410 do delta)
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+@require_GET
+@etag(_grid_etag)
+def systems_grid(request):
+    """Página da grade de sistemas: ``?q=`` (nome ou URL), ``?status=``
+    (UP, FORBIDDEN, DOWN, PENDING; vários separados por vírgula),
+    ``?server=``, ``?sort=`` (name, latency, -latency, checked, -checked,
+    -setup: maior parte do tempo em DNS, conexão e TLS),
+    ``?limit=`` e ``?cursor=`` (``next_cursor`` da página anterior)."""
+    snapshot = request.status_snapshot
+
+    statuses = [value.strip().upper() for value in request.GET.get("status", "").split(",") if value.strip()]
+    if any(value not in STATUS_FILTERS for value in statuses):
+        return JsonResponse({"error": "Status inválido"}, status=400)
+
+    server_id = None
+    server = request.GET.get("server")
+    if server:
+        server_id = next((pk for pk, name, _ in snapshot.servers if name == server), None)
+        if server_id is None:
+            return JsonResponse({"error": "Servidor não encontrado"}, status=404)
+
+    try:
+        limit = min(max(int(request.GET.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    try:
+        page = system_page(
+            snapshot,
+            sort=request.GET.get("sort") or "name",
+            cursor=request.GET.get("cursor"),
+            limit=limit,
+            query=request.GET.get("q"),
+            statuses=statuses,
+            server_id=server_id,
+        )
+    except ValueError:
+        return JsonResponse({"error": "Ordenação ou cursor inválido"}, status=400)
+
+    response = JsonResponse(page)
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _write_buffer_full():
+    WRITE_REJECTED.inc()
+    response = JsonResponse({"error": "Fila de gravação cheia, tente novamente."}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _status_item(system, url, probe):
+    return {
+        "name": system.name,
+        "url": url,
+        "status": get_status_string(probe.status_code, system.expected_codes),
+        "response_ms": probe.elapsed_ms,
+        "checked_at": timezone.localtime(probe.checked_at).strftime("%Y-%m-%d %H:%M:%S"),
+        "cached": probe.cached,
+        "cache_age_ms": probe.age_ms,
+        **details_payload(probe.details),
+    }
+
+
+def _record_probes(systems, probes):
+    """Entrega à thread de escrita as verificações feitas aqui; resultados do
+    cache já foram gravados por quem fez a verificação. A view nunca espera
+    pelo banco. ``False`` se a fila estiver cheia."""
+    return submit_checks(
+        CheckResult(system, probe.status_code, probe.elapsed_ms, probe.checked_at, probe.details)
+        for system, probe in zip(systems, probes)
+        if needs_recording(probe, system)
+    )
 
 
 @require_GET
-def system_status(request):
+async def system_status(request):
+    """Verifica um sistema agora. Sob ASGI a verificação é assíncrona (uma
+    resposta lenta não prende uma thread); sob WSGI usa o caminho com
+    threads."""
     url = request.GET.get("url")
     name = request.GET.get("name")
 
     if not url or not name:
         return JsonResponse({"error": "Parâmetros ausentes"}, status=400)
 
-    status_code, elapsed_ms = check_url(url)
-    status_str = get_status_string(status_code)
-    now = timezone.now()
+    system = await System.objects.filter(name=name).afirst()
+    if not system:
+        return JsonResponse({"error": "Sistema não encontrado"}, status=404)
 
-    notify_discord(name, url, status_str, status_code)
+    if isinstance(request, ASGIRequest):
+        probe = await probe_url_async(url, owner=system.pk, options=options_for(system))
+    else:
+        probe = await sync_to_async(probe_url)(url, owner=system.pk, options=options_for(system))
+
+    if not _record_probes([system], [probe]):
+        return _write_buffer_full()
+    return JsonResponse(_status_item(system, url, probe))
+
+
+def _probe_system(system):
+    return probe_url(system.url, owner=system.pk, options=options_for(system))
+
+
+def _probe_batch(systems):
+    concurrency = getattr(settings, "BATCH_PROBE_CONCURRENCY", 20)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(systems))) as pool:
+        return run_in_request_context(pool, _probe_system, systems)
+
+
+@require_GET
+async def system_status_batch(request):
+    """Verifica vários sistemas (``ids`` ou ``server``) de uma vez. Sob ASGI
+    todas as verificações ficam em andamento ao mesmo tempo no event loop,
+    limitadas por host (``PROBE_HOST_CONCURRENCY``); sob WSGI, até
+    ``BATCH_PROBE_CONCURRENCY`` threads."""
+    ids = request.GET.get("ids")
+    server = request.GET.get("server")
+
+    if ids:
+        try:
+            id_list = [int(value) for value in ids.split(",") if value.strip()]
+        except ValueError:
+            return JsonResponse({"error": "Parâmetro ids inválido"}, status=400)
+        systems = [system async for system in System.objects.filter(pk__in=id_list)]
+    elif server:
+        systems = [system async for system in System.objects.filter(server__name=server)]
+    else:
+        return JsonResponse({"error": "Parâmetros ausentes"}, status=400)
+
+    if not systems:
+        return JsonResponse({"results": []})
+
+    if isinstance(request, ASGIRequest):
+        probes = await asyncio.gather(
+            *(probe_url_async(system.url, owner=system.pk, options=options_for(system)) for system in systems)
+        )
+    else:
+        probes = await sync_to_async(_probe_batch)(systems)
+
+    if not _record_probes(systems, probes):
+        return _write_buffer_full()
+
+    return JsonResponse({
+        "results": [
+            {"id": system.pk, **_status_item(system, system.url, probe)}
+            for system, probe in zip(systems, probes)
+        ]
+    })
+
+
+@require_GET
+def latency_summary(request):
+    try:
+        hours = int(request.GET.get("hours", 24))
+    except (TypeError, ValueError):
+        hours = 24
+
+    since = timezone.now() - timedelta(hours=hours)
+    data = latency_percentiles(
+        since,
+        system=request.GET.get("system"),
+        server=request.GET.get("server"),
+    )
+    return JsonResponse({"hours": hours, **data})
+
+
+def _parse_moment(value, default):
+    if not value:
+        return default
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@require_GET
+def system_intervals(request):
+    name = request.GET.get("system")
+    if not name:
+        return JsonResponse({"error": "Parâmetros ausentes"}, status=400)
 
     system = System.objects.filter(name=name).first()
     if not system:
         return JsonResponse({"error": "Sistema não encontrado"}, status=404)
 
-    # Tentar evitar bloqueio SQLite com retry
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            with transaction.atomic():
-                # 1️⃣ Atualiza status atual
-                obj = SystemStatus.objects.filter(system=system).first()
-                if obj:
-                    obj.status = status_str
-                    obj.status_code = status_code
-                    obj.checked_at = now
-                    obj.save(update_fields=["status", "status_code", "checked_at"])
-                else:
-                    SystemStatus.objects.create(
-                        system=system,
-                        status=status_str,
-                        status_code=status_code,
-                        checked_at=now,
-                    )
-
-                # 2️⃣ Histórico de status
-                SystemStatusHistory.objects.create(
-                    system=system,
-                    status=status_str,
-                    status_code=status_code,
-                    checked_at=now,
-                )
-
-                # 3️⃣ Controle de downtime
-                active_downtime = SystemDowntime.objects.filter(
-                    system=system, ended_at__isnull=True
-                ).first()
-
-                if status_str == "UP":
-                    if active_downtime:
-                        active_downtime.ended_at = now
-                        active_downtime.save(update_fields=["ended_at"])
-                elif status_str in {"DOWN", "FORBIDDEN"}:
-                    if active_downtime:
-                        if active_downtime.status != status_str:
-                            active_downtime.status = status_str
-                            active_downtime.save(update_fields=["status"])
-                    else:
-                        SystemDowntime.objects.create(
-                            system=system,
-                            status=status_str,
-                            started_at=now,
-                        )
-            break  # saiu do loop se tudo correu bem
-
-        except OperationalError:
-            # SQLite pode travar, então damos uma pequena pausa e tentamos de novo
-            if attempt < max_retries - 1:
-                time.sleep(0.5)
-                continue
-            else:
-                return JsonResponse({"error": "Database locked, tente novamente."}, status=500)
-
-    # 4️⃣ Resposta final
+    now = timezone.now()
+    try:
+        end = _parse_moment(request.GET.get("to"), now)
+        start = _parse_moment(request.GET.get("from"), end - timedelta(hours=24))
+    except ValueError:
+        return JsonResponse({"error": "Data inválida"}, status=400)
+
     return JsonResponse({
-        "name": name,
-        "url": url,
-        "status": status_str,
-        "response_ms": elapsed_ms,
-        "checked_at": timezone.localtime(now).strftime("%Y-%m-%d %H:%M:%S"),
+        "system": system.name,
+        "from": timezone.localtime(start).isoformat(),
+        "to": timezone.localtime(end).isoformat(),
+        "uptime": uptime_between(system, start, end),
+        "intervals": [
+            {
+                "status": interval.status,
+                "status_code": interval.status_code,
+                "start": timezone.localtime(span_start).isoformat(),
+                "end": timezone.localtime(span_end).isoformat(),
+                "check_count": interval.check_count,
+            }
+            for interval, span_start, span_end in intervals_between(system, start, end)
+        ],
     })
 
+
+@require_GET
+async def status_events(request):
+    """Stream SSE com as verificações gravadas, transições de status,
+    mudanças de downtime e contagens atualizadas.
+
+    O navegador reenvia ``Last-Event-ID`` ao reconectar e recebe só o que
+    perdeu; ``?last_event_id=`` faz o mesmo na primeira conexão. Precisa de
+    um servidor ASGI (``status_monitor.asgi``) para manter a conexão aberta.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI a conexão prenderia uma thread para sempre; 204 faz o
+        # EventSource desistir e o frontend volta ao polling
+        return HttpResponse(status=204)
+
+    raw_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_event_id = int(raw_id) if raw_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(event_stream(last_event_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    # Com Content-Encoding o GZipMiddleware não mexe na resposta; o gzip
+    # seguraria os eventos no buffer até juntar bytes suficientes
+    response["Content-Encoding"] = "identity"
+    return response
+
+
+@require_GET
+def uptime(request):
+    """Uptime em faixas de ``step`` (``3600``, ``6h``, ``1d``) entre ``from`` e
+    ``to``, de um sistema, de um servidor ou de todos."""
+    system = request.GET.get("system")
+    server = request.GET.get("server")
+    if system and not System.objects.filter(name=system).exists():
+        return JsonResponse({"error": "Sistema não encontrado"}, status=404)
+    if server and not Server.objects.filter(name=server).exists():
+        return JsonResponse({"error": "Servidor não encontrado"}, status=404)
+
+    try:
+        end = _parse_moment(request.GET.get("to"), timezone.now())
+        start = _parse_moment(request.GET.get("from"), end - timedelta(hours=24))
+    except ValueError:
+        return JsonResponse({"error": "Data inválida"}, status=400)
+    if start >= end:
+        return JsonResponse({"error": "Intervalo vazio"}, status=400)
+
+    try:
+        step = parse_step(request.GET.get("step"))
+    except ValueError:
+        return JsonResponse({"error": "Passo inválido (múltiplo de 1 hora, ex.: 3600, 6h, 1d)"}, status=400)
+
+    try:
+        data = uptime_series(start, end, step, system=system, server=server)
+    except ValueError as exc:
+        return JsonResponse({"error": f"Pontos demais: {exc}"}, status=400)
+    return JsonResponse({"system": system, "server": server, **data})
+
+
+@require_GET
+def sla(request):
+    """Disponibilidade, incidentes, MTTR, MTBF e maior queda por mês, por
+    servidor e por sistema, de ``from`` a ``to`` (meses ``AAAA-MM``,
+    inclusive; padrão: o mês atual)."""
+    system = request.GET.get("system")
+    server = request.GET.get("server")
+    if system and not System.objects.filter(name=system).exists():
+        return JsonResponse({"error": "Sistema não encontrado"}, status=404)
+    if server and not Server.objects.filter(name=server).exists():
+        return JsonResponse({"error": "Servidor não encontrado"}, status=404)
+
+    today = timezone.localdate()
+    try:
+        first = parse_month(request.GET.get("from") or f"{today:%Y-%m}")
+        last = parse_month(request.GET["to"]) if request.GET.get("to") else first
+    except ValueError:
+        return JsonResponse({"error": "Mês inválido (use AAAA-MM)"}, status=400)
+
+    try:
+        report = sla_report(first, last, system=system, server=server)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"system": system, "server": server, **report})
+
+
+@require_GET
+def export_data(request, dataset, fmt):
+    """Histórico (``history``) ou downtimes (``downtimes``) em CSV ou NDJSON,
+    transmitidos à medida que são lidos. Filtros: ``system``, ``server``,
+    ``from``/``to``; ``after=<id>`` retoma depois da última linha recebida."""
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return JsonResponse({"error": "Exportação inexistente"}, status=404)
+    system = request.GET.get("system")
+    server = request.GET.get("server")
+    if system and not System.objects.filter(name=system).exists():
+        return JsonResponse({"error": "Sistema não encontrado"}, status=404)
+    if server and not Server.objects.filter(name=server).exists():
+        return JsonResponse({"error": "Servidor não encontrado"}, status=404)
+
+    try:
+        start = _parse_moment(request.GET.get("from"), None)
+        end = _parse_moment(request.GET.get("to"), None)
+    except ValueError:
+        return JsonResponse({"error": "Data inválida"}, status=400)
+    try:
+        after = int(request.GET.get("after") or 0)
+    except ValueError:
+        return JsonResponse({"error": "Cursor inválido"}, status=400)
+
+    rows = export_rows(dataset, after=after, system=system, server=server, start=start, end=end)
+    # Retomada (after) sem cabeçalho: o corpo continua o que já foi recebido
+    lines = export_lines(dataset, fmt, rows, header=not after)
+    if isinstance(request, ASGIRequest):
+        lines = export_lines_async(lines)
+    response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+    # Proxies não devem juntar o corpo antes de repassar
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_GET
+def notifications_stats(request):
+    """Profundidade da fila de avisos do Discord e latência de entrega."""
+    return JsonResponse(notification_stats())
+
+
+@require_GET
+def probe_workers(request):
+    """Workers de run_probes --sharded: shards, vazão e fila de cada um."""
+    return JsonResponse(worker_stats())
+
+
 @require_GET
 def dashboard_summary(request):
     now = timezone.now()
-    statuses = SystemStatus.objects.all()
+    snapshot = get_snapshot()
     counts = {
-        "active": statuses.filter(status="UP").count(),
-        "forbidden": statuses.filter(status="FORBIDDEN").count(),
-        "down": statuses.exclude(status__in=["UP", "FORBIDDEN"]).count(),
+        "active": snapshot.counts["UP"],
+        "forbidden": snapshot.counts["FORBIDDEN"],
+        "down": snapshot.counts["DOWN"],
     }
 
     try:
@@ -242,36 +452,16 @@ def dashboard_summary(request):
 
     since = now - timedelta(days=days)
 
-    relevant_downtimes = SystemDowntime.objects.filter(
-        Q(started_at__gte=since)
-        | Q(ended_at__gte=since)
-        | Q(ended_at__isnull=True)
-    )
-
-    duration_expr = ExpressionWrapper(
-        Coalesce(F("ended_at"), Value(now, output_field=models.DateTimeField()))
-        - F("started_at"),
-        output_field=models.DurationField(),
-    )
-
-    downtime_totals = (
-        relevant_downtimes.annotate(duration=duration_expr)
-        .values("system__name")
-        .annotate(total_duration=Sum("duration"))
-        .order_by("-total_duration")[:10]
-    )
-
-    chart_data = []
-    for item in downtime_totals:
-        total_duration = item.get("total_duration")
-        if total_duration is None:
-            continue
-        chart_data.append(
-            {
-                "name": item["system__name"],
-                "total_minutes": round(total_duration.total_seconds() / 60, 2),
-            }
-        )
+    # Livro diário + bordas da janela cortadas exatamente + downtimes abertos
+    totals = downtime_by_system(since, now)
+    top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:10]
+    chart_data = [
+        {
+            "name": snapshot.systems[system_id]["name"] if system_id in snapshot.systems else None,
+            "total_minutes": round(seconds / 60, 2),
+        }
+        for system_id, seconds in top
+    ]
 
     return JsonResponse(
         {
@@ -282,59 +472,23 @@ def dashboard_summary(request):
     )
     
 def dashboard(request):
-    now = timezone.now()
-    last_24h = now - timedelta(hours=24)
-
-    systems = System.objects.select_related("current_status")
-    # Carrega servidores com sistemas e status atual para o grid por servidor
-    servers = Server.objects.prefetch_related(
-        models.Prefetch(
-            'systems',
-            queryset=System.objects.select_related('current_status')
-        )
-    )
-    total = systems.count()
-    up = SystemStatus.objects.filter(status="UP").count()
-    down = SystemStatus.objects.filter(status="DOWN").count()
-    forbidden = SystemStatus.objects.filter(status="FORBIDDEN").count()
-
-    histories = (
-        SystemStatusHistory.objects.filter(checked_at__gte=last_24h)
-        .values("checked_at__hour")
-        .annotate(
-            total=Count("id"),
-            ups=Count("id", filter=Q(status="UP")),
-        )
-        .order_by("checked_at__hour")
-    )
-
-    labels, data = [], []
-    for h in range(24):
-        item = next((i for i in histories if i["checked_at__hour"] == h), None)
-        if item:
-            uptime = (item["ups"] / item["total"]) * 100
-        else:
-            uptime = 0
-        labels.append(f"{h:02d}h")
-        data.append(round(uptime, 2))
-
-    # Garante que sejam JSON válidos no template
-    chart_labels = json.dumps(labels)
-    chart_data = json.dumps(data)
+    # Só os contadores e os nomes dos servidores vêm no HTML; a lista de
+    # sistemas é carregada em páginas de /api/systems/
+    snapshot = get_snapshot()
 
     context = {
-        "systems": systems,
-        "servers": servers,
-        "up": up,
-        "down": down,
-        "forbidden": forbidden,
-        "total": total,
-        "chart_labels": chart_labels,
-        "chart_data": chart_data,
+        "server_names": [name for _, name, _ in snapshot.servers],
+        "up": snapshot.counts["UP"],
+        "down": snapshot.counts["DOWN"],
+        "forbidden": snapshot.counts["FORBIDDEN"],
+        "total": snapshot.total,
+        # O stream começa logo após o estado renderizado, sem lacunas
+        "last_event_id": snapshot.last_event_id,
     }
     return render(request, "monitor/dashboard.html", context)
 
 
-
-
-
+@require_GET
+def metrics(request):
+    # Tudo vem de contadores em memória e do snapshot; sem consultas ao banco
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,178 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+from .metrics import CHECKS_DROPPED, SQLITE_RETRIES
+from .services import record_checks
+
+
+logger = logging.getLogger(__name__)
+
+
+class CheckWriter:
+    """Fila limitada de verificações gravada por uma única thread.
+
+    Quem verifica só enfileira o ``CheckResult`` e segue em frente; a thread
+    de escrita junta tudo o que chegou em até ``max_delay`` segundos (no
+    máximo ``batch_size`` itens) e grava em uma única transação com
+    ``record_checks``. Com um só escritor por processo não há disputa pelo
+    lock do SQLite entre as próprias requisições, e as esperas por
+    ``database is locked`` acontecem aqui, nunca em uma view.
+    """
+
+    def __init__(self, max_pending=None, batch_size=None, max_delay=None):
+        self.max_pending = max_pending or getattr(settings, "WRITE_BUFFER_SIZE", 5000)
+        self.batch_size = batch_size or getattr(settings, "WRITE_BATCH_SIZE", 500)
+        self.max_delay = max_delay if max_delay is not None else getattr(settings, "WRITE_BATCH_DELAY", 0.2)
+        self.max_retries = getattr(settings, "WRITE_MAX_RETRIES", 10)
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._submit_lock = threading.Lock()
+        # Quem enfileira com block espera aqui por espaço, sem segurar o lock
+        self._space = threading.Condition(self._submit_lock)
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"written": 0, "batches": 0, "rejected": 0, "dropped": 0, "retries": 0}
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self.run, name="check-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, checks, block=False, timeout=None):
+        """Enfileira as verificações. Sem ``block``, devolve ``False`` (e não
+        enfileira nenhuma) se não houver espaço para todas. Com ``block``,
+        espera por espaço e levanta ``queue.Full`` depois de ``timeout``.
+
+        Todo enfileiramento acontece com ``_submit_lock``, e só a thread de
+        escrita retira itens: depois de conferido o espaço, nenhum
+        ``put_nowait`` pode falhar no meio de um lote.
+        """
+        checks = list(checks)
+        if not checks:
+            return True
+        self.start()
+        if block:
+            # Lotes maiores que a fila entram em partes, conforme ela esvazia
+            for start in range(0, len(checks), self._queue.maxsize):
+                part = checks[start:start + self._queue.maxsize]
+                with self._space:
+                    if not self._space.wait_for(lambda: self._free() >= len(part), timeout):
+                        raise queue.Full
+                    for check in part:
+                        self._queue.put_nowait(check)
+            return True
+        with self._submit_lock:
+            if self._free() < len(checks):
+                self.stats["rejected"] += len(checks)
+                return False
+            for check in checks:
+                self._queue.put_nowait(check)
+        return True
+
+    def _free(self):
+        return self._queue.maxsize - self._queue.qsize()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            # Agrupa o que chegar logo em seguida na mesma transação
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._space:
+                self._space.notify_all()
+
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                close_old_connections()
+
+    def _write(self, batch):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                record_checks(batch, max_retries=1)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except OperationalError:
+                if attempt == self.max_retries:
+                    break
+                self.stats["retries"] += 1
+                SQLITE_RETRIES.inc("writer")
+                time.sleep(min(5.0, 0.1 * 2 ** attempt))
+            except Exception:
+                logger.exception("Erro inesperado ao gravar %d verificações", len(batch))
+                break
+        self.stats["dropped"] += len(batch)
+        CHECKS_DROPPED.inc(amount=len(batch))
+        logger.error("Descartadas %d verificações após %d tentativas", len(batch), self.max_retries)
+
+    def flush(self, timeout=None):
+        """Espera a fila esvaziar (inclusive o lote em gravação). Retorna
+        ``True`` se tudo foi gravado dentro de ``timeout``."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = CheckWriter()
+            atexit.register(_flush_on_exit)
+        return _writer
+
+
+def _flush_on_exit():
+    writer = _writer
+    if writer is None:
+        return
+    timeout = getattr(settings, "WRITE_FLUSH_TIMEOUT", 10)
+    if writer.pending():
+        logger.info("Gravando %d verificações pendentes antes de encerrar", writer.pending())
+    if not writer.flush(timeout):
+        logger.error("%d verificações não foram gravadas no encerramento", writer.pending())
+    writer.stop(timeout=1)
+
+
+def submit_checks(checks, block=False, timeout=None):
+    """Atalho para ``get_writer().submit``."""
+    return get_writer().submit(checks, block=block, timeout=timeout)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from decouple import config
 
@@ -52,6 +53,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 _load_env_file(BASE_DIR / ".env")
 
+# manage.py test: nada de Discord nem da thread de notificações (os testes
+# chamam o despachante diretamente)
+TESTING = sys.argv[1:2] == ["test"]
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -82,6 +87,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira; só fica ativo com
+    # PROFILING_ENABLED
+    "monitor.profiling.ProfilingMiddleware",
+    # Antes dos demais, para comprimir a resposta final (JSON das listagens
+    # e HTML)
+    "django.middleware.gzip.GZipMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -109,6 +120,30 @@ TEMPLATES = [
     },
 ]
 
+# Perfil das requisições (monitor/profiling.py): cabeçalho Server-Timing e
+# uma linha de log JSON por requisição (logger "monitor.profiling").
+# PROFILING_SAMPLE_RATE: fração das requisições gravadas com cProfile (.prof).
+# PROFILING_SLOW_MS: requisições acima disso têm a pilha amostrada a cada
+# PROFILING_STACK_INTERVAL segundos (.folded); 0 desativa.
+PROFILING_ENABLED = config("PROFILING_ENABLED", default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+PROFILING_SLOW_MS = config("PROFILING_SLOW_MS", default=0, cast=int)
+PROFILING_STACK_INTERVAL = config("PROFILING_STACK_INTERVAL", default=0.01, cast=float)
+PROFILING_DIR = config("PROFILING_DIR", default=str(BASE_DIR / "profiles"))
+
+if PROFILING_ENABLED:
+    # Mede também o tempo de renderização dos templates
+    TEMPLATES[0]["BACKEND"] = "monitor.profiling.ProfiledTemplates"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "monitor.profiling": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 WSGI_APPLICATION = "status_monitor.wsgi.application"
 
 
@@ -118,7 +153,18 @@ WSGI_APPLICATION = "status_monitor.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        # Outro arquivo para testes de carga (generate_fleet/benchmark) sem
+        # misturar a frota sintética com a real
+        "NAME": config("SQLITE_PATH", default=str(BASE_DIR / "db.sqlite3")),
+        "OPTIONS": {
+            # WAL: leituras não bloqueiam a escrita (e vice-versa).
+            # IMMEDIATE: a transação pega o lock de escrita no início, então
+            # a espera do busy timeout vale e não há "database is locked"
+            # ao promover uma leitura a escrita no meio da transação.
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": config("SQLITE_BUSY_TIMEOUT", default=20, cast=int),
+        },
     }
 }
 
@@ -167,4 +213,90 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # Integrações externas
-DISCORD_WEBHOOK_URL = config("DISCORD_WEBHOOK_URL")
+DISCORD_WEBHOOK_URL = "" if TESTING else config("DISCORD_WEBHOOK_URL")
+
+# Fila de avisos do Discord (NotificationOutbox). Com NOTIFY_IN_PROCESS, cada
+# processo que grava verificações envia a fila em uma thread própria; desligue
+# para usar apenas o comando dispatch_notifications.
+NOTIFY_IN_PROCESS = not TESTING and config("NOTIFY_IN_PROCESS", default=True, cast=bool)
+NOTIFY_POLL_INTERVAL = config("NOTIFY_POLL_INTERVAL", default=5.0, cast=float)
+NOTIFY_MAX_ATTEMPTS = config("NOTIFY_MAX_ATTEMPTS", default=10, cast=int)
+NOTIFY_BACKOFF_BASE = 2.0
+NOTIFY_BACKOFF_MAX = 300.0
+
+
+# Agendador de verificações (manage.py run_probes)
+PROBE_WORKERS = config("PROBE_WORKERS", default=20, cast=int)
+PROBE_JITTER = config("PROBE_JITTER", default=0.1, cast=float)
+
+# run_probes --sharded: os sistemas são divididos em PROBE_SHARDS shards
+# (system_id % PROBE_SHARDS), repartidos entre os workers vivos. Um worker
+# que não renova o heartbeat por PROBE_LEASE_SECONDS perde os seus shards.
+PROBE_SHARDS = config("PROBE_SHARDS", default=64, cast=int)
+PROBE_LEASE_SECONDS = config("PROBE_LEASE_SECONDS", default=30, cast=int)
+
+# Limite de verificações simultâneas no endpoint /system_status/batch/
+BATCH_PROBE_CONCURRENCY = config("BATCH_PROBE_CONCURRENCY", default=20, cast=int)
+
+# Tempo (segundos) em que o resultado de uma verificação é reaproveitado
+# por outras requisições para a mesma URL. Use 0 para desativar o cache.
+PROBE_CACHE_TTL = config("PROBE_CACHE_TTL", default=5, cast=float)
+
+# Motor de verificação (monitor.probe): hosts com conexões mantidas abertas,
+# conexões por host e tempo (segundos) que um endereço resolvido fica em
+# cache. Use PROBE_DNS_TTL=0 para resolver a cada conexão nova.
+PROBE_POOL_HOSTS = config("PROBE_POOL_HOSTS", default=100, cast=int)
+PROBE_POOL_SIZE = config("PROBE_POOL_SIZE", default=20, cast=int)
+PROBE_DNS_TTL = config("PROBE_DNS_TTL", default=60, cast=float)
+
+# Verificações assíncronas (views system_status e system_status/batch sob
+# ASGI): conexões abertas ao mesmo tempo pelo processo e verificações
+# simultâneas por host, para não sobrecarregar um mesmo alvo
+PROBE_ASYNC_MAX_CONNECTIONS = config("PROBE_ASYNC_MAX_CONNECTIONS", default=500, cast=int)
+PROBE_HOST_CONCURRENCY = config("PROBE_HOST_CONCURRENCY", default=4, cast=int)
+
+# /api/uptime/: número máximo de faixas por consulta (ex.: 1000 = ~41 dias
+# com passo de 1 hora)
+UPTIME_MAX_POINTS = config("UPTIME_MAX_POINTS", default=1000, cast=int)
+
+# Exportação (/export/, manage.py export_data): linhas lidas por consulta
+# (páginas por id) e por ida ao banco dentro de cada página
+EXPORT_PAGE_SIZE = config("EXPORT_PAGE_SIZE", default=10000, cast=int)
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", default=2000, cast=int)
+
+# Relatório de SLA (/api/sla/, manage.py sla_report): máximo de meses por
+# consulta e validade (segundos) do cálculo de um período já encerrado no
+# cache; ele também é refeito quando um downtime do período muda
+SLA_MAX_MONTHS = config("SLA_MAX_MONTHS", default=36, cast=int)
+SLA_CACHE_TIMEOUT = config("SLA_CACHE_TIMEOUT", default=7 * 24 * 3600, cast=int)
+
+# Erro relativo máximo dos percentis de latência (sketches horários)
+LATENCY_SKETCH_ACCURACY = 0.01
+
+# Dias de histórico bruto mantidos pelo comando prune_history. As agregações
+# por hora/dia (usadas pelo dashboard) não são apagadas.
+HISTORY_RETENTION_DAYS = config("HISTORY_RETENTION_DAYS", default=30, cast=int)
+
+# Armazenamento do histórico: "checks" grava uma linha por verificação em
+# SystemStatusHistory (além dos intervalos); "intervals" grava apenas os
+# intervalos de status (SystemStatusInterval), estendidos a cada verificação.
+STATUS_HISTORY_MODE = config("STATUS_HISTORY_MODE", default="checks")
+
+# Gravação das verificações (monitor/writer.py): uma thread por processo junta
+# até WRITE_BATCH_SIZE verificações que chegam em WRITE_BATCH_DELAY segundos em
+# uma única transação. Com WRITE_BUFFER_SIZE itens pendentes as views respondem
+# 503; no encerramento o processo espera até WRITE_FLUSH_TIMEOUT segundos.
+WRITE_BUFFER_SIZE = config("WRITE_BUFFER_SIZE", default=5000, cast=int)
+WRITE_BATCH_SIZE = config("WRITE_BATCH_SIZE", default=500, cast=int)
+WRITE_BATCH_DELAY = config("WRITE_BATCH_DELAY", default=0.2, cast=float)
+WRITE_MAX_RETRIES = 10
+WRITE_FLUSH_TIMEOUT = 10
+
+# Stream de eventos (/events/, Server-Sent Events). Cada processo consulta a
+# tabela de eventos a cada EVENT_POLL_INTERVAL segundos e repassa aos clientes;
+# reconexões reproduzem até EVENT_REPLAY_LIMIT eventos perdidos. Eventos mais
+# antigos que EVENT_RETENTION_HOURS são apagados pelo prune_history.
+EVENT_POLL_INTERVAL = config("EVENT_POLL_INTERVAL", default=1.0, cast=float)
+EVENT_REPLAY_LIMIT = config("EVENT_REPLAY_LIMIT", default=1000, cast=int)
+EVENT_RETENTION_HOURS = config("EVENT_RETENTION_HOURS", default=24, cast=int)
+EVENT_RETRY_MS = 3000